@@ -34,7 +34,7 @@ contract EInvoicingRegistry {
         address[] owners;
 
         /* Company this invoicing address belongs to. Can be empty. */
-        string vatId;
+        bytes32 vatId;
 
         /* Different information attached to this invoicing address.
            Key as ContentType.
@@ -77,35 +77,58 @@ contract EInvoicingRegistry {
          */
 
         /* All invoicing addresses as a list, because map keys are not iterable in Solidity */
-        string[] allInvoicingAddresses;
+        bytes32[] allInvoicingAddresses;
     }
 
-    string public version = "0.3";
+    string public version = "0.6";
 
     /** How owns this contract and can add companies */
     address master;
 
+    /** Import accounts master has allowed to add companies, so imports can be spread over many senders */
+    mapping(address => bool) writers;
+
     /**
      * Map VAT IDs to company records.
      *
-     * Key is international Y-Tunnus (FI12312345).
+     * Key is international Y-Tunnus (FI12312345) as ASCII, right padded with zero bytes.
+     * Fixed size keys avoid dynamic ABI encoding of arguments and hashing strings for every lookup.
      *
      */
-    mapping(string => Company) vatIdRegistry;
+    mapping(bytes32 => Company) vatIdRegistry;
 
     /**
-     * Map invoicing address to data behind it
+     * Map invoicing address to data behind it.
+     *
+     * Key is the normalized address (OVT:3705090754) as ASCII, right padded with zero bytes.
      */
-    mapping(string=>InvoicingAddressInformation) invoicingAddressRegistry;
+    mapping(bytes32=>InvoicingAddressInformation) invoicingAddressRegistry;
 
     /**
      * Vat id to company preferences to mappings.
      *
      * Company preferences is JSON encoded string.
      */
-    mapping(string=>string) companyPreferencesRegistry;
+    mapping(bytes32=>string) companyPreferencesRegistry;
+
+    /**
+     * Operator ID (Tieke "Välittäjän tunnus") to operator data.
+     *
+     * Stored once and referenced by the ID from invoicing address data,
+     * instead of repeating the operator in every address.
+     * Data as ContentType.OperatorPublicData.
+     */
+    mapping(string=>string) operatorRegistry;
 
 
+    /**
+     * Merkle roots of import batches kept off chain, to the block they were committed in.
+     *
+     * The rows of a batch live in a local content store and are served with
+     * a proof, which a reader checks against a root committed here.
+     */
+    mapping(bytes32=>uint) batchRoots;
+
     /**
      * Store data of all invoices.
      *
@@ -118,11 +141,15 @@ contract EInvoicingRegistry {
      *
      * These events are indexable by Ethereum node and you can directly query them in JavaScript.
      */
-    event CompanyCreated(string vatId);
-    event CompanyUpdated(string vatId);
-    event CompanyPreferencesUpdated(string vatId);
-    event InvoicingAddressCreated(string invoicingAddress);
-    event InvoicingAddressUpdated(string invoicingAddress);
+    event CompanyCreated(bytes32 vatId);
+    event CompanyUpdated(bytes32 vatId);
+    event CompanyPreferencesUpdated(bytes32 vatId);
+    event InvoicingAddressCreated(bytes32 invoicingAddress);
+    event InvoicingAddressUpdated(bytes32 invoicingAddress);
+    event OperatorUpdated(string operatorId);
+    event BatchRootCommitted(bytes32 root, uint rowCount);
+    event WriterAdded(address writer);
+    event WriterRemoved(address writer);
 
     event InvoiceSent(string indexed toInvoiceAddress, string indexed fromInvoiceAddress, string invoiceId);
 
@@ -136,22 +163,29 @@ contract EInvoicingRegistry {
     /**
      * Check if we have already imported company core data.
      */
-    function hasCompany(string vatId) public constant returns (bool) {
+    function hasCompany(bytes32 vatId) public constant returns (bool) {
         return vatIdRegistry[vatId].owners.length > 0;
     }
 
+    /**
+     * Check if an invoicing address has been created.
+     */
+    function hasInvoicingAddress(bytes32 invoicingAddress) public constant returns (bool) {
+        return invoicingAddressRegistry[invoicingAddress].owners.length > 0;
+    }
+
     /**
      * Return VAT ID for a given invoicing address.
      *
-     * If not match return empty string.
+     * If not match return zero.
      */
-    function getVatIdByAddress(string invoicingAddress) public constant returns (string) {
+    function getVatIdByAddress(bytes32 invoicingAddress) public constant returns (bytes32) {
         return invoicingAddressRegistry[invoicingAddress].vatId;
     }
 
-    function createCompany(string vatId) public {
+    function createCompany(bytes32 vatId) public {
 
-        if(bytes(vatId).length == 0) {
+        if(vatId == 0) {
             throw; // Bad data
         }
 
@@ -164,9 +198,9 @@ contract EInvoicingRegistry {
         CompanyCreated(vatId);
     }
 
-    function createInvoicingAddress(string vatId, string invoicingAddress) public {
+    function createInvoicingAddress(bytes32 vatId, bytes32 invoicingAddress) public {
 
-        if(bytes(vatId).length == 0 || bytes(invoicingAddress).length == 0) {
+        if(vatId == 0 || invoicingAddress == 0) {
             throw; // Bad data
         }
 
@@ -196,9 +230,9 @@ contract EInvoicingRegistry {
         InvoicingAddressCreated(invoicingAddress);
     }
 
-    function setCompanyData(string vatId, ContentType contentType, string data) public {
+    function setCompanyData(bytes32 vatId, ContentType contentType, string data) public {
 
-        if(bytes(vatId).length == 0 || bytes(data).length == 0) {
+        if(vatId == 0 || bytes(data).length == 0) {
             throw; // Bad data
         }
 
@@ -212,20 +246,204 @@ contract EInvoicingRegistry {
         CompanyUpdated(vatId);
     }
 
-    // TODO: Do combined createAddress + setInvoicingAddressData to reduce latencies
-    function setInvoicingAddressData(string vatId, string invoicingAddress, ContentType contentType, string data) public {
+    /**
+     * Set data behind an invoicing address.
+     *
+     * To create addresses and set their data in one go, see importInvoicingAddresses().
+     * The company of an existing address is changed with moveInvoicingAddress() only,
+     * so that the address lists of the companies stay in sync.
+     */
+    function setInvoicingAddressData(bytes32 vatId, bytes32 invoicingAddress, ContentType contentType, string data) public {
+
+        if(!canUpdateInvoicingAddress(invoicingAddress, msg.sender)) {
+            throw;
+        }
+
+        InvoicingAddressInformation info = invoicingAddressRegistry[invoicingAddress];
+
+        info.data[uint(contentType)] = data;
+
+        if(info.vatId == 0) {
+            info.vatId = vatId;
+        }
+
+        InvoicingAddressUpdated(invoicingAddress);
+    }
+
+    /**
+     * Move an invoicing address to another company.
+     *
+     * The address is taken off the address list of its old company, keeping the order of the others,
+     * and added to the list of the new company.
+     */
+    function moveInvoicingAddress(bytes32 vatId, bytes32 invoicingAddress) public {
+
+        if(vatId == 0 || invoicingAddress == 0) {
+            throw; // Bad data
+        }
+
+        // Address lists are company core data
+        if(!canUpdateCompany(vatId, msg.sender)) {
+            throw;
+        }
+
+        InvoicingAddressInformation info = invoicingAddressRegistry[invoicingAddress];
+
+        if(info.owners.length == 0) {
+            throw; // Not created yet
+        }
+
+        if(info.vatId == vatId) {
+            return; // Already there
+        }
+
+        bytes32[] addresses = vatIdRegistry[info.vatId].allInvoicingAddresses;
+
+        for(uint i = 0; i < addresses.length; i++) {
+            if(addresses[i] == invoicingAddress) {
+                for(uint j = i; j + 1 < addresses.length; j++) {
+                    addresses[j] = addresses[j + 1];
+                }
+                addresses.length--;
+                break;
+            }
+        }
+
+        info.vatId = vatId;
+
+        Company company = vatIdRegistry[vatId];
+        if(company.owners.length > 0) {
+            company.allInvoicingAddresses.push(invoicingAddress);
+        }
+
+        InvoicingAddressUpdated(invoicingAddress);
+    }
+
+    /**
+     * Bulk import many invoicing addresses in one transaction.
+     *
+     * For each row create the company if it does not exist yet,
+     * create the invoicing address and set its TiekeAddressData.
+     *
+     * keys has two entries per row: VAT ID and invoicing address.
+     * Solidity cannot take string[] arguments, so the data fields of all rows
+     * are concatenated to packed and lengths tells the byte length of each field.
+     * Each row has two data fields: TiekeCompanyData and TiekeAddressData.
+     * Company data is only written when the company is created by this call and may be empty.
+     *
+     * Rows whose invoicing address already exists are skipped.
+     */
+    function importInvoicingAddresses(bytes32[] keys, string packed, uint[] lengths) public {
+
+        if(keys.length % 2 != 0 || lengths.length != keys.length) {
+            throw; // Bad data
+        }
+
+        bytes memory data = bytes(packed);
+        uint offset = 0;
+
+        for(uint i = 0; i < keys.length; i += 2) {
+
+            string memory companyData = sliceString(data, offset, lengths[i]);
+            offset += lengths[i];
+
+            string memory addressData = sliceString(data, offset, lengths[i + 1]);
+            offset += lengths[i + 1];
+
+            importInvoicingAddress(keys[i], keys[i + 1], companyData, addressData);
+        }
+
+        if(offset != data.length) {
+            throw; // Lengths do not match the packed data
+        }
+    }
+
+    /**
+     * Import one row of importInvoicingAddresses().
+     */
+    function importInvoicingAddress(bytes32 vatId, bytes32 invoicingAddress, string companyData, string addressData) internal {
+
+        if(vatId == 0 || invoicingAddress == 0) {
+            throw; // Bad data
+        }
+
+        Company company = vatIdRegistry[vatId];
+
+        if(company.owners.length == 0) {
+
+            if(!canUpdateCompany(vatId, msg.sender)) {
+                throw;
+            }
+
+            company.owners.push(msg.sender);
+            CompanyCreated(vatId);
+
+            if(bytes(companyData).length > 0) {
+                company.businessInformation[uint(ContentType.TiekeCompanyData)] = companyData;
+                CompanyUpdated(vatId);
+            }
+        }
+
+        InvoicingAddressInformation info = invoicingAddressRegistry[invoicingAddress];
+
+        if(info.owners.length > 0) {
+            return; // Already imported
+        }
 
         if(!canUpdateInvoicingAddress(invoicingAddress, msg.sender)) {
             throw;
         }
 
-        invoicingAddressRegistry[invoicingAddress].data[uint(contentType)] = data;
-        invoicingAddressRegistry[invoicingAddress].vatId = vatId;
+        info.owners.push(msg.sender);
+        info.vatId = vatId;
+        company.allInvoicingAddresses.push(invoicingAddress);
+        InvoicingAddressCreated(invoicingAddress);
 
+        info.data[uint(ContentType.TiekeAddressData)] = addressData;
         InvoicingAddressUpdated(invoicingAddress);
     }
 
-    function getBusinessInformation(string vatId, ContentType contentType) public constant returns(string) {
+    /**
+     * Copy a part of a byte array to a new string.
+     *
+     * Copies full 32 byte words and masks the last partial word.
+     */
+    function sliceString(bytes data, uint start, uint length) internal constant returns (string) {
+
+        if(start + length > data.length) {
+            throw; // Out of bounds
+        }
+
+        bytes memory result = new bytes(length);
+
+        uint src;
+        uint dest;
+
+        assembly {
+            src := add(add(data, 32), start)
+            dest := add(result, 32)
+        }
+
+        for(; length >= 32; length -= 32) {
+            assembly {
+                mstore(dest, mload(src))
+            }
+            src += 32;
+            dest += 32;
+        }
+
+        // Remaining bytes: keep the tail of the destination word intact
+        uint mask = 256 ** (32 - length) - 1;
+        assembly {
+            let srcpart := and(mload(src), not(mask))
+            let destpart := and(mload(dest), mask)
+            mstore(dest, or(destpart, srcpart))
+        }
+
+        return string(result);
+    }
+
+    function getBusinessInformation(bytes32 vatId, ContentType contentType) public constant returns(string) {
         return vatIdRegistry[vatId].businessInformation[uint(contentType)];
     }
 
@@ -234,7 +452,7 @@ contract EInvoicingRegistry {
      *
      * TODO: Current Solidity does not allow to return string[] over a transaction
      */
-    function getInvoicingAddressCount(string vatId) public constant returns(uint) {
+    function getInvoicingAddressCount(bytes32 vatId) public constant returns(uint) {
 
         Company company = vatIdRegistry[vatId];
 
@@ -247,10 +465,8 @@ contract EInvoicingRegistry {
 
     /**
      * Return all addresses for a company.
-     *
-     * TODO: Current Solidity does not allow to return string[] over a transaction
      */
-    function getInvoicingAddressByIndex(string vatId, uint idx) public constant returns(string) {
+    function getInvoicingAddressByIndex(bytes32 vatId, uint idx) public constant returns(bytes32) {
 
         Company company = vatIdRegistry[vatId];
 
@@ -261,48 +477,292 @@ contract EInvoicingRegistry {
         return company.allInvoicingAddresses[idx];
     }
 
-    function getAddressInformation(string invoicingAddress, ContentType contentType) public constant returns(string) {
+    function getAddressInformation(bytes32 invoicingAddress, ContentType contentType) public constant returns(string) {
         return invoicingAddressRegistry[invoicingAddress].data[uint(contentType)];
     }
 
+    /**
+     * Create or update an operator record.
+     */
+    function setOperatorData(string operatorId, string data) public {
+
+        if(!canUpdateOperator(operatorId, msg.sender)) {
+            throw;
+        }
+
+        if(bytes(operatorId).length == 0) {
+            throw; // Bad data
+        }
+
+        operatorRegistry[operatorId] = data;
+        OperatorUpdated(operatorId);
+    }
+
+    function getOperatorData(string operatorId) public constant returns (string) {
+        return operatorRegistry[operatorId];
+    }
+
+    /**
+     * Commit the Merkle root of a batch of rows stored off chain.
+     *
+     * One storage write instead of the records of every row. Committing the same root again keeps the first block.
+     */
+    function commitBatchRoot(bytes32 root, uint rowCount) public {
+
+        if(!canCommitBatch(root, msg.sender)) {
+            throw;
+        }
+
+        if(root == 0 || rowCount == 0) {
+            throw; // Bad data
+        }
+
+        if(batchRoots[root] == 0) {
+            batchRoots[root] = block.number;
+        }
+
+        BatchRootCommitted(root, rowCount);
+    }
+
+    /**
+     * Block where a batch root was committed, zero if it was not.
+     */
+    function getBatchRootBlock(bytes32 root) public constant returns (uint) {
+        return batchRoots[root];
+    }
+
+    /**
+     * Return a company and a page of its invoicing addresses in one call.
+     *
+     * Strings are concatenated to packed and lengths tells their UTF-8 byte lengths,
+     * like importInvoicingAddresses() takes them. The fields are
+     *
+     * - business information of each ContentType from InvoiceContactInformation to TiekeAddressData
+     * - company preferences
+     * - for each invoicing address from offset, at most limit: the address, as a string without the zero padding, and its data of each ContentType
+     *
+     * For a company not created yet packed is empty and there are no lengths.
+     * addressCount tells how many invoicing addresses the company has in total, for paging.
+     */
+    function getCompanyRecord(bytes32 vatId, uint offset, uint limit) public constant returns (string packed, uint[] lengths, uint addressCount) {
+
+        Company company = vatIdRegistry[vatId];
+
+        if(company.owners.length == 0) {
+            return; // Not created yet, all outputs empty
+        }
+
+        addressCount = company.allInvoicingAddresses.length;
+
+        if(offset > addressCount) {
+            offset = addressCount;
+        }
+
+        if(limit > addressCount - offset) {
+            limit = addressCount - offset;
+        }
+
+        (packed, lengths) = packStrings(getCompanyFields(vatId, offset, limit));
+    }
+
+    /**
+     * Collect the fields of getCompanyRecord().
+     */
+    function getCompanyFields(bytes32 vatId, uint offset, uint limit) internal constant returns (string[]) {
+
+        Company company = vatIdRegistry[vatId];
+
+        // Types from InvoiceContactInformation to TiekeAddressData
+        uint contentTypes = uint(ContentType.TiekeAddressData);
+
+        string[] memory fields = new string[]((contentTypes + 1) * (limit + 1));
+        uint n = 0;
+        uint t;
+
+        for(t = 1; t <= contentTypes; t++) {
+            fields[n++] = company.businessInformation[t];
+        }
+
+        fields[n++] = companyPreferencesRegistry[vatId];
+
+        for(uint i = offset; i < offset + limit; i++) {
+            bytes32 invoicingAddress = company.allInvoicingAddresses[i];
+            InvoicingAddressInformation info = invoicingAddressRegistry[invoicingAddress];
+
+            fields[n++] = bytes32ToString(invoicingAddress);
+            for(t = 1; t <= contentTypes; t++) {
+                fields[n++] = info.data[t];
+            }
+        }
+
+        return fields;
+    }
+
+    /**
+     * Convert a zero padded key back to a string.
+     */
+    function bytes32ToString(bytes32 key) internal constant returns (string) {
+
+        uint length = 0;
+        while(length < 32 && key[length] != 0) {
+            length++;
+        }
+
+        bytes memory result = new bytes(length);
+
+        if(length > 0) {
+            // Padding lands past the string, in the rest of its memory word
+            assembly {
+                mstore(add(result, 32), key)
+            }
+        }
+
+        return string(result);
+    }
+
+    /**
+     * Concatenate strings and tell their byte lengths.
+     */
+    function packStrings(string[] fields) internal constant returns (string, uint[]) {
+
+        uint[] memory lengths = new uint[](fields.length);
+        uint total = 0;
+        uint i;
+
+        for(i = 0; i < fields.length; i++) {
+            lengths[i] = bytes(fields[i]).length;
+            total += lengths[i];
+        }
+
+        bytes memory result = new bytes(total);
+        uint offset = 0;
+
+        for(i = 0; i < fields.length; i++) {
+            copyBytes(bytes(fields[i]), result, offset);
+            offset += lengths[i];
+        }
+
+        return (string(result), lengths);
+    }
+
+    /**
+     * Copy all of src into dest starting at destStart.
+     *
+     * Copies full 32 byte words and masks the last partial word, like sliceString().
+     */
+    function copyBytes(bytes src, bytes dest, uint destStart) internal constant {
+
+        uint length = src.length;
+
+        if(destStart + length > dest.length) {
+            throw; // Out of bounds
+        }
+
+        uint srcPtr;
+        uint destPtr;
+
+        assembly {
+            srcPtr := add(src, 32)
+            destPtr := add(add(dest, 32), destStart)
+        }
+
+        for(; length >= 32; length -= 32) {
+            assembly {
+                mstore(destPtr, mload(srcPtr))
+            }
+            srcPtr += 32;
+            destPtr += 32;
+        }
+
+        // Remaining bytes: keep the tail of the destination word intact
+        uint mask = 256 ** (32 - length) - 1;
+        assembly {
+            let srcpart := and(mload(srcPtr), not(mask))
+            let destpart := and(mload(destPtr), mask)
+            mstore(destPtr, or(destpart, srcpart))
+        }
+    }
+
     /**
      * Company owner can update their preferences.
      */
-    function updateRoutingPreference(string vatId, string preferences) public {
+    function updateRoutingPreference(bytes32 vatId, string preferences) public {
 
         if(!canUpdateCompanyPreferences(vatId, msg.sender)) {
             throw;
         }
 
         companyPreferencesRegistry[vatId] = preferences;
+
+        CompanyPreferencesUpdated(vatId);
     }
 
     /**
      * Get routing preferences set by the company owner.
      *
      */
-    function getCompanyPreferences(string vatId) public constant returns (string) {
+    function getCompanyPreferences(bytes32 vatId) public constant returns (string) {
         return companyPreferencesRegistry[vatId];
     }
 
     /**
-     * Only registry master key can add companies.
+     * Allow an import account to add and update companies.
+     */
+    function addWriter(address writer) public {
+        if(msg.sender != master) {
+            throw;
+        }
+        writers[writer] = true;
+        WriterAdded(writer);
+    }
+
+    /**
+     * Revoke an import account.
+     */
+    function removeWriter(address writer) public {
+        if(msg.sender != master) {
+            throw;
+        }
+        writers[writer] = false;
+        WriterRemoved(writer);
+    }
+
+    function isWriter(address writer) public constant returns (bool) {
+        return writers[writer];
+    }
+
+    /**
+     * Only registry master key and the writers it has added can add companies.
+     */
+    function canUpdateCompany(bytes32 vatId, address sender) public constant returns (bool) {
+        return sender == master || writers[sender];
+    }
+
+    /**
+     * Operator records come from the same import as companies.
+     */
+    function canUpdateOperator(string operatorId, address sender) public constant returns (bool) {
+        return sender == master || writers[sender];
+    }
+
+    /**
+     * Batches are imported like companies.
      */
-    function canUpdateCompany(string vatId, address sender) public constant returns (bool) {
-        return sender == master;
+    function canCommitBatch(bytes32 root, address sender) public constant returns (bool) {
+        return sender == master || writers[sender];
     }
 
     /**
      * Invoicing address operators can update data behind id.
      */
-    function canUpdateInvoicingAddress(string invoicingAddress, address sender) public constant returns (bool) {
+    function canUpdateInvoicingAddress(bytes32 invoicingAddress, address sender) public constant returns (bool) {
         return true;
     }
 
     /**
      * Invoicing address operators can update data behind id.
      */
-    function canUpdateCompanyPreferences(string vatId, address sender) public constant returns (bool) {
+    function canUpdateCompanyPreferences(bytes32 vatId, address sender) public constant returns (bool) {
         return true;
     }
 
@@ -322,7 +782,7 @@ contract EInvoicingRegistry {
      * Return demo invoice payload.
      *
      */
-    function getInvoice(string invoiceId) public returns (string) {
+    function getInvoice(string invoiceId) public constant returns (string) {
         return invoiceRegistry[invoiceId];
     }
 
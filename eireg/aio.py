@@ -0,0 +1,420 @@
+"""asyncio JSON-RPC client for the registry, for importing and lookups on one event loop."""
+
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, Optional
+
+from web3.contract import Contract
+
+from eireg.blockchain import GasPriceCache
+from eireg.client import RPCError, decode_call_result, encode_call
+from eireg.confirmer import Confirmation, ConfirmationTimeout
+from eireg.data import CompanyRecord, decode_company_record
+from eireg.poller import poll_forever
+from eireg.signer import LocalAccount
+
+
+class AsyncRPC:
+    """JSON-RPC over HTTP/1.1 keep-alive connections opened with asyncio streams.
+
+    Connections are pooled and shared by all coroutines of the loop.
+    A connection the node has closed meanwhile is replaced and the request sent again once.
+    """
+
+    def __init__(self, host="localhost", port=8545, path="/", pool_size=16):
+        """
+        :param pool_size: Most connections open at a time, requests wait for a free one beyond this
+        """
+        self.host = host
+        self.port = port
+        self.path = path
+        self.pool_size = pool_size
+
+        self.idle = asyncio.Queue()
+        self.created = 0
+        self.ids = itertools.count(1)
+
+        self.request_count = 0
+        self.total_latency = 0.0
+
+    async def acquire(self) -> tuple:
+        if self.idle.empty() and self.created < self.pool_size:
+            self.created += 1
+            try:
+                return await asyncio.open_connection(self.host, self.port)
+            except Exception:
+                self.created -= 1
+                raise
+        return await self.idle.get()
+
+    def discard(self, connection: tuple):
+        connection[1].close()
+        self.created -= 1
+
+    async def post(self, connection: tuple, body: bytes) -> tuple:
+        """Send a request and read its response.
+
+        :return: (response body, whether the connection can be reused)
+        """
+        reader, writer = connection
+
+        head = "POST {} HTTP/1.1\r\nHost: {}:{}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n".format(
+            self.path, self.host, self.port, len(body))
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by the node")
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip().lower()
+
+        if headers.get("transfer-encoding") == "chunked":
+            data = bytearray()
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    # Skip trailers until the final empty line
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                data += await reader.readexactly(size)
+                await reader.readline()
+            data = bytes(data)
+        else:
+            data = await reader.readexactly(int(headers.get("content-length", 0)))
+
+        if status != 200:
+            raise RPCError("HTTP {}".format(status))
+
+        return data, headers.get("connection") != "close"
+
+    async def request(self, method: str, params: list) -> Any:
+        """Send one JSON-RPC request.
+
+        :return: ``result`` of the response, raw as the node sent it
+        """
+
+        body = json.dumps({"jsonrpc": "2.0", "id": next(self.ids), "method": method, "params": params}).encode("utf-8")
+
+        started = time.time()
+        connection = await self.acquire()
+        try:
+            data, reusable = await self.post(connection, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # Keep-alive connection was closed by the node, try once with a fresh one
+            self.discard(connection)
+            connection = await self.acquire()
+            try:
+                data, reusable = await self.post(connection, body)
+            except BaseException:
+                self.discard(connection)
+                raise
+        except BaseException:
+            # Also on cancel, as the response may still be coming
+            self.discard(connection)
+            raise
+
+        if reusable:
+            self.idle.put_nowait(connection)
+        else:
+            self.discard(connection)
+
+        self.request_count += 1
+        self.total_latency += time.time() - started
+
+        response = json.loads(data.decode("utf-8"))
+        if "error" in response:
+            raise RPCError(response["error"])
+        return response["result"]
+
+    def close(self):
+        while not self.idle.empty():
+            self.discard(self.idle.get_nowait())
+
+    def get_stats(self) -> dict:
+        return {
+            "requests": self.request_count,
+            "connections": self.created,
+            "mean_latency": self.total_latency / self.request_count if self.request_count else 0.0,
+        }
+
+
+class AsyncReceiptConfirmer:
+    """asyncio counterpart of :class:`eireg.confirmer.ReceiptConfirmer`.
+
+    One task follows new blocks and resolves the futures of all our
+    transactions found in them, so waiting rows cost no requests of their own.
+    """
+
+    def __init__(self, rpc: AsyncRPC, poll_interval=1.0, timeout=180, recent_blocks=64):
+        """Parameters as in :class:`eireg.confirmer.ReceiptConfirmer`, polling with :func:`eireg.poller.poll_forever`."""
+        self.rpc = rpc
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.recent_blocks = recent_blocks
+
+        # txid -> (future, submitted at, deadline)
+        self.pending = {}
+
+        # Mined transactions whose receipt is still to be read: (txid, pending, block number, gas)
+        self.ready = []
+
+        # Transactions seen in already processed blocks: txid -> (block number, gas)
+        self.recent = {}
+        self.recent_by_block = []
+
+        self.last_block = None
+        self.task = None
+
+        self.confirmed_count = 0
+        self.failed_count = 0
+        self.timeout_count = 0
+        self.total_latency = 0.0
+
+    async def start(self):
+        self.last_block = int(await self.rpc.request("eth_blockNumber", []), 16)
+        self.task = asyncio.ensure_future(poll_forever("AsyncReceiptConfirmer poll", self.poll, self.poll_interval))
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def submit(self, txid: str, timeout: Optional[float]=None) -> asyncio.Future:
+        """Start waiting for a transaction.
+
+        :return: Future resolving to :class:`Confirmation` or failing with :class:`ConfirmationTimeout`
+        """
+        future = asyncio.Future()
+        now = time.time()
+        txid = txid.lower()
+        pending = (future, now, now + (timeout or self.timeout))
+
+        if txid in self.recent:
+            # Mined before the caller got to submit it
+            self.ready.append((txid, pending) + self.recent[txid])
+        else:
+            self.pending[txid] = pending
+
+        return future
+
+    async def poll(self):
+        ready = self.ready
+        self.ready = []
+        if ready:
+            await asyncio.gather(*[self.try_resolve(*entry) for entry in ready])
+
+        head = int(await self.rpc.request("eth_blockNumber", []), 16)
+
+        while self.last_block < head:
+            await self.process_block(self.last_block + 1)
+            self.last_block += 1
+
+        self.expire()
+
+    async def process_block(self, block_number: int):
+        block = await self.rpc.request("eth_getBlockByNumber", [hex(block_number), True])
+
+        seen = []
+        resolving = []
+        for tx in block["transactions"]:
+            txid = tx["hash"].lower()
+            gas = int(tx["gas"], 16)
+            seen.append(txid)
+            self.recent[txid] = (block_number, gas)
+            pending = self.pending.pop(txid, None)
+            if pending:
+                resolving.append(self.try_resolve(txid, pending, block_number, gas))
+
+        if resolving:
+            await asyncio.gather(*resolving)
+
+        # Forget transactions of old blocks
+        self.recent_by_block.append(seen)
+        while len(self.recent_by_block) > self.recent_blocks:
+            for txid in self.recent_by_block.pop(0):
+                self.recent.pop(txid, None)
+
+    async def try_resolve(self, txid: str, pending: tuple, block_number: int, gas: int):
+        """Resolve a mined transaction, or keep it for the next poll if its receipt cannot be read now."""
+        try:
+            await self.resolve(txid, pending, block_number, gas)
+        except asyncio.CancelledError:
+            self.ready.append((txid, pending, block_number, gas))
+            raise
+        except Exception as e:
+            print("AsyncReceiptConfirmer could not read the receipt of {}: {}".format(txid, e))
+            self.ready.append((txid, pending, block_number, gas))
+
+    async def resolve(self, txid: str, pending: tuple, block_number: int, gas: int):
+        future, submitted_at, deadline = pending
+
+        receipt = await self.rpc.request("eth_getTransactionReceipt", [txid])
+        gas_used = int(receipt["gasUsed"], 16)
+
+        # EVM has only one error mode and it's consume all gas
+        success = gas != gas_used
+
+        latency = time.time() - submitted_at
+        self.confirmed_count += 1
+        if not success:
+            self.failed_count += 1
+        self.total_latency += latency
+
+        if not future.done():
+            future.set_result(Confirmation(txid, success, block_number, gas_used, latency))
+
+    def expire(self):
+        now = time.time()
+        expired = [txid for txid, pending in self.pending.items() if pending[2] < now]
+        for txid in expired:
+            future = self.pending.pop(txid)[0]
+            self.timeout_count += 1
+            if not future.done():
+                future.set_exception(ConfirmationTimeout("Transaction {} was not mined in time".format(txid)))
+
+        unread = [entry for entry in self.ready if entry[1][2] < now]
+        self.ready = [entry for entry in self.ready if entry[1][2] >= now]
+        for txid, pending, block_number, gas in unread:
+            self.timeout_count += 1
+            if not pending[0].done():
+                pending[0].set_exception(ConfirmationTimeout("Receipt of transaction {} could not be read in time".format(txid)))
+
+    def get_stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "confirmed": self.confirmed_count,
+            "failed": self.failed_count,
+            "timed_out": self.timeout_count,
+            "mean_latency": self.total_latency / self.confirmed_count if self.confirmed_count else 0.0,
+        }
+
+
+class AsyncRegistryClient:
+    """Call and transact the registry contract from coroutines.
+
+    The contract object is only used for its ABI, all requests go through :class:`AsyncRPC`.
+    Transaction nonces are counted locally, like :class:`eireg.blockchain.NonceManager`.
+
+    Usage::
+
+        client = AsyncRegistryClient(contract, AsyncRPC("localhost", 8545))
+        await client.start()
+        vat_id = await client.call("getVatIdByAddress", "OVT:3724303727")
+
+    """
+
+    def __init__(self, contract: Contract, rpc: AsyncRPC, sender: Optional[str]=None, signer: Optional[LocalAccount]=None,
+                 gas_price_interval=60.0):
+        """
+        :param sender: Account the node signs transactions with, defaults to the coinbase
+        :param signer: Sign transactions locally with this account and send them raw
+        :param gas_price_interval: See :class:`eireg.blockchain.GasPriceCache`
+        """
+        self.contract = contract
+        self.rpc = rpc
+        self.signer = signer
+        self.sender = signer.address if signer else sender
+        self.nonce = None
+        self.gas_prices = GasPriceCache(gas_price_interval)
+
+    async def start(self):
+        """Find the sending account and its next nonce. Not needed for calls only."""
+        if not self.sender:
+            self.sender = await self.rpc.request("eth_coinbase", [])
+        self.nonce = int(await self.rpc.request("eth_getTransactionCount", [self.sender, "pending"]), 16)
+
+    async def get_gas_price(self) -> int:
+        if self.gas_prices.is_stale():
+            self.gas_prices.update(int(await self.rpc.request("eth_gasPrice", []), 16))
+        return self.gas_prices.price
+
+    def reserve_nonce(self) -> int:
+        """Take the next nonce.
+
+        Does not yield to the loop, so nonces reserved in one go are consecutive.
+        """
+        nonce = self.nonce
+        self.nonce += 1
+        return nonce
+
+    async def call(self, function_name: str, *args) -> Any:
+        """Call a constant function and decode its return value like ``contract.call()``."""
+        fn_abi, data = encode_call(self.contract, function_name, args)
+        result = await self.rpc.request("eth_call", [{"to": self.contract.address, "data": data}, "latest"])
+        return decode_call_result(fn_abi, result)
+
+    async def send_transaction(self, nonce: int, gas: int, function_name: str, *args) -> str:
+        """Send a contract transaction with a reserved nonce.
+
+        :return: txid
+        """
+        fn_abi, data = encode_call(self.contract, function_name, args)
+
+        if self.signer:
+            raw = self.signer.sign_transaction(nonce, await self.get_gas_price(), gas, self.contract.address, data)
+            return await self.rpc.request("eth_sendRawTransaction", [raw])
+
+        transaction = {"from": self.sender, "to": self.contract.address, "data": data, "gas": hex(gas), "nonce": hex(nonce)}
+        return await self.rpc.request("eth_sendTransaction", [transaction])
+
+    async def fill_nonce(self, nonce: int) -> str:
+        """Use up a reserved nonce with an empty transfer to ourselves.
+
+        When the node rejects a transaction, its nonce is not consumed and every later
+        nonce, possibly already taken by other coroutines, would wait for it forever.
+        Filling the gap keeps them valid, where resetting the counter would hand them out twice.
+
+        :return: txid
+        """
+        if self.signer:
+            raw = self.signer.sign_transaction(nonce, await self.get_gas_price(), 21000, self.sender, "0x")
+            return await self.rpc.request("eth_sendRawTransaction", [raw])
+
+        transaction = {"from": self.sender, "to": self.sender, "value": "0x0", "gas": hex(21000), "nonce": hex(nonce)}
+        return await self.rpc.request("eth_sendTransaction", [transaction])
+
+    async def has_company(self, vat_id: str) -> bool:
+        return await self.call("hasCompany", vat_id)
+
+    async def get_vat_id_by_address(self, address: str) -> str:
+        return await self.call("getVatIdByAddress", address)
+
+    async def get_business_information(self, vat_id: str, content_type: int) -> str:
+        return await self.call("getBusinessInformation", vat_id, content_type)
+
+    async def get_address_information(self, address: str, content_type: int) -> str:
+        return await self.call("getAddressInformation", address, content_type)
+
+    async def get_company_preferences(self, vat_id: str) -> str:
+        return await self.call("getCompanyPreferences", vat_id)
+
+    async def get_company(self, vat_id: str, page_size=100) -> Optional[CompanyRecord]:
+        """Read a company with all of its invoicing addresses, see :meth:`eireg.client.RegistryClient.get_company`."""
+
+        packed, lengths, address_count = await self.call("getCompanyRecord", vat_id, 0, page_size)
+        record = decode_company_record(vat_id, packed, lengths, address_count)
+
+        if record is None or address_count <= page_size:
+            return record
+
+        pages = await asyncio.gather(*[self.call("getCompanyRecord", vat_id, offset, page_size)
+                                       for offset in range(page_size, address_count, page_size)])
+        for packed, lengths, page_count in pages:
+            record.addresses += decode_company_record(vat_id, packed, lengths, page_count).addresses
+
+        return record
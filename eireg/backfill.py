@@ -0,0 +1,150 @@
+"""Backfill contract event history in parallel block range chunks."""
+
+import collections
+import concurrent.futures
+import threading
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from web3.contract import Contract
+
+from eireg.events import get_events
+
+
+class EventBackfill:
+    """Fetch the events of a long block range, e.g. from the deploy block, in parallel chunks.
+
+    The range is split into chunks fetched by ``max_workers`` threads, while
+    results are handed out strictly in block order. The chunk size adapts to
+    how dense the events are: it grows while chunks return few events and shrinks
+    when they return more than ``target_events``.
+
+    A chunk whose request fails, e.g. because the node refuses to return that many
+    logs or times out, is bisected and its halves fetched again, down to single blocks.
+    Chunks do not grow back to the size which failed.
+
+    Usage::
+
+        backfill = EventBackfill(contract, ["CompanyCreated", "InvoicingAddressCreated"])
+        for event in backfill.iter_events(deploy_block, checkpoint=save_last_block):
+            process(event)
+
+    """
+
+    def __init__(self,
+                 contract: Contract,
+                 event_names: Iterable[str],
+                 chunk_size=5000,
+                 max_workers=8,
+                 target_events=2000,
+                 max_chunk_size=100000,
+                 fetch_range: Optional[Callable[[int, int], List[dict]]]=None):
+        """
+        :param chunk_size: Blocks in the first chunks
+        :param max_workers: Chunk requests in flight at a time
+        :param target_events: Events we would like a chunk to return, at most
+        :param max_chunk_size: Chunks never grow beyond this many blocks
+        :param fetch_range: Function fetching the events of a block range, inclusive, defaults to :func:`eireg.events.get_events`
+        """
+        self.contract = contract
+        self.event_names = list(event_names)
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.target_events = target_events
+        self.max_chunk_size = max_chunk_size
+        self.fetch_range = fetch_range or self.get_events
+
+        #: Largest chunk size we grow to, lowered when chunks fail
+        self.ceiling = max_chunk_size
+
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.bisect_count = 0
+        self.event_count = 0
+
+    def get_events(self, from_block: int, to_block: int) -> List[dict]:
+        return get_events(self.contract, self.event_names, from_block, to_block)
+
+    def fetch(self, from_block: int, to_block: int) -> List[dict]:
+        """Events of one chunk, bisecting it if the request fails."""
+
+        with self.lock:
+            self.request_count += 1
+
+        try:
+            events = self.fetch_range(from_block, to_block)
+        except Exception:
+            if from_block == to_block:
+                raise
+
+            with self.lock:
+                self.bisect_count += 1
+                # Following chunks are likely as dense
+                self.ceiling = max(min(self.ceiling, (to_block - from_block + 1) // 2), 1)
+                self.chunk_size = min(self.chunk_size, self.ceiling)
+
+            middle = (from_block + to_block) // 2
+            return self.fetch(from_block, middle) + self.fetch(middle + 1, to_block)
+
+        self.adapt(to_block - from_block + 1, len(events))
+        return events
+
+    def adapt(self, blocks: int, events: int):
+        """Size the next chunks by the event density of a fetched one."""
+        with self.lock:
+            self.event_count += events
+            if events > self.target_events:
+                self.chunk_size = max(min(self.chunk_size, blocks * self.target_events // events), 1)
+            elif events < self.target_events // 4 and blocks >= self.chunk_size:
+                self.chunk_size = min(self.chunk_size * 2, self.ceiling)
+
+    def iter_chunks(self, from_block: int, to_block: Optional[int]=None) -> Iterator[Tuple[int, List[dict]]]:
+        """Fetch a block range in parallel and yield its chunks in block order.
+
+        :param to_block: Last block, inclusive, defaults to the latest block
+        :return: Iterator of (last block of the chunk, events of the chunk in block order)
+        """
+
+        if to_block is None:
+            to_block = self.contract.web3.eth.blockNumber
+
+        pending = collections.deque()
+        next_block = from_block
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                while pending or next_block <= to_block:
+
+                    # Keep every worker busy, with some chunks queued behind them
+                    while next_block <= to_block and len(pending) < self.max_workers * 2:
+                        chunk_end = min(next_block + self.chunk_size - 1, to_block)
+                        pending.append((chunk_end, executor.submit(self.fetch, next_block, chunk_end)))
+                        next_block = chunk_end + 1
+
+                    chunk_end, future = pending.popleft()
+                    yield chunk_end, future.result()
+            finally:
+                # Consumer stopped early or a chunk failed, do not fetch the rest
+                for chunk_end, future in pending:
+                    future.cancel()
+
+    def iter_events(self, from_block: int, to_block: Optional[int]=None,
+                    checkpoint: Optional[Callable[[int], None]]=None) -> Iterator[dict]:
+        """Yield the events of a block range in block order.
+
+        :param checkpoint: Called with the last block of each chunk once all of its events have been consumed,
+            so a consumer can store where to resume from
+        """
+        for chunk_end, events in self.iter_chunks(from_block, to_block):
+            for event in events:
+                yield event
+            if checkpoint:
+                checkpoint(chunk_end)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "requests": self.request_count,
+                "bisections": self.bisect_count,
+                "events": self.event_count,
+                "chunk_size": self.chunk_size,
+            }
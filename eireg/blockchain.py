@@ -1,12 +1,26 @@
-from typing import Union
+import threading
+import time
+from typing import Optional, Union
 
 from web3 import Web3
 from web3.contract import Contract
 from web3.utils.transactions import wait_for_transaction_receipt
 
+from eireg.confirmer import ReceiptConfirmer
 
-def check_succesful_tx(web3: Union[Web3, Contract], txid: str, timeout=180) -> bool:
-    """See if transaction went through (Solidity code did not throw)"""
+
+#: SSTORE of a new 32 byte storage word plus the calldata carrying it
+STORAGE_WORD_GAS = 20000 + 32 * 68
+
+
+def check_succesful_tx(web3: Union[Web3, Contract], txid: str, timeout=180, confirmer: Optional[ReceiptConfirmer]=None) -> bool:
+    """See if transaction went through (Solidity code did not throw)
+
+    :param confirmer: Wait on a shared block follower instead of polling the receipt of this transaction
+    """
+
+    if confirmer:
+        return confirmer.wait(txid, timeout=timeout)
 
     if isinstance(web3, Contract):
         web3 = web3.web3
@@ -17,3 +31,60 @@ def check_succesful_tx(web3: Union[Web3, Contract], txid: str, timeout=180) -> b
 
     # EVM has only one error mode and it's consume all gas
     return txinfo["gas"] != receipt["gasUsed"]
+
+
+class NonceManager:
+    """Hand out transaction nonces for one sending account.
+
+    The node assigns a nonce for each ``eth_sendTransaction`` by itself,
+    but then we cannot know the order of our transactions or send
+    several of them from different threads without waiting.
+    We read the pending transaction count once and count up from there.
+    """
+
+    def __init__(self, web3: Web3, address: str):
+        self.web3 = web3
+        self.address = address
+        self.lock = threading.Lock()
+        self.nonce = None
+        self.reset()
+
+    def reset(self):
+        """Resynchronize with the node after a transaction was rejected and its nonce was not consumed."""
+        with self.lock:
+            self.nonce = self.web3.eth.getTransactionCount(self.address, "pending")
+
+    def next(self) -> int:
+        """Reserve the next nonce for a transaction."""
+        with self.lock:
+            nonce = self.nonce
+            self.nonce += 1
+            return nonce
+
+
+class GasPriceCache:
+    """Gas price for locally signed transactions, following the node during long imports.
+
+    The node is asked again only when the price is older than ``interval`` seconds.
+    Reading the price is left to the caller, so this works for both blocking and asyncio clients::
+
+        if gas_prices.is_stale():
+            gas_prices.update(web3.eth.gasPrice)
+        gas_price = gas_prices.price
+
+    """
+
+    def __init__(self, interval=60.0):
+        """
+        :param interval: Seconds between reading the node gas price
+        """
+        self.interval = interval
+        self.price = None
+        self.read_at = 0
+
+    def is_stale(self) -> bool:
+        return self.price is None or time.time() - self.read_at >= self.interval
+
+    def update(self, price: int):
+        self.price = price
+        self.read_at = time.time()
@@ -0,0 +1,246 @@
+"""Read-through cache of registry lookups, invalidated by contract events."""
+
+import collections
+import threading
+import time
+from typing import Any, Iterable, Optional
+
+from eireg.client import RegistryClient
+from eireg.data import CompanyRecord, ContentType, decode_payload, resolve_operator
+from eireg.events import get_events
+from eireg.poller import Poller
+
+
+#: Events after which cached reads of a record may be stale
+COMPANY_EVENTS = ("CompanyCreated", "CompanyUpdated", "CompanyPreferencesUpdated")
+ADDRESS_EVENTS = ("InvoicingAddressCreated", "InvoicingAddressUpdated")
+OPERATOR_EVENTS = ("OperatorUpdated",)
+
+INVALIDATING_EVENTS = COMPANY_EVENTS + ADDRESS_EVENTS + OPERATOR_EVENTS
+
+
+class CachedRegistry:
+    """Registry lookups served from memory until an event tells the record changed.
+
+    Entries are kept in LRU order, at most ``max_size`` of them. With ``ttl``
+    an entry is also dropped after that many seconds, as a safety net.
+
+    Each entry is tagged with the VAT IDs, invoicing addresses and operators it depends on.
+    :meth:`sync` reads ``CompanyCreated``, ``CompanyUpdated``, ``CompanyPreferencesUpdated``,
+    ``InvoicingAddressCreated``, ``InvoicingAddressUpdated`` and ``OperatorUpdated`` events of new blocks
+    and drops exactly the entries of the records they name. Run it for every new
+    block, e.g. with :meth:`start`, so no lookup returns data older than the latest block.
+
+    Usage::
+
+        with RegistryClient(contract) as client, CachedRegistry(client) as registry:
+            vat_id = registry.get_vat_id_by_address("OVT:3724303727")
+
+    """
+
+    def __init__(self, client: RegistryClient, max_size=10000, ttl: Optional[float]=None, poll_interval=1.0):
+        """
+        :param max_size: Most entries kept, least recently used are evicted first
+        :param ttl: Seconds an entry may be served, forever until invalidated if not given
+        :param poll_interval: Interval of the background :class:`Poller` running :meth:`sync`
+        """
+        self.client = client
+        self.contract = client.contract
+        self.max_size = max_size
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+
+        self.lock = threading.Lock()
+
+        #: (function name, args) -> (value, expires at, tags)
+        self.entries = collections.OrderedDict()
+
+        #: Tag, e.g. ("address", "OVT:3724303727") -> keys of entries depending on it
+        self.keys_by_tag = {}
+
+        #: Bumped by every invalidation, so a read racing with one is not stored
+        self.generation = 0
+
+        self.last_block = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self.poller = Poller("CachedRegistry sync", self.sync, poll_interval)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        """Follow new blocks in a background thread."""
+        self.sync()
+        self.poller.start()
+
+    def stop(self):
+        self.poller.stop()
+
+    def sync(self, to_block: Optional[int]=None):
+        """Drop entries of records changed in blocks since the last sync.
+
+        The first sync only marks the current block, as the cache starts empty.
+        """
+
+        if to_block is None:
+            to_block = self.contract.web3.eth.blockNumber
+
+        if self.last_block is None:
+            self.last_block = to_block
+            return
+
+        if to_block <= self.last_block:
+            return
+
+        events = get_events(self.contract, INVALIDATING_EVENTS, self.last_block + 1, to_block)
+
+        tags = set()
+        addresses = []
+        for event in events:
+            if event["event"] in COMPANY_EVENTS:
+                tags.add(("vat", event["args"]["vatId"]))
+            elif event["event"] in OPERATOR_EVENTS:
+                tags.add(("operator", event["args"]["operatorId"]))
+            else:
+                address = event["args"]["invoicingAddress"]
+                tags.add(("address", address))
+                addresses.append(address)
+
+        # Address events do not tell the company, but its record lists the address data
+        vat_ids = [self.client.submit("getVatIdByAddress", address) for address in set(addresses)]
+        tags.update(("vat", vat_id.result()) for vat_id in vat_ids)
+
+        self.invalidate(tags)
+        self.last_block = to_block
+
+    def invalidate(self, tags: Iterable[tuple]):
+        """Drop all entries depending on any of the tags."""
+        with self.lock:
+            self.generation += 1
+            for tag in tags:
+                for key in self.keys_by_tag.pop(tag, ()):
+                    if key in self.entries:
+                        self.remove(key)
+                        self.invalidations += 1
+
+    def remove(self, key: tuple):
+        """Drop an entry and its tags. Caller holds the lock."""
+        value, expires_at, tags = self.entries.pop(key)
+        for tag in tags:
+            keys = self.keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_tag[tag]
+
+    def lookup(self, key: tuple) -> tuple:
+        """:return: (True, value) on a hit, (False, None) on a miss"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and (entry[1] is None or entry[1] > time.time()):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[0]
+
+            if entry:
+                # Expired
+                self.remove(key)
+
+            self.misses += 1
+            return False, None
+
+    def store(self, key: tuple, value: Any, tags: Iterable[tuple], generation: int):
+        with self.lock:
+            if generation != self.generation:
+                # Records changed while we read, the value may be older than the invalidation
+                return
+
+            if key in self.entries:
+                self.remove(key)
+
+            tags = set(tags)
+            expires_at = time.time() + self.ttl if self.ttl else None
+            self.entries[key] = (value, expires_at, tags)
+            for tag in tags:
+                self.keys_by_tag.setdefault(tag, set()).add(key)
+
+            while len(self.entries) > self.max_size:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def read(self, tags: Iterable[tuple], function_name: str, *args) -> Any:
+        """Return a cached contract call result, or call the contract and cache it."""
+
+        key = (function_name,) + args
+
+        hit, value = self.lookup(key)
+        if hit:
+            return value
+
+        generation = self.generation
+        value = self.client.submit(function_name, *args).result()
+        self.store(key, value, tags, generation)
+        return value
+
+    def get_vat_id_by_address(self, address: str) -> str:
+        return self.read([("address", address)], "getVatIdByAddress", address)
+
+    def get_address_information(self, address: str, content_type: int) -> str:
+        return self.read([("address", address)], "getAddressInformation", address, content_type)
+
+    def get_business_information(self, vat_id: str, content_type: int) -> str:
+        return self.read([("vat", vat_id)], "getBusinessInformation", vat_id, content_type)
+
+    def get_company_preferences(self, vat_id: str) -> str:
+        return self.read([("vat", vat_id)], "getCompanyPreferences", vat_id)
+
+    def get_operator(self, operator_id: str) -> Optional[dict]:
+        """Decoded operator record, None if there is none."""
+        return decode_payload(ContentType.OperatorPublicData,
+                              self.read([("operator", operator_id)], "getOperatorData", operator_id))
+
+    def get_address_data(self, address: str) -> Optional[dict]:
+        """Decoded Tieke data of an invoicing address, with a referenced operator resolved.
+
+        Operators are shared by thousands of addresses, so they are nearly always served from the cache.
+        """
+        payload = self.get_address_information(address, ContentType.TiekeAddressData.value)
+        data = decode_payload(ContentType.TiekeAddressData, payload)
+        if data is None or "operatorName" in data:
+            return data
+        return resolve_operator(data, self.get_operator(data["operatorId"]))
+
+    def get_company(self, vat_id: str) -> Optional[CompanyRecord]:
+        """Cached :meth:`RegistryClient.get_company`."""
+
+        key = ("getCompany", vat_id)
+
+        hit, record = self.lookup(key)
+        if hit:
+            return record
+
+        generation = self.generation
+        record = self.client.get_company(vat_id)
+        tags = [("vat", vat_id)] + [("address", address.address) for address in (record.addresses if record else [])]
+        self.store(key, record, tags, generation)
+        return record
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "last_block": self.last_block,
+            }
@@ -0,0 +1,391 @@
+"""Registry reads over batched JSON-RPC and a shared keep-alive HTTP connection pool."""
+
+import concurrent.futures
+import http.client
+import itertools
+import json
+import queue
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+
+from eth_abi import decode_abi
+from web3 import Web3
+from web3.contract import Contract
+from web3.utils.abi import get_abi_output_types, normalize_return_type
+
+from eireg.data import CompanyRecord, decode_company_record
+from eireg.utils import bytes32_to_string, string_to_bytes32
+
+
+class RPCError(Exception):
+    """The node answered a request with an error."""
+
+
+def encode_call(contract: Contract, function_name: str, args: tuple) -> Tuple[dict, str]:
+    """Find the ABI of a contract function and encode a call to it.
+
+    Registry keys are ``bytes32``. Keys given as strings are packed with
+    :func:`eireg.utils.string_to_bytes32`, already packed keys are passed as is.
+
+    :return: (function ABI, call data)
+    """
+    fn_abi = contract._find_matching_fn_abi(function_name, args)
+    args = tuple(string_to_bytes32(arg) if isinstance(arg, str) and abi_input["type"] == "bytes32" else arg
+                 for abi_input, arg in zip(fn_abi["inputs"], args))
+    return fn_abi, contract.encodeABI(function_name, args)
+
+
+def decode_call_result(fn_abi: dict, result: str) -> Any:
+    """Decode an ``eth_call`` result the same way as ``contract.call()``.
+
+    Registry keys, the ``bytes32`` outputs, are returned as strings.
+    """
+    output_types = get_abi_output_types(fn_abi)
+    output_data = decode_abi(output_types, result)
+    normalized = [normalize_return_type(data_type, data_value) for data_type, data_value in zip(output_types, output_data)]
+    normalized = [bytes32_to_string(value) if data_type == "bytes32" else value for data_type, value in zip(output_types, normalized)]
+    if len(normalized) == 1:
+        return normalized[0]
+    return normalized
+
+
+class HTTPTransport:
+    """Send JSON-RPC batches over a pool of persistent HTTP connections.
+
+    Connections are kept open between requests and shared by all threads.
+    A connection the node has closed meanwhile is replaced and the request sent again once.
+    """
+
+    def __init__(self, host="localhost", port=8545, path="/", ssl=False, pool_size=8, timeout=60):
+        """
+        :param pool_size: Most connections open at a time, callers wait for a free one beyond this
+        :param timeout: Socket timeout in seconds
+        """
+        self.host = host
+        self.port = port
+        self.path = path
+        self.ssl = ssl
+        self.timeout = timeout
+        self.pool_size = pool_size
+
+        self.lock = threading.Lock()
+        self.idle = queue.Queue()
+        self.created = 0
+
+    def connect(self) -> http.client.HTTPConnection:
+        if self.ssl:
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def acquire(self) -> http.client.HTTPConnection:
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            create = self.created < self.pool_size
+            if create:
+                self.created += 1
+
+        if create:
+            return self.connect()
+
+        return self.idle.get()
+
+    def post(self, connection: http.client.HTTPConnection, body: bytes) -> bytes:
+        connection.request("POST", self.path, body, {"Content-Type": "application/json", "Connection": "keep-alive"})
+        response = connection.getresponse()
+        data = response.read()
+        if response.status != 200:
+            raise RPCError("HTTP {} {}".format(response.status, response.reason))
+        return data
+
+    def send_batch(self, requests: List[dict]) -> List[dict]:
+        """POST a batch and return the responses, in any order."""
+
+        body = json.dumps(requests).encode("utf-8")
+        connection = self.acquire()
+
+        try:
+            try:
+                data = self.post(connection, body)
+            except (http.client.HTTPException, ConnectionError):
+                # Keep-alive connection was closed by the node, try once with a fresh one
+                connection.close()
+                data = self.post(connection, body)
+        except Exception:
+            connection.close()
+            raise
+        finally:
+            self.idle.put(connection)
+
+        responses = json.loads(data.decode("utf-8"))
+
+        # A node without batch support answers with a single error object
+        if isinstance(responses, dict):
+            raise RPCError(responses.get("error", responses))
+
+        return responses
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class ProviderTransport:
+    """Run a batch request by request through the web3 provider.
+
+    For providers we cannot reach over HTTP, e.g. the tester chain in unit tests.
+    """
+
+    def __init__(self, web3: Web3):
+        self.web3 = web3
+
+    def request(self, method: str, params: list) -> dict:
+        """Make one request through the public provider interface.
+
+        :return: JSON-RPC response with ``result`` or ``error``
+        """
+        response = self.web3.currentProvider.make_request(method, params)
+        if isinstance(response, dict):
+            return response
+
+        # RPC providers give the raw response body
+        if isinstance(response, bytes):
+            response = response.decode("utf-8")
+        return json.loads(response)
+
+    def send_batch(self, requests: List[dict]) -> List[dict]:
+        responses = []
+        for request in requests:
+            try:
+                response = self.request(request["method"], request["params"])
+                if "error" in response:
+                    responses.append({"id": request["id"], "error": response["error"]})
+                else:
+                    responses.append({"id": request["id"], "result": response["result"]})
+            except Exception as e:
+                responses.append({"id": request["id"], "error": {"message": str(e)}})
+        return responses
+
+    def close(self):
+        pass
+
+
+def create_transport(web3: Web3, pool_size=8):
+    """Talk directly HTTP to the node of an RPC provider, otherwise go through the provider."""
+
+    provider = web3.currentProvider
+    if getattr(provider, "host", None) and getattr(provider, "port", None):
+        return HTTPTransport(provider.host, provider.port,
+                             path=getattr(provider, "path", "/"),
+                             ssl=getattr(provider, "ssl", False),
+                             pool_size=pool_size)
+
+    return ProviderTransport(web3)
+
+
+class _CallProxy:
+    """Blocking ``client.call().getterName(*args)``, like ``contract.call()``."""
+
+    def __init__(self, client: "RegistryClient"):
+        self.client = client
+
+    def __getattr__(self, function_name):
+        def call(*args):
+            return self.client.submit(function_name, *args).result()
+        return call
+
+
+class RegistryClient:
+    """Constant contract calls coalesced into JSON-RPC batches.
+
+    Calls submitted from any thread are queued. A dispatcher thread takes the
+    first queued call, waits up to ``window`` seconds for more and sends them all
+    as one batch of ``eth_call`` requests, at most ``max_batch`` calls each.
+    Batches are sent in parallel on the connections of the transport.
+
+    Usage::
+
+        with RegistryClient(contract) as client:
+            futures = [client.submit("getVatIdByAddress", address) for address in addresses]
+            vat_ids = [future.result() for future in futures]
+
+            # Or one blocking call, like with contract.call()
+            client.call().hasCompany("FI24303727")
+
+    One client can be shared by several readers, e.g. a :class:`~eireg.replica.RegistryReplica`
+    and an :class:`~eireg.inbox.InvoiceInbox`, so their calls fill the same batches.
+    A reader closes only a client it created itself.
+    """
+
+    def __init__(self, contract: Contract, transport=None, window=0.002, max_batch=100, pool_size=8):
+        """
+        :param transport: :class:`HTTPTransport` or :class:`ProviderTransport`, picked by the web3 provider if not given
+        :param window: Seconds to wait for more calls to fill a batch
+        :param max_batch: Most calls in one batch request
+        :param pool_size: Batches in flight at a time, and HTTP connections of a default transport
+        """
+        self.contract = contract
+        self.transport = transport or create_transport(contract.web3, pool_size)
+        self.window = window
+        self.max_batch = max_batch
+
+        self.queue = queue.Queue()
+        self.ids = itertools.count(1)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=pool_size)
+
+        # Batch statistics
+        self.lock = threading.Lock()
+        self.call_count = 0
+        self.batch_count = 0
+        self.error_count = 0
+        self.max_batch_size = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+        self.thread = threading.Thread(target=self.run, name="RegistryClient", daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Send what is queued and stop."""
+        self.queue.put(None)
+        self.thread.join()
+        self.executor.shutdown()
+        self.transport.close()
+
+    def call(self) -> _CallProxy:
+        return _CallProxy(self)
+
+    def submit(self, function_name: str, *args, block_identifier="latest") -> concurrent.futures.Future:
+        """Queue a constant function call.
+
+        :param args: Function arguments, registry keys as strings or packed ``bytes32``
+        :param block_identifier: Block number whose state is read, or ``latest``
+        :return: Future resolving to the decoded return value, keys as strings
+        """
+        fn_abi, data = encode_call(self.contract, function_name, args)
+
+        if isinstance(block_identifier, int):
+            block_identifier = hex(block_identifier)
+
+        request = {
+            "jsonrpc": "2.0",
+            "id": next(self.ids),
+            "method": "eth_call",
+            "params": [{"to": self.contract.address, "data": data}, block_identifier],
+        }
+
+        future = concurrent.futures.Future()
+        self.queue.put((request, fn_abi, future))
+        return future
+
+    def get_company(self, vat_id: str, page_size=100) -> Optional[CompanyRecord]:
+        """Read a company with all of its invoicing addresses.
+
+        One call for up to ``page_size`` addresses. The pages of companies
+        with more addresses are read in parallel, in one batch.
+
+        :return: None if the company does not exist
+        """
+
+        packed, lengths, address_count = self.submit("getCompanyRecord", vat_id, 0, page_size).result()
+        record = decode_company_record(vat_id, packed, lengths, address_count)
+
+        if record is None or address_count <= page_size:
+            return record
+
+        pages = [self.submit("getCompanyRecord", vat_id, offset, page_size) for offset in range(page_size, address_count, page_size)]
+        for page in pages:
+            packed, lengths, page_count = page.result()
+            record.addresses += decode_company_record(vat_id, packed, lengths, page_count).addresses
+
+        return record
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            batch = [item]
+            deadline = time.time() + self.window
+
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self.executor.submit(self.send, batch)
+
+    def send(self, batch: List[tuple]):
+        """Send one batch and resolve its futures."""
+
+        started = time.time()
+
+        try:
+            responses = self.transport.send_batch([request for request, fn_abi, future in batch])
+        except Exception as e:
+            with self.lock:
+                self.error_count += len(batch)
+            for request, fn_abi, future in batch:
+                future.set_exception(e)
+            return
+
+        self.record(len(batch), time.time() - started)
+
+        by_id = {response.get("id"): response for response in responses}
+
+        for request, fn_abi, future in batch:
+            response = by_id.get(request["id"])
+            try:
+                if response is None:
+                    raise RPCError("No response to request {}".format(request["id"]))
+                if "error" in response:
+                    raise RPCError(response["error"])
+                future.set_result(self.decode(fn_abi, response["result"]))
+            except Exception as e:
+                with self.lock:
+                    self.error_count += 1
+                future.set_exception(e)
+
+    def decode(self, fn_abi: dict, result: str) -> Any:
+        return decode_call_result(fn_abi, result)
+
+    def record(self, size: int, latency: float):
+        with self.lock:
+            self.call_count += size
+            self.batch_count += 1
+            self.max_batch_size = max(self.max_batch_size, size)
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def get_stats(self) -> dict:
+        """Report batch sizes and round trip latencies in seconds."""
+        with self.lock:
+            return {
+                "calls": self.call_count,
+                "batches": self.batch_count,
+                "errors": self.error_count,
+                "mean_batch_size": self.call_count / self.batch_count if self.batch_count else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "mean_latency": self.total_latency / self.batch_count if self.batch_count else 0.0,
+                "max_latency": self.max_latency,
+            }
@@ -0,0 +1,178 @@
+"""Scale the number of rows the importer keeps in flight by how the node keeps up."""
+
+import threading
+from typing import Callable, Optional
+
+from eireg.confirmer import ReceiptConfirmer
+from eireg.poller import Poller
+
+
+class ConcurrencyController:
+    """Additive increase, multiplicative decrease of the in-flight row target.
+
+    Every ``interval`` seconds the controller looks at what happened since the last look:
+
+    * confirmation latency of transactions mined in the interval, compared to the best interval seen so far
+    * share of transactions timing out, and share of rows failing with an error
+    * pending transaction count in the node txpool, if ``txpool_limit`` is given
+
+    If any of them tells the node is overloaded, the target is multiplied by ``backoff``.
+    Otherwise, if transactions got confirmed, the target grows by ``step``.
+    The target stays between ``minimum`` and ``maximum``.
+
+    The current target is in :attr:`target` and passed to ``on_change`` whenever it changes.
+    """
+
+    def __init__(self,
+                 confirmer: ReceiptConfirmer,
+                 on_change: Optional[Callable[[int], None]]=None,
+                 initial=8,
+                 minimum=1,
+                 maximum=256,
+                 interval=5.0,
+                 step=4,
+                 backoff=0.75,
+                 latency_tolerance=2.0,
+                 max_error_rate=0.05,
+                 txpool_limit: Optional[int]=None):
+        """
+        :param on_change: Called with the new target
+        :param latency_tolerance: How many times the best seen latency we accept before backing off
+        :param max_error_rate: Share of timed out transactions, or of failed rows, we accept before backing off
+        :param txpool_limit: Back off when the node has more pending transactions than this
+        """
+        self.confirmer = confirmer
+        self.on_change = on_change
+        self.minimum = minimum
+        self.maximum = maximum
+        self.interval = interval
+        self.step = step
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.txpool_limit = txpool_limit
+
+        self.lock = threading.Lock()
+
+        #: How many rows we want in flight
+        self.target = max(minimum, min(initial, maximum))
+
+        # Counters reported by the importer
+        self.errors = 0
+        self.rows = 0
+
+        # Confirmer stats and our counters at the previous adjustment
+        self.previous = confirmer.get_stats()
+        self.previous_errors = 0
+        self.previous_rows = 0
+
+        # Measurements of the last interval
+        self.latency = None
+        self.best_latency = None
+        self.error_rate = 0.0
+        self.txpool_pending = None
+        self.increases = 0
+        self.decreases = 0
+
+        self.poller = Poller("ConcurrencyController adjust", self.adjust, interval)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        """Start adjusting the target in a background thread."""
+        self.poller.start()
+
+    def stop(self):
+        self.poller.stop()
+
+    def record_row(self, success: bool):
+        """The importer finished a row."""
+        with self.lock:
+            self.rows += 1
+            if not success:
+                self.errors += 1
+
+    def get_txpool_pending(self) -> Optional[int]:
+        """Pending transactions in the node, None if the node does not tell."""
+        try:
+            return int(self.confirmer.web3.txpool.status["pending"], 16)
+        except Exception:
+            return None
+
+    def adjust(self) -> int:
+        """Measure the last interval and move the target.
+
+        :return: New target
+        """
+
+        stats = self.confirmer.get_stats()
+
+        with self.lock:
+            errors = self.errors - self.previous_errors
+            rows = self.rows - self.previous_rows
+            self.previous_errors = self.errors
+            self.previous_rows = self.rows
+
+        confirmed = stats["confirmed"] - self.previous["confirmed"]
+        timed_out = stats["timed_out"] - self.previous["timed_out"]
+        total_latency = stats["total_latency"] - self.previous["total_latency"]
+        self.previous = stats
+
+        if confirmed:
+            self.latency = total_latency / confirmed
+            if self.best_latency is None or self.latency < self.best_latency:
+                self.best_latency = self.latency
+        else:
+            self.latency = None
+
+        # Transactions and rows are different units, a row sends several transactions
+        timeout_rate = timed_out / max(confirmed + timed_out, 1)
+        row_error_rate = errors / max(rows, 1)
+        self.error_rate = max(timeout_rate, row_error_rate)
+
+        overloaded = self.error_rate > self.max_error_rate
+
+        if self.latency is not None and self.latency > self.best_latency * self.latency_tolerance:
+            overloaded = True
+
+        if self.txpool_limit:
+            self.txpool_pending = self.get_txpool_pending()
+            if self.txpool_pending is not None and self.txpool_pending > self.txpool_limit:
+                overloaded = True
+
+        if overloaded:
+            target = max(self.minimum, int(self.target * self.backoff))
+        elif confirmed:
+            target = min(self.maximum, self.target + self.step)
+        else:
+            # Nothing got mined, nothing to learn from
+            target = self.target
+
+        if target > self.target:
+            self.increases += 1
+        elif target < self.target:
+            self.decreases += 1
+
+        if target != self.target:
+            self.target = target
+            if self.on_change:
+                self.on_change(target)
+
+        return target
+
+    def get_stats(self) -> dict:
+        """Report the current target and the measurements it is based on."""
+        return {
+            "target": self.target,
+            "latency": self.latency,
+            "best_latency": self.best_latency,
+            "error_rate": self.error_rate,
+            "txpool_pending": self.txpool_pending,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
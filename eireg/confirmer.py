@@ -0,0 +1,251 @@
+"""Confirm transactions by following new blocks instead of polling each receipt."""
+
+import collections
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from web3 import Web3
+
+from eireg.poller import Poller
+
+
+class ConfirmationTimeout(Exception):
+    """Transaction was not mined within the given time."""
+
+
+class Confirmation:
+    """Outcome of one mined transaction."""
+
+    def __init__(self, txid: str, success: bool, block_number: int, gas_used: int, latency: float):
+        self.txid = txid
+
+        #: False if the transaction consumed all of its gas (Solidity code did throw)
+        self.success = success
+
+        self.block_number = block_number
+        self.gas_used = gas_used
+
+        #: Seconds from submit() until we saw the transaction in a block
+        self.latency = latency
+
+    def __bool__(self):
+        return self.success
+
+    def __repr__(self):
+        return "<Confirmation {} success:{} block:{} latency:{:.1f}s>".format(
+            self.txid, self.success, self.block_number, self.latency)
+
+
+class _Pending:
+
+    def __init__(self, future: Future, submitted_at: float, deadline: float):
+        self.future = future
+        self.submitted_at = submitted_at
+        self.deadline = deadline
+
+
+class ReceiptConfirmer:
+    """Shared service resolving many pending transactions per block.
+
+    One background thread asks the node for the latest block number.
+    For each new block it fetches the block with its transactions once
+    and resolves all of our pending txids found in it. A receipt is
+    only fetched for transactions we know are mined, so no thread
+    sits in a polling loop per transaction.
+
+    Usage::
+
+        with ReceiptConfirmer(web3) as confirmer:
+            future = confirmer.submit(txid)
+            assert future.result()
+
+    """
+
+    def __init__(self, web3: Web3, poll_interval=1.0, timeout=180, recent_blocks=64):
+        """
+        :param poll_interval: Interval of the background :class:`Poller` looking for new blocks
+        :param timeout: Default seconds to wait for a transaction to be mined
+        :param recent_blocks: How many processed blocks we remember, for transactions mined before they were submitted
+        """
+        self.web3 = web3
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.recent_blocks = recent_blocks
+
+        self.lock = threading.Lock()
+        self.pending = {}
+
+        # Transactions seen in already processed blocks: txid -> (block number, gas)
+        self.recent = {}
+        self.recent_by_block = collections.deque()
+
+        # Submitted transactions which we had already seen in a block
+        self.ready = []
+
+        self.last_block = None
+        self.poller = Poller("ReceiptConfirmer poll", self.poll, poll_interval)
+
+        # Latency statistics
+        self.confirmed_count = 0
+        self.failed_count = 0
+        self.timeout_count = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        """Start following blocks in a background thread."""
+        self.last_block = self.web3.eth.blockNumber
+        self.poller.start()
+
+    def stop(self):
+        """Stop the background thread. Pending futures stay unresolved."""
+        self.poller.stop()
+
+    def submit(self, txid: str, callback: Optional[Callable[[Future], None]]=None, timeout: Optional[float]=None) -> Future:
+        """Start waiting for a transaction.
+
+        :param callback: Called with the resolved future
+        :param timeout: Seconds until the future fails with :class:`ConfirmationTimeout`
+        :return: Future resolving to :class:`Confirmation`
+        """
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+
+        now = time.time()
+        pending = _Pending(future, now, now + (timeout or self.timeout))
+
+        txid = txid.lower()
+
+        with self.lock:
+            if txid in self.recent:
+                # Mined before the caller got to submit it
+                self.ready.append((txid, pending) + self.recent[txid])
+            else:
+                self.pending[txid] = pending
+
+        return future
+
+    def wait(self, txid: str, timeout: Optional[float]=None) -> bool:
+        """Block until the transaction is mined.
+
+        :return: True if the transaction went through
+        """
+        timeout = timeout or self.timeout
+        # The future fails by itself at the deadline, the margin only guards against a stopped confirmer
+        return self.submit(txid, timeout=timeout).result(timeout + self.poll_interval * 2).success
+
+    def poll(self):
+        """Process all blocks mined since the last poll and expire timed out transactions."""
+
+        with self.lock:
+            ready = self.ready
+            self.ready = []
+
+        for txid, pending, block_number, gas in ready:
+            self.try_resolve(txid, pending, block_number, gas)
+
+        head = self.web3.eth.blockNumber
+
+        while self.last_block < head:
+            self.process_block(self.last_block + 1)
+            self.last_block += 1
+
+        self.expire()
+
+    def process_block(self, block_number: int):
+        """Resolve all pending transactions included in a block."""
+
+        block = self.web3.eth.getBlock(block_number, True)
+
+        seen = []
+        for tx in block["transactions"]:
+            txid = tx["hash"].lower()
+            seen.append(txid)
+
+            with self.lock:
+                self.recent[txid] = (block_number, tx["gas"])
+                pending = self.pending.pop(txid, None)
+
+            if pending:
+                self.try_resolve(txid, pending, block_number, tx["gas"])
+
+        # Forget transactions of old blocks
+        with self.lock:
+            self.recent_by_block.append(seen)
+            while len(self.recent_by_block) > self.recent_blocks:
+                for txid in self.recent_by_block.popleft():
+                    self.recent.pop(txid, None)
+
+    def try_resolve(self, txid: str, pending: _Pending, block_number: int, gas: int):
+        """Resolve a mined transaction, or keep it for the next poll if its receipt cannot be read now."""
+        try:
+            self.resolve(txid, pending, block_number, gas)
+        except Exception as e:
+            print("ReceiptConfirmer could not read the receipt of {}: {}".format(txid, e))
+            with self.lock:
+                self.ready.append((txid, pending, block_number, gas))
+
+    def resolve(self, txid: str, pending: _Pending, block_number: int, gas: int):
+        """Complete the future of a mined transaction."""
+
+        receipt = self.web3.eth.getTransactionReceipt(txid)
+
+        # EVM has only one error mode and it's consume all gas
+        success = gas != receipt["gasUsed"]
+
+        latency = time.time() - pending.submitted_at
+        self.record(success, latency)
+
+        pending.future.set_result(Confirmation(txid, success, block_number, receipt["gasUsed"], latency))
+
+    def expire(self):
+        """Fail futures of transactions that were not mined, or whose receipt could not be read, in time."""
+
+        now = time.time()
+
+        with self.lock:
+            expired = [(txid, pending) for txid, pending in self.pending.items() if pending.deadline < now]
+            for txid, pending in expired:
+                del self.pending[txid]
+
+            unread = [(txid, pending) for txid, pending, block_number, gas in self.ready if pending.deadline < now]
+            self.ready = [entry for entry in self.ready if entry[1].deadline >= now]
+
+            self.timeout_count += len(expired) + len(unread)
+
+        for txid, pending in expired:
+            pending.future.set_exception(ConfirmationTimeout("Transaction {} was not mined in time".format(txid)))
+
+        for txid, pending in unread:
+            pending.future.set_exception(ConfirmationTimeout("Receipt of transaction {} could not be read in time".format(txid)))
+
+    def record(self, success: bool, latency: float):
+        with self.lock:
+            self.confirmed_count += 1
+            if not success:
+                self.failed_count += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def get_stats(self) -> dict:
+        """Report confirmation counts and latencies in seconds."""
+        with self.lock:
+            return {
+                "pending": len(self.pending),
+                "confirmed": self.confirmed_count,
+                "failed": self.failed_count,
+                "timed_out": self.timeout_count,
+                "total_latency": self.total_latency,
+                "mean_latency": self.total_latency / self.confirmed_count if self.confirmed_count else 0.0,
+                "max_latency": self.max_latency,
+            }
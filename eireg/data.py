@@ -6,7 +6,7 @@ TODO: Now hand mapped, use automation in the future.
 import enum
 import json
 
-from typing import List
+from typing import Dict, List, Optional, Union
 
 
 class ContentType(enum.Enum):
@@ -18,9 +18,223 @@ class ContentType(enum.Enum):
     TiekeAddressData = 5
 
 
+class Encoding(enum.Enum):
+    """How payloads are written to the contract. Readers detect the encoding by themselves."""
 
-def create_company_preferences(default_address: str, invoice_addresses: List[dict]) -> str:
-    """Return a JSON encoded string of a company preferences to be stored within the smart contract.
+    #: Self describing, any data
+    json = "json"
+
+    #: Schema positional fields, only the values are stored
+    compact = "compact"
+
+
+#: First character of a compact payload. JSON never starts with a control character.
+COMPACT_MARKER = "\x1e"
+
+#: Separates fields of a compact payload
+FIELD_SEPARATOR = "\x1f"
+
+#: Separates repeated entries, like invoicing addresses of company preferences
+ENTRY_SEPARATOR = "\x1d"
+
+#: Field names of compact payloads by content type and schema version.
+#: Strings come first in this order, booleans are packed as bits of one number at the end.
+#: Add a new version to change a schema, old payloads stay readable.
+#: Data is encoded with the latest version having exactly its fields.
+COMPACT_SCHEMAS = {
+    ContentType.TiekeCompanyData: {
+        1: (["name"], []),
+    },
+    ContentType.TiekeAddressData: {
+        1: (["operatorName", "operatorId"], ["permissionToSend", "sends", "receives"]),
+        # Operator referenced by its ID, see resolve_operator()
+        2: (["operatorId"], ["permissionToSend", "sends", "receives"]),
+    },
+    ContentType.OperatorPublicData: {
+        1: (["name"], []),
+    },
+}
+
+#: Schema of each entry of compact company preferences, after the default address
+PREFERENCES_SCHEMA_VERSION = 1
+PREFERENCES_ENTRY_FLAGS = ["permissionToSend", "sends", "receives"]
+
+
+def pack_flags(data: dict, names: List[str]) -> str:
+    return str(sum(1 << i for i, name in enumerate(names) if data[name]))
+
+
+def unpack_flags(value: str, names: List[str]) -> dict:
+    bits = int(value)
+    return {name: bool(bits & (1 << i)) for i, name in enumerate(names)}
+
+
+def is_plain(value) -> bool:
+    """String we can store as a compact field as is."""
+    return isinstance(value, str) and not any(c in value for c in (COMPACT_MARKER, FIELD_SEPARATOR, ENTRY_SEPARATOR))
+
+
+def encode_compact(content_type: ContentType, data: dict) -> Optional[str]:
+    """Encode with the latest schema of the content type fitting the data.
+
+    :return: None if the data does not fit the schema
+    """
+
+    versions = COMPACT_SCHEMAS.get(content_type, {})
+    matching = [version for version, (strings, flags) in versions.items() if set(data.keys()) == set(strings + flags)]
+    if not matching:
+        return None
+
+    version = max(matching)
+    strings, flags = versions[version]
+
+    if not all(is_plain(data[name]) for name in strings) or not all(isinstance(data[name], bool) for name in flags):
+        return None
+
+    fields = [data[name] for name in strings]
+    if flags:
+        fields.append(pack_flags(data, flags))
+
+    return COMPACT_MARKER + str(version) + FIELD_SEPARATOR + FIELD_SEPARATOR.join(fields)
+
+
+def decode_compact(content_type: ContentType, payload: str) -> dict:
+    version, *fields = payload[1:].split(FIELD_SEPARATOR)
+    strings, flags = COMPACT_SCHEMAS[content_type][int(version)]
+
+    data = dict(zip(strings, fields))
+    if flags:
+        data.update(unpack_flags(fields[len(strings)], flags))
+    return data
+
+
+def encode_payload(content_type: ContentType, data: dict, encoding: Encoding=Encoding.json) -> str:
+    """Encode data of a content type to be stored within the smart contract.
+
+    Data which does not fit the compact schema is written as JSON, so nothing is lost.
+    """
+    if encoding == Encoding.compact:
+        payload = encode_compact(content_type, data)
+        if payload is not None:
+            return payload
+    return json.dumps(data)
+
+
+def decode_payload(content_type: ContentType, payload: str) -> Optional[dict]:
+    """Decode a stored payload in any encoding.
+
+    :return: None for missing data
+    """
+    if not payload:
+        return None
+    if payload.startswith(COMPACT_MARKER):
+        return decode_compact(content_type, payload)
+    return json.loads(payload)
+
+
+def resolve_operator(address_data: dict, operator_data: Optional[dict]) -> dict:
+    """Fill in the operator of address data which only references it by ID.
+
+    :param operator_data: Decoded operator record of ``address_data["operatorId"]``, None if missing
+    :return: Address data with ``operatorName``, like addresses imported with the operator inline
+    """
+    if "operatorName" in address_data:
+        return address_data
+    resolved = dict(address_data)
+    resolved["operatorName"] = operator_data["name"] if operator_data else ""
+    return resolved
+
+
+#: Content types getCompanyRecord() returns for a company and for each invoicing address, in order
+RECORD_CONTENT_TYPES = [content_type for content_type in ContentType if content_type != ContentType.Undefined]
+
+
+class InvoicingAddressRecord:
+    """Invoicing address and all data stored behind it."""
+
+    def __init__(self, address: str, data: Dict[ContentType, str]):
+        self.address = address
+
+        #: Content type -> stored string, empty for missing data
+        self.data = data
+
+    def __repr__(self):
+        return "<InvoicingAddressRecord {}>".format(self.address)
+
+    def get_data(self, content_type: ContentType) -> Optional[dict]:
+        """Decoded data of a content type, None if not set."""
+        return decode_payload(content_type, self.data[content_type])
+
+
+class CompanyRecord:
+    """Company with its invoicing addresses, as returned by getCompanyRecord()."""
+
+    def __init__(self, vat_id: str, business_information: Dict[ContentType, str], preferences: str,
+                 addresses: List[InvoicingAddressRecord], address_count: int):
+        self.vat_id = vat_id
+
+        #: Content type -> stored string, empty for missing data
+        self.business_information = business_information
+
+        #: JSON encoded company preferences, empty if not set
+        self.preferences = preferences
+
+        #: Invoicing addresses in the order they were created
+        self.addresses = addresses
+
+        #: How many invoicing addresses the company has, more than ``addresses`` for a partial page
+        self.address_count = address_count
+
+    def __repr__(self):
+        return "<CompanyRecord {} addresses:{}>".format(self.vat_id, self.address_count)
+
+    def get_business_information(self, content_type: ContentType) -> Optional[dict]:
+        """Decoded business information of a content type, None if not set."""
+        return decode_payload(content_type, self.business_information[content_type])
+
+    def get_preferences(self) -> Optional[dict]:
+        return decode_company_preferences(self.preferences)
+
+
+def unpack_strings(packed: str, lengths: List[int]) -> List[str]:
+    """Split strings concatenated by the contract. Lengths are in UTF-8 bytes."""
+
+    data = packed.encode("utf-8")
+    assert sum(lengths) == len(data), "Lengths do not match the packed data"
+
+    result = []
+    offset = 0
+    for length in lengths:
+        result.append(data[offset:offset + length].decode("utf-8"))
+        offset += length
+    return result
+
+
+def decode_company_record(vat_id: str, packed: str, lengths: List[int], address_count: int) -> Optional[CompanyRecord]:
+    """Build :class:`CompanyRecord` from getCompanyRecord() output.
+
+    :return: None if the company does not exist
+    """
+
+    if not lengths:
+        return None
+
+    fields = unpack_strings(packed, lengths)
+    per_record = len(RECORD_CONTENT_TYPES) + 1
+    assert len(fields) % per_record == 0, "Unexpected field count {}".format(len(fields))
+
+    business_information = dict(zip(RECORD_CONTENT_TYPES, fields[:len(RECORD_CONTENT_TYPES)]))
+    preferences = fields[len(RECORD_CONTENT_TYPES)]
+
+    addresses = []
+    for start in range(per_record, len(fields), per_record):
+        addresses.append(InvoicingAddressRecord(fields[start], dict(zip(RECORD_CONTENT_TYPES, fields[start + 1:start + per_record]))))
+
+    return CompanyRecord(vat_id, business_information, preferences, addresses, address_count)
+
+
+def create_company_preferences(default_address: str, invoice_addresses: Union[dict, List[dict]], encoding: Encoding=Encoding.json) -> str:
+    """Return an encoded string of a company preferences to be stored within the smart contract.
 
     Example of company preferences data::
 
@@ -37,9 +251,73 @@ def create_company_preferences(default_address: str, invoice_addresses: List[dic
 
         }
 
+    The compact encoding stores the default address and then each invoicing address
+    with its flags and comma separated receive preferences as an entry.
+    Preferences of other shape are written as JSON.
     """
     data = {
         "defaultAddress": default_address,
         "invoiceAddresses": invoice_addresses,
     }
+
+    if encoding == Encoding.compact:
+        payload = encode_compact_preferences(data)
+        if payload is not None:
+            return payload
+
     return json.dumps(data)
+
+
+def encode_compact_preferences(data: dict) -> Optional[str]:
+    """:return: None if the preferences do not fit the compact schema"""
+
+    addresses = data["invoiceAddresses"]
+    if not isinstance(addresses, dict) or not is_plain(data["defaultAddress"]):
+        return None
+
+    entries = [COMPACT_MARKER + str(PREFERENCES_SCHEMA_VERSION) + FIELD_SEPARATOR + data["defaultAddress"]]
+
+    for address, preferences in addresses.items():
+        receive_preferences = preferences.get("receivePreferences", [])
+        if set(preferences.keys()) - {"receivePreferences"} != set(PREFERENCES_ENTRY_FLAGS) \
+                or not is_plain(address) \
+                or not all(is_plain(p) and "," not in p for p in receive_preferences) \
+                or not all(isinstance(preferences[name], bool) for name in PREFERENCES_ENTRY_FLAGS) \
+                or ("receivePreferences" in preferences and not receive_preferences):
+            return None
+
+        entries.append(FIELD_SEPARATOR.join([address, pack_flags(preferences, PREFERENCES_ENTRY_FLAGS), ",".join(receive_preferences)]))
+
+    return ENTRY_SEPARATOR.join(entries)
+
+
+def decode_company_preferences(payload: str) -> Optional[dict]:
+    """Decode stored company preferences in any encoding.
+
+    :return: None if not set
+    :raise ValueError: If the payload is not valid preferences of any schema
+    """
+
+    if not payload:
+        return None
+
+    if not payload.startswith(COMPACT_MARKER):
+        return json.loads(payload)
+
+    head, *entries = payload.split(ENTRY_SEPARATOR)
+    version, default_address = head[1:].split(FIELD_SEPARATOR)
+    if int(version) != PREFERENCES_SCHEMA_VERSION:
+        raise ValueError("Unknown preferences schema {}".format(version))
+
+    addresses = {}
+    for entry in entries:
+        address, flags, receive_preferences = entry.split(FIELD_SEPARATOR)
+        preferences = unpack_flags(flags, PREFERENCES_ENTRY_FLAGS)
+        if receive_preferences:
+            preferences["receivePreferences"] = receive_preferences.split(",")
+        addresses[address] = preferences
+
+    return {
+        "defaultAddress": default_address,
+        "invoiceAddresses": addresses,
+    }
@@ -0,0 +1,61 @@
+"""Read registry contract events from the chain."""
+
+from typing import Iterable, List, Optional
+
+from web3.contract import Contract
+from web3.utils.abi import event_abi_to_log_topic
+from web3.utils.events import get_event_data
+
+from eireg.utils import bytes32_to_string
+
+
+def get_event_topics(contract: Contract, event_names: Iterable[str]) -> dict:
+    """Map log topic hashes to event ABI definitions.
+
+    :return: dict of topic (hex) -> event ABI
+    """
+    topics = {}
+    for name in event_names:
+        event_abi = contract._find_matching_event_abi(name)
+        topics[event_abi_to_log_topic(event_abi)] = event_abi
+    return topics
+
+
+def decode_keys(event_abi: dict, event: dict) -> dict:
+    """Turn the ``bytes32`` arguments of a decoded event to strings."""
+    for abi_input in event_abi["inputs"]:
+        if abi_input["type"] == "bytes32":
+            event["args"][abi_input["name"]] = bytes32_to_string(event["args"][abi_input["name"]])
+    return event
+
+
+def get_events(contract: Contract, event_names: Iterable[str], from_block: int, to_block: int,
+               topics: Optional[list]=None) -> List[dict]:
+    """Fetch and decode contract events of several types from a block range.
+
+    All event types are asked in one ``eth_getFilterLogs`` request.
+
+    :param from_block: First block, inclusive
+    :param to_block: Last block, inclusive
+    :param topics: Filter by indexed arguments, topics after the event signature, each a list of accepted values
+    :return: Decoded events as given by :func:`web3.utils.events.get_event_data`, in block order.
+        Registry keys, the ``bytes32`` arguments, are decoded to strings.
+    """
+    web3 = contract.web3
+    event_topics = get_event_topics(contract, event_names)
+
+    log_filter = web3.eth.filter({
+        "fromBlock": from_block,
+        "toBlock": to_block,
+        "address": contract.address,
+        "topics": [list(event_topics.keys())] + (topics or []),
+    })
+
+    try:
+        logs = web3.eth.getFilterLogs(log_filter.filter_id)
+    finally:
+        web3.eth.uninstallFilter(log_filter.filter_id)
+
+    events = [decode_keys(event_topics[log["topics"][0]], get_event_data(event_topics[log["topics"][0]], log)) for log in logs]
+    events.sort(key=lambda event: (event["blockNumber"], event["logIndex"]))
+    return events
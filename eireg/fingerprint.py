@@ -0,0 +1,130 @@
+"""Content hash index of an imported Tieke export, for importing only the changes of the next one."""
+
+import hashlib
+import os
+
+
+def content_hash(data: str) -> str:
+    """Short hash of a stored payload.
+
+    64 bits is plenty to detect changes between two exports of the same record.
+    """
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
+
+
+class RowChange:
+    """How a prepared row differs from the previous export."""
+
+    def __init__(self, new_company: bool, company_changed: bool, new_address: bool, address_changed: bool, address_moved=False):
+        """
+        :param address_changed: Address data differs
+        :param address_moved: Address belongs to another company
+        """
+        self.new_company = new_company
+        self.company_changed = company_changed
+        self.new_address = new_address
+        self.address_changed = address_changed
+        self.address_moved = address_moved
+
+    def is_unchanged(self) -> bool:
+        return not (self.new_company or self.company_changed or self.new_address or self.address_changed or self.address_moved)
+
+
+class FingerprintIndex:
+    """Hashes of company and address payloads of an export, keyed by VAT ID and invoicing address.
+
+    Payload hashes are computed from the prepared data we store on chain,
+    not the raw CSV row, so a changed ``Muokattu`` date or a column we do not
+    import does not cause a transaction.
+
+    The file format is one record per line, tab separated::
+
+        C <vat id> <company data hash>
+        A <vat id> <invoicing address> <address data hash>
+    """
+
+    def __init__(self):
+        #: VAT ID -> company data hash
+        self.companies = {}
+
+        #: Invoicing address -> (VAT ID, address data hash)
+        self.addresses = {}
+
+    @classmethod
+    def load(cls, path: str) -> "FingerprintIndex":
+        """Read an index, or return an empty one if the file does not exist."""
+
+        index = cls()
+
+        if not os.path.exists(path):
+            return index
+
+        with open(path, "rt", encoding="utf-8") as inp:
+            for line in inp:
+                parts = line.rstrip("\n").split("\t")
+                if parts[0] == "C":
+                    index.companies[parts[1]] = parts[2]
+                elif parts[0] == "A":
+                    index.addresses[parts[2]] = (parts[1], parts[3])
+
+        return index
+
+    def save(self, path: str):
+        """Write the index atomically, so a crash leaves the previous index in place."""
+
+        temp = path + ".tmp"
+        with open(temp, "wt", encoding="utf-8") as out:
+            for vat_id, digest in sorted(self.companies.items()):
+                out.write("C\t{}\t{}\n".format(vat_id, digest))
+            for address, (vat_id, digest) in sorted(self.addresses.items()):
+                out.write("A\t{}\t{}\t{}\n".format(vat_id, address, digest))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temp, path)
+
+    def add(self, prepared: dict):
+        """Record a prepared row."""
+        self.set_company(prepared["vat_id"], prepared["company_data"])
+        self.set_address(prepared["vat_id"], prepared["address"], prepared["address_data"])
+
+    def set_company(self, vat_id: str, data: str):
+        self.companies[vat_id] = content_hash(data)
+
+    def set_address(self, vat_id: str, address: str, data: str):
+        self.addresses[address] = (vat_id, content_hash(data))
+
+    def set_address_data(self, address: str, data: str):
+        """Record new data of a known address, which stays with its company."""
+        if address in self.addresses:
+            self.addresses[address] = (self.addresses[address][0], content_hash(data))
+
+    def move_address(self, address: str, vat_id: str):
+        """Record a known address moved to another company, with its data."""
+        if address in self.addresses:
+            self.addresses[address] = (vat_id, self.addresses[address][1])
+
+    def keep_company(self, vat_id: str, previous: "FingerprintIndex"):
+        """Carry the company hash of the previous index over, unless this index has one already."""
+        if vat_id not in self.companies and vat_id in previous.companies:
+            self.companies[vat_id] = previous.companies[vat_id]
+
+    def keep_address(self, address: str, previous: "FingerprintIndex"):
+        """Carry the address hash of the previous index over, unless this index has one already."""
+        if address not in self.addresses and address in previous.addresses:
+            self.addresses[address] = previous.addresses[address]
+
+    def compare(self, prepared: dict) -> RowChange:
+        """Tell how a prepared row differs from this index."""
+
+        vat_id = prepared["vat_id"]
+        company_digest = self.companies.get(vat_id)
+
+        address_entry = self.addresses.get(prepared["address"])
+
+        return RowChange(
+            new_company=company_digest is None,
+            company_changed=company_digest is not None and company_digest != content_hash(prepared["company_data"]),
+            new_address=address_entry is None,
+            address_changed=address_entry is not None and address_entry[1] != content_hash(prepared["address_data"]),
+            address_moved=address_entry is not None and address_entry[0] != vat_id,
+        )
@@ -2,41 +2,101 @@
 
 from populus import Project
 from populus.utils.cli import get_unlocked_deploy_from_address
+from web3 import Web3
 from web3.contract import Contract
 
+import argparse
+import asyncio
+import collections
 import concurrent
 import concurrent.futures
 
 import csv
-import json
+import getpass
 import os
-from typing import Optional
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional, List, Tuple
 
-import sys
 
-
-from eireg.blockchain import check_succesful_tx
-from eireg.data import ContentType
+from eireg.aio import AsyncRegistryClient, AsyncReceiptConfirmer, AsyncRPC
+from eireg.blockchain import STORAGE_WORD_GAS, check_succesful_tx
+from eireg.client import RegistryClient
+from eireg.concurrency import ConcurrencyController
+from eireg.confirmer import ConfirmationTimeout, ReceiptConfirmer
+from eireg.fingerprint import FingerprintIndex
+from eireg.journal import ImportJournal, JournalState
+from eireg.merkle import ContentStore, batch_record
+from eireg.pipeline import ShardedPipeline, TransactionPipeline
+from eireg.scheduler import CompanyScheduler
+from eireg.signer import LocalAccount, load_keyfiles
+from eireg.state import ImportState
+from eireg.validation import ROW_NUMBER_COLUMN, VALIDATED_MAGIC, read_validated_rows
+from eireg.data import ContentType, Encoding, encode_payload
 from eireg.utils import ytunnus_to_vat_id, normalize_invoicing_address, string_to_bytes32
 
 
 SAMPLE_CSV = os.path.join(os.path.dirname(__file__), "..", "sample.csv")
 
 
+#: Transactions a row may need, in the order they are sent
+IMPORT_STEPS = ["createCompany", "setCompanyData", "createInvoicingAddress", "setInvoicingAddressData"]
+
+#: Headroom over ``eth_estimateGas`` in the gas limits of import steps, see :func:`calibrate_step_gas`
+STEP_GAS_MARGIN = 1.2
+
+#: Fixed cost of any transaction
+TX_BASE_GAS = 21000
+
+#: Copying a packed field byte out of ``importInvoicingAddresses`` arguments
+UNPACK_BYTE_GAS = 8
+
+#: Gas of an ``importInvoicingAddresses`` transaction excluding its rows
+BATCH_BASE_GAS = 60000
+
+#: How much of the block gas limit one batch may take by default
+BATCH_BLOCK_FILL = 0.8
+
+#: Gas of a ``commitBatchRoot`` transaction, one new storage word whatever the batch size
+MERKLE_COMMIT_GAS = 80000
+
+
 class AlreadyExists(Exception):
     pass
 
 
+class ImportFailure(Exception):
+    """A transaction sent for a CSV row did not go through."""
+
+    def __init__(self, row_number: int, vat_id: str, address: str, step: str, txid: str, reason: str="out of gas"):
+        self.row_number = row_number
+        self.vat_id = vat_id
+        self.address = address
+        self.step = step
+        self.txid = txid
+        self.reason = reason
+        super(ImportFailure, self).__init__("Row {}: {} failed ({}) for VAT id {}, address {}, txid {}".format(
+            row_number, step, reason, vat_id, address, txid))
+
+
 def read_csv(fname, limit_to: Optional[list]=None):
     """Read Tieke CSV export file.
 
+    Files written by ``validate-tieke-csv`` are read directly, giving their normalized rows.
+
     :param fname: abs path to .csv
     :param limit_to:  limit to list of given value in Y-tunnus column
     :yield: dict of read rows
     """
 
     with open(fname) as inp:
-        reader = csv.DictReader(inp)
+        first_line = inp.readline().rstrip("\n")
+        if first_line == VALIDATED_MAGIC:
+            reader = read_validated_rows(inp)
+        elif first_line.startswith("#eireg-validated"):
+            raise ValueError("{} was written by an older validate-tieke-csv, validate the export again".format(fname))
+        else:
+            inp.seek(0)
+            reader = csv.DictReader(inp)
 
         for row in reader:
 
@@ -46,30 +106,35 @@ def read_csv(fname, limit_to: Optional[list]=None):
             yield row
 
 
-def import_invoicing_address(contract: Contract, tieke_data: dict):
-    """Sample importer for an invoicing address.
+def read_numbered_csv(fname) -> Iterator[Tuple[int, dict]]:
+    """Read Tieke CSV export file with row numbers.
 
-    Slow. Confirms each transaction in serial fashion.
+    Rows of a validated file keep their numbers in the original export, so failures
+    point to the same rows whether the export was validated first or not.
+
+    :yield: (row number counted from 1, row)
     """
+    for row_number, row in enumerate(read_csv(fname), start=1):
+        yield row.get(ROW_NUMBER_COLUMN, row_number), row
 
-    vat_id = ytunnus_to_vat_id(tieke_data["Y-tunnus"])
 
-    print("Importing {}".format(vat_id))
+def prepare_invoicing_address(tieke_data: dict, encoding: Encoding=Encoding.json,
+                              reference_operators=False) -> dict:
+    """Turn one Tieke CSV row to the values we store in the registry.
 
-    # We have not imported this company yet
-    if not contract.call().hasCompany(vat_id):
-        # TODO: This demo creates a company record too, but all vatIds should be prepopulated
-        txid = contract.transact().createCompany(vat_id)
-        assert check_succesful_tx(contract, txid)
+    :param encoding: How company and address data payloads are encoded
+    :param reference_operators: Leave the operator name out of address data, readers find it by the operator ID
 
-        # Create core company info
+    :return: dict with ``vat_id``, ``address``, ``vat_key``, ``address_key``, ``company_data`` and ``address_data``
+        where keys are packed to ``bytes32`` and data payloads are encoded strings, ready to be passed to the contract
+    """
 
-        data = {
-            "name": tieke_data["Yrityksen nimi"]
-        }
+    vat_id = ytunnus_to_vat_id(tieke_data["Y-tunnus"])
 
-        data = json.dumps(data)  # Convert to UTF-8 string
-        contract.transact().setCompanyData(vat_id, ContentType.TiekeCompanyData.value, data)
+    # Create core company info
+    company_data = {
+        "name": tieke_data["Yrityksen nimi"]
+    }
 
     address = tieke_data["Vastaanotto-osoite"]
     if not address:
@@ -80,15 +145,6 @@ def import_invoicing_address(contract: Contract, tieke_data: dict):
 
     assert address
 
-    # We have not imported this address yet
-    if contract.call().getVatIdByAddress(address) != "":
-        print("Already exists: VAT id: {}, address: {}".format(vat_id, address))
-        return
-
-    # Create new OVT address
-    txid = contract.transact().createInvoicingAddress(vat_id, address)
-    assert check_succesful_tx(contract, txid, timeout=180)
-
     tieke_address_data = {
         "operatorName": tieke_data["Operaattori"],
         "operatorId": tieke_data["Välittäjän tunnus"],
@@ -96,51 +152,1156 @@ def import_invoicing_address(contract: Contract, tieke_data: dict):
         "sends": tieke_data["Lähettää"] == "Kyllä",
         "receives": tieke_data["Vastaanottaa"] == "Kyllä",
     }
-    tieke_address_data = json.dumps(tieke_address_data)  # UTF-8 encoded string
 
-    txid = contract.transact().setInvoicingAddressData(vat_id, address, ContentType.TiekeAddressData.value, tieke_address_data)
-    assert check_succesful_tx(contract, txid)
+    if reference_operators and tieke_address_data["operatorId"]:
+        # Operator record was written by import_operators()
+        del tieke_address_data["operatorName"]
+
+    return {
+        "vat_id": vat_id,
+        "address": address,
+        "vat_key": string_to_bytes32(vat_id),
+        "address_key": string_to_bytes32(address),
+        "company_data": encode_payload(ContentType.TiekeCompanyData, company_data, encoding),
+        "address_data": encode_payload(ContentType.TiekeAddressData, tieke_address_data, encoding),
+    }
+
+
+def prepare_row(row_number: int, tieke_data: dict, encoding: Encoding=Encoding.json, reference_operators=False) -> dict:
+    """:func:`prepare_invoicing_address` for a row of an import.
+
+    :raise ImportFailure: If the row cannot be stored, e.g. its address does not fit in a ``bytes32`` key
+    """
+    try:
+        return prepare_invoicing_address(tieke_data, encoding, reference_operators)
+    except ValueError as e:
+        address = tieke_data.get("Vastaanotto-osoite") or tieke_data.get("OVT-tunnus", "")
+        raise ImportFailure(row_number, tieke_data.get("Y-tunnus", ""), address, "prepare", None, str(e))
+
+
+def prepare_rows(fname: str, failures: Optional[list], encoding: Encoding=Encoding.json,
+                 reference_operators=False) -> Iterator[Tuple[int, dict]]:
+    """Read and prepare the rows of a CSV file, skipping rows which cannot be stored.
+
+    One malformed row does not stop an import, see ``validate-tieke-csv`` for checking a file first.
+
+    :param failures: List where skipped rows are appended as :class:`ImportFailure`, or None to skip them silently
+    :yield: (row number, prepared row)
+    """
+    for row_number, row in read_numbered_csv(fname):
+        try:
+            yield row_number, prepare_row(row_number, row, encoding, reference_operators)
+        except ImportFailure as failure:
+            if failures is not None:
+                print(failure)
+                failures.append(failure)
+
+
+def collect_operators(fname: str) -> Dict[str, dict]:
+    """Build the operator table of a Tieke CSV export.
+
+    :return: Operator ID -> OperatorPublicData, for all rows having an operator ID
+    """
+    operators = {}
+    for row in read_csv(fname):
+        operator_id = row["Välittäjän tunnus"]
+        if operator_id:
+            operators[operator_id] = {"name": row["Operaattori"]}
+    return operators
+
+
+def import_operators(contract: Contract, operators: Dict[str, dict], encoding: Encoding=Encoding.json, timeout=180) -> int:
+    """Write operator records which are missing or differ from the registry.
+
+    Run before importing rows with ``reference_operators``, so that readers can resolve every reference.
+    There are only a handful of operators, so we simply wait for each transaction.
+
+    :return: Number of operator records written
+    """
+
+    txids = []
+    for operator_id, data in sorted(operators.items()):
+        payload = encode_payload(ContentType.OperatorPublicData, data, encoding)
+        if contract.call().getOperatorData(operator_id) == payload:
+            continue
+        print("Updating operator {}".format(operator_id))
+        txids.append(contract.transact().setOperatorData(operator_id, payload))
+
+    for txid in txids:
+        assert check_succesful_tx(contract, txid, timeout=timeout), "Operator update {} failed".format(txid)
+
+    return len(txids)
+
+
+def calibrate_step_gas(contract: Contract, sender: Optional[str]=None, margin=STEP_GAS_MARGIN) -> Dict[str, int]:
+    """Measure the fixed gas of each import step once with ``eth_estimateGas``.
+
+    Every step is estimated on unused random keys with a one word payload, which
+    is the most expensive case: all storage words are new. The payload word is taken
+    off and ``margin`` is added. A new invoicing address of an existing company is also
+    pushed to the address list of the company, which takes two more storage words.
+
+    :param sender: Account whose gas is estimated, defaults to the coinbase
+    :return: Step -> gas excluding the payloads, for :func:`estimate_step_gas`
+    """
+
+    web3 = contract.web3
+    sender = sender or web3.eth.defaultAccount or web3.eth.coinbase
+
+    vat_key = string_to_bytes32("calibrate-" + os.urandom(8).hex())
+    address_key = string_to_bytes32("calibrate-" + os.urandom(8).hex())
+    payload = "x" * 32
+
+    arguments = {
+        "createCompany": (vat_key,),
+        "setCompanyData": (vat_key, ContentType.TiekeCompanyData.value, payload),
+        "createInvoicingAddress": (vat_key, address_key),
+        "setInvoicingAddressData": (vat_key, address_key, ContentType.TiekeAddressData.value, payload),
+    }
+
+    step_gas = {}
+    for step in IMPORT_STEPS:
+        transaction = {"from": sender, "to": contract.address, "data": contract.encodeABI(step, arguments[step])}
+        gas = web3.eth.estimateGas(transaction)
+        if step in ("setCompanyData", "setInvoicingAddressData"):
+            gas -= STORAGE_WORD_GAS
+        elif step == "createInvoicingAddress":
+            gas += 2 * STORAGE_WORD_GAS
+        step_gas[step] = int(gas * margin)
+
+    print("Calibrated import step gas", step_gas)
+    return step_gas
+
+
+def estimate_step_gas(step_gas: Dict[str, int], step: str, *payloads: str) -> int:
+    """Give a gas limit for one import transaction without asking the node.
+
+    Asking ``estimateGas`` costs a round trip per transaction. Instead
+    we use the fixed gas of each contract function, measured once, plus the cost of
+    storing string payloads word by word.
+
+    :param step_gas: Fixed gas per contract function, see :func:`calibrate_step_gas`
+    :param step: Contract function name
+    :param payloads: Strings the transaction writes to the storage
+    """
+    words = sum((len(p.encode("utf-8")) + 31) // 32 for p in payloads)
+    return step_gas[step] + words * STORAGE_WORD_GAS
+
+
+def estimate_move_gas(contract: Contract, sender: str, prepared: dict, margin=STEP_GAS_MARGIN) -> int:
+    """Gas limit of moving the invoicing address of a row to its company with ``moveInvoicingAddress``.
+
+    The gas depends on the address list of the old company, so each move is estimated with ``eth_estimateGas``.
+    Moves are rare. The new company may not exist yet when we estimate, so its address list push is added.
+    """
+    transaction = {"from": sender, "to": contract.address,
+                   "data": contract.encodeABI("moveInvoicingAddress", (prepared["vat_key"], prepared["address_key"]))}
+    return int(contract.web3.eth.estimateGas(transaction) * margin) + 2 * STORAGE_WORD_GAS
+
+
+def import_invoicing_address(contract: Contract,
+                             tieke_data: dict,
+                             confirmer: Optional[ReceiptConfirmer]=None,
+                             state: Optional[ImportState]=None,
+                             timeout=180,
+                             client: Optional[RegistryClient]=None,
+                             encoding: Encoding=Encoding.json,
+                             reference_operators=False):
+    """Sample importer for an invoicing address.
+
+    Slow. Confirms each transaction in serial fashion.
+
+    :param confirmer: Shared receipt confirmer if many rows are imported in parallel
+    :param state: Preloaded existing records, so we do not need to ask the contract for each row
+    :param client: Read existence of records through a shared keep-alive and batching client
+    :param encoding: How data payloads are encoded
+    :param reference_operators: Refer to operators by ID instead of repeating them, see :func:`import_operators`
+    :param timeout: Seconds all transactions of this row may take to confirm
+    """
+
+    deadline = time.time() + timeout
+
+    def remaining():
+        return max(deadline - time.time(), 1)
+
+    prepared = prepare_invoicing_address(tieke_data, encoding, reference_operators)
+    vat_id = prepared["vat_id"]
+    address = prepared["address"]
+    vat_key = prepared["vat_key"]
+    address_key = prepared["address_key"]
+
+    print("Importing {}".format(vat_id))
+
+    reader = client.call() if client else contract.call()
+
+    if state:
+        # Another worker may be creating the company of this row right now
+        create_company = state.claim_company_or_wait(vat_id, remaining())
+    else:
+        create_company = not reader.hasCompany(vat_key)
+
+    # We have not imported this company yet
+    if create_company:
+        # TODO: This demo creates a company record too, but all vatIds should be prepopulated
+        txid = contract.transact().createCompany(vat_key)
+        success = check_succesful_tx(contract, txid, timeout=remaining(), confirmer=confirmer)
+        if state:
+            confirm_step(state, "createCompany", prepared, success)
+        assert success
+
+        contract.transact().setCompanyData(vat_key, ContentType.TiekeCompanyData.value, prepared["company_data"])
+
+    if state:
+        create_address = state.claim_address(address)
+    else:
+        create_address = not reader.hasInvoicingAddress(address_key)
+
+    # We have not imported this address yet
+    if not create_address:
+        print("Already exists: VAT id: {}, address: {}".format(vat_id, address))
+        return
+
+    # Create new OVT address
+    txid = contract.transact().createInvoicingAddress(vat_key, address_key)
+    success = check_succesful_tx(contract, txid, timeout=remaining(), confirmer=confirmer)
+    if state:
+        confirm_step(state, "createInvoicingAddress", prepared, success)
+    assert success
+
+    txid = contract.transact().setInvoicingAddressData(vat_key, address_key, ContentType.TiekeAddressData.value, prepared["address_data"])
+    assert check_succesful_tx(contract, txid, timeout=remaining(), confirmer=confirmer)
 
     print("Done with {} {}".format(vat_id, address))
 
     return address
 
 
+def confirm_step(state: ImportState, step: str, prepared: dict, success: bool):
+    """Update the import state after a transaction of a row has landed.
+
+    Successfully created records become known and the claims
+    of failed transactions are released for a retry.
+    """
+
+    if step in ("createCompany", "importInvoicingAddresses"):
+        if success:
+            state.confirm_company(prepared["vat_id"])
+        else:
+            state.release_company(prepared["vat_id"])
+
+    if step in ("createInvoicingAddress", "importInvoicingAddresses"):
+        if success:
+            state.confirm_address(prepared["address"])
+        else:
+            state.release_address(prepared["address"])
+
+
+def record_failures(failures: list, state: Optional[ImportState]=None) -> Callable:
+    """Build ``on_failure`` callback for :class:`TransactionPipeline`.
+
+    The context of each transaction is a list of (row number, prepared row) tuples
+    and every row of a failed transaction is recorded as :class:`ImportFailure`.
+
+    :param failures: List where failures are appended
+    :param state: Release the claims of failed rows
+    """
+
+    def on_failure(rows, step, txid, reason):
+        for row_number, prepared in rows:
+            failure = ImportFailure(row_number, prepared["vat_id"], prepared["address"], step, txid, reason)
+            print(failure)
+            failures.append(failure)
+            if state:
+                confirm_step(state, step, prepared, False)
+
+    return on_failure
+
+
+def record_successes(state: ImportState) -> Callable:
+    """Build ``on_success`` callback for :class:`TransactionPipeline` confirming the claims of landed rows."""
+
+    def on_success(rows, step, txid):
+        for row_number, prepared in rows:
+            confirm_step(state, step, prepared, True)
+
+    return on_success
+
+
+def estimate_batch_row_gas(prepared: dict, new_company: bool, step_gas: Dict[str, int]) -> int:
+    """Gas one row adds to an ``importInvoicingAddresses`` transaction.
+
+    The same storage is written as with separate transactions, but the
+    fixed transaction cost is paid once per batch and the fields are copied out
+    of the packed argument instead.
+
+    :param new_company: The row creates its company record too
+    :param step_gas: Fixed gas per contract function, see :func:`calibrate_step_gas`
+    """
+    steps = [
+        estimate_step_gas(step_gas, "createInvoicingAddress"),
+        estimate_step_gas(step_gas, "setInvoicingAddressData", prepared["address_data"]),
+    ]
+    size = len(prepared["address_data"])
+
+    if new_company:
+        steps.append(estimate_step_gas(step_gas, "createCompany"))
+        steps.append(estimate_step_gas(step_gas, "setCompanyData", prepared["company_data"]))
+        size += len(prepared["company_data"])
+
+    return sum(steps) - len(steps) * TX_BASE_GAS + size * UNPACK_BYTE_GAS
+
+
+def pack_rows(rows: Iterable[dict]) -> Tuple[List[bytes], str, List[int]]:
+    """Pack prepared rows to ``importInvoicingAddresses`` arguments.
+
+    Keys per row are the packed VAT id and invoicing address.
+    Solidity cannot take ``string[]`` arguments, so the data fields are concatenated
+    and their UTF-8 byte lengths are passed as a separate array.
+    Fields per row are company data and address data.
+    Company data is left empty for companies which already exist.
+    """
+    keys = []
+    fields = []
+    for prepared in rows:
+        keys += [prepared["vat_key"], prepared["address_key"]]
+        fields += [
+            prepared.get("company_data", ""),
+            prepared["address_data"],
+        ]
+    return keys, "".join(fields), [len(field.encode("utf-8")) for field in fields]
+
+
 def import_all(contract: Contract, fname: str):
     """Import all entries from a given CSV file."""
 
     assert contract.call().version().startswith("0.")
 
-    for row in read_csv(fname):
-        try:
-            import_invoicing_address(contract, row)
-        except AlreadyExists as e:
-            print("Already imported:" + str(e))
+    with RegistryClient(contract) as client:
+        for row_number, row in read_numbered_csv(fname):
+            try:
+                prepare_row(row_number, row)
+                import_invoicing_address(contract, row, client=client)
+            except ImportFailure as e:
+                print(e)
+            except AlreadyExists as e:
+                print("Already imported:" + str(e))
+
 
+def import_all_pooled(contract: Contract,
+                      fname: str,
+                      workers: Optional[int]=None,
+                      state: Optional[ImportState]=None,
+                      max_pending: Optional[int]=None,
+                      timeout=180,
+                      max_workers=256,
+                      txpool_limit=4096,
+                      encoding: Encoding=Encoding.json,
+                      reference_operators=False):
+    """Parallerized CSV import.
 
-def import_all_pooled(contract: Contract, fname: str, workers=32):
-    """Parallerized CSV import."""
+    Rows are scheduled by :class:`CompanyScheduler`: rows of one company run in order
+    on one lane, different companies run in parallel.
+    Workers do not poll their receipts, but wait on one shared :class:`ReceiptConfirmer`.
+
+    The CSV file is streamed: reading pauses while ``max_pending`` rows are in the scheduler,
+    so memory use stays flat no matter how large the file is.
+
+    Unless ``workers`` is given, a :class:`ConcurrencyController` scales the rows in flight
+    by confirmation latency, timeouts and the node txpool, up to ``max_workers``.
+
+    :param workers: Fixed number of worker threads, adaptive if not given
+    :param state: Existing records, loaded from contract events if not given
+    :param max_pending: Rows read ahead of fixed workers, defaults to four per worker
+    :param timeout: Seconds each row may spend waiting for its transactions
+    :param max_workers: Upper limit of the adaptive rows in flight, ignored with fixed ``workers``
+    :param txpool_limit: Adaptive mode backs off when the node has more pending transactions than this
+    :param encoding: How data payloads are encoded
+    :param reference_operators: Refer to operators by ID instead of repeating them, see :func:`import_operators`
+    """
 
     assert contract.call().version().startswith("0.")
 
+    if state is None:
+        state = ImportState.load(contract)
+
+    # Never more rows run at once than fixed workers or the adaptive maximum
+    limit = workers or max_workers
+
     # Run the futures within this thread pool
-    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+    with ReceiptConfirmer(contract.web3) as confirmer, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=limit) as executor:
+
+        controller = None
+        if not workers:
+            controller = ConcurrencyController(confirmer, maximum=limit, txpool_limit=txpool_limit)
+
+        def job(row):
+            return import_invoicing_address(contract, row, confirmer, state, timeout=timeout, encoding=encoding,
+                                            reference_operators=reference_operators)
+
+        def on_done(row, future):
+            if controller:
+                controller.record_row(not future.exception())
+
+            # Exceptions are raised from scheduler.wait()
+            if not future.exception():
+                print("Processed row", row["Y-tunnus"], "result", future.result())
+
+        if controller:
+            # In-flight rows follow the controller target
+            scheduler = CompanyScheduler(executor, job, on_done=on_done, max_pending=controller.target)
+            controller.on_change = scheduler.set_max_pending
+            controller.start()
+        else:
+            scheduler = CompanyScheduler(executor, job, on_done=on_done, max_pending=max_pending or workers * 4)
+
+        try:
+            # Stream incoming data to company lanes.
+            # The execution of jobs begins right away and submit()
+            # blocks when the workers are behind.
+            for idx, (row_number, row) in enumerate(read_numbered_csv(fname)):
+                try:
+                    # A row which cannot be stored would fail the whole run in scheduler.wait()
+                    prepare_row(row_number, row, encoding, reference_operators)
+                except ImportFailure as failure:
+                    print(failure)
+                    continue
+                scheduler.submit(row)
+                if idx % 1000 == 0:
+                    print("Import progress", scheduler.get_progress())
+                    if controller:
+                        print("Concurrency", controller.get_stats())
+
+            scheduler.wait()
+        finally:
+            if controller:
+                controller.stop()
+
+        print("Import progress", scheduler.get_progress())
+        print("Confirmation stats", confirmer.get_stats())
+        if controller:
+            print("Concurrency", controller.get_stats())
+
+
+def build_step(step: str, prepared: dict, step_gas: Dict[str, int]) -> Tuple[int, tuple]:
+    """Gas limit and contract function arguments of one import transaction of a row.
+
+    :param step_gas: Fixed gas per contract function, see :func:`calibrate_step_gas`
+    """
+
+    vat_key = prepared["vat_key"]
+    address_key = prepared["address_key"]
+
+    if step == "createCompany":
+        return estimate_step_gas(step_gas, step), (vat_key,)
+    elif step == "setCompanyData":
+        data = prepared["company_data"]
+        return estimate_step_gas(step_gas, step, data), (vat_key, ContentType.TiekeCompanyData.value, data)
+    elif step == "createInvoicingAddress":
+        return estimate_step_gas(step_gas, step), (vat_key, address_key)
+    elif step == "setInvoicingAddressData":
+        data = prepared["address_data"]
+        return estimate_step_gas(step_gas, step, data), (vat_key, address_key, ContentType.TiekeAddressData.value, data)
+
+    raise ValueError("Unknown import step {}".format(step))
+
+
+def plan_steps(prepared: dict, state: ImportState) -> List[str]:
+    """Claim the records a row creates and tell which transactions it needs."""
+
+    steps = []
+
+    if state.claim_company(prepared["vat_id"]):
+        steps += ["createCompany", "setCompanyData"]
+
+    if state.claim_address(prepared["address"]):
+        steps += ["createInvoicingAddress", "setInvoicingAddressData"]
+    else:
+        print("Already exists: VAT id: {}, address: {}".format(prepared["vat_id"], prepared["address"]))
+
+    return steps
+
+
+def claim_remaining_steps(prepared: dict, state: ImportState, steps: List[str]) -> List[str]:
+    """Steps of a partially imported row we still need to send after a restart.
+
+    A record whose creating transaction is not known to have landed may still
+    exist on the chain, in which case we only set its data.
+    """
+    result = []
+    for step in steps:
+        if step == "createCompany" and not state.claim_company(prepared["vat_id"]):
+            continue
+        if step == "createInvoicingAddress" and not state.claim_address(prepared["address"]):
+            continue
+        result.append(step)
+    return result
+
+
+def journal_callbacks(journal: ImportJournal, on_failure: Callable, on_success: Callable) -> Tuple[Callable, Callable, Callable]:
+    """Wrap :class:`TransactionPipeline` callbacks to write each transaction to the import journal.
+
+    :return: on_failure, on_success and on_sent callbacks
+    """
+
+    def journaled_failure(rows, step, txid, reason):
+        # Transactions the node rejected were never sent, their steps remain planned
+        if txid:
+            journal.record_confirmed(txid, False)
+        on_failure(rows, step, txid, reason)
+
+    def journaled_success(rows, step, txid):
+        journal.record_confirmed(txid, True)
+        on_success(rows, step, txid)
+
+    def on_sent(rows, step, txid, nonce):
+        journal.record_sent([row_number for row_number, prepared in rows], step, txid, nonce)
+
+    return journaled_failure, journaled_success, on_sent
+
+
+def settle_unconfirmed(web3: Web3, resume: JournalState, journal: Optional[ImportJournal]=None, timeout=180):
+    """Find out how transactions in flight at the time of a crash ended.
+
+    Only these transactions are asked from the node. Transactions the node
+    does not know were dropped and their steps are sent again.
+    """
+
+    for txid in resume.get_unconfirmed():
+
+        try:
+            known = web3.eth.getTransaction(txid) is not None
+        except Exception:
+            # web3 fails to format a transaction the node does not know
+            known = False
+
+        if not known:
+            continue
 
-        # Stream incoming data and build futures.
-        # The execution of futures beings right away and the executor
-        # does not wait the loop to be completed.
-        futures = [executor.submit(import_invoicing_address, contract, row) for row in read_csv(fname)]
+        success = check_succesful_tx(web3, txid, timeout=timeout)
+        resume.confirmed[txid] = success
+        if journal:
+            journal.record_confirmed(txid, success)
 
-        # This print may be slightly delayed, as futures start executing as soon as the pool begins to fill,
-        # eating your CPU time
-        print("Executing total", len(futures), "jobs")
 
-        # Wait the executor to complete each future, give 180 seconds for each job
-        idx = 0
-        for future in concurrent.futures.as_completed(futures, timeout=180.0):
-            res = future.result()  # We don't use result value here, but this will also abort the execution on any exception
-            print("Processed job", idx, "result", res)
-            idx += 1
+def import_all_pipelined(contract: Contract,
+                         fname: str,
+                         max_in_flight=256,
+                         state: Optional[ImportState]=None,
+                         journal: Optional[ImportJournal]=None,
+                         resume: Optional[JournalState]=None,
+                         accounts: Optional[List[LocalAccount]]=None,
+                         encoding: Encoding=Encoding.json,
+                         reference_operators=False) -> List[ImportFailure]:
+    """Import all entries without waiting a receipt before sending the next transaction.
+
+    All transactions of a company go out through one :class:`TransactionPipeline`, so
+    a row's ``setInvoicingAddressData`` cannot land before its ``createInvoicingAddress``.
+
+    With ``accounts`` given, companies are spread over the accounts and transactions
+    are signed locally. Each account must be a writer, see :func:`authorize_writers`.
+
+    :param max_in_flight: How many unconfirmed transactions we allow per sending account
+    :param state: Existing records, loaded from contract events if not given
+    :param journal: Record the progress of this run
+    :param resume: Progress of an earlier pipelined run of the same file. Completed rows are skipped
+        and partially imported rows get only their missing transactions.
+    :param accounts: Sign and send transactions with these accounts instead of the coinbase
+    :param encoding: How data payloads are encoded
+    :param reference_operators: Refer to operators by ID instead of repeating them, see :func:`import_operators`
+    :return: Failed transactions, each tied to its CSV row
+    """
+
+    assert contract.call().version().startswith("0.")
+
+    for account in accounts or []:
+        assert contract.call().canUpdateCompany(string_to_bytes32(""), account.address), "{} is not a registry writer".format(account.address)
+
+    if resume:
+        # Records created by transactions in flight at the crash must be in the state
+        resume.check_run("pipelined", fname)
+        settle_unconfirmed(contract.web3, resume, journal)
+
+    if state is None:
+        state = ImportState.load(contract)
+
+    step_gas = calibrate_step_gas(contract)
+
+    failures = []
+
+    on_failure = record_failures(failures, state)
+    on_success = record_successes(state)
+    on_sent = None
+    if journal:
+        on_failure, on_success, on_sent = journal_callbacks(journal, on_failure, on_success)
+
+    with ReceiptConfirmer(contract.web3) as confirmer:
+
+        pipeline = ShardedPipeline([
+            TransactionPipeline(contract, confirmer, on_failure, max_in_flight,
+                                on_success=on_success, on_sent=on_sent, signer=account)
+            for account in accounts or [None]
+        ])
+
+        for row_number, prepared in prepare_rows(fname, failures, encoding, reference_operators):
+            rows = [(row_number, prepared)]
+
+            remaining = resume.get_remaining_steps(row_number) if resume else None
+
+            if remaining is None:
+                steps = plan_steps(prepared, state)
+                if journal:
+                    journal.record_planned(row_number, steps)
+            else:
+                steps = claim_remaining_steps(prepared, state, remaining)
+
+            for step in steps:
+                gas, args = build_step(step, prepared, step_gas)
+                pipeline.send(prepared["vat_id"], rows, gas, step, *args)
+
+        pipeline.drain()
+
+        print("Confirmation stats", confirmer.get_stats())
+
+    print("Import done, {} failed transactions".format(len(failures)))
+    return failures
+
+
+async def import_invoicing_address_async(client: AsyncRegistryClient,
+                                        confirmer: AsyncReceiptConfirmer,
+                                        row_number: int,
+                                        tieke_data: dict,
+                                        state: ImportState,
+                                        step_gas: Dict[str, int],
+                                        timeout=180,
+                                        encoding: Encoding=Encoding.json,
+                                        reference_operators=False) -> List[ImportFailure]:
+    """Import one row on the event loop.
+
+    All transactions of the row are sent back to back with consecutive nonces
+    and then awaited together. Records are claimed and nonces reserved before
+    the first ``await``, so rows of one company land in the order they were read.
+    If the node rejects a transaction, the rest of the row is not sent and its
+    nonces are filled, see :meth:`AsyncRegistryClient.fill_nonce`.
+
+    :param step_gas: Fixed gas per contract function, see :func:`calibrate_step_gas`
+    :return: Failed transactions of the row
+    """
+
+    try:
+        prepared = prepare_row(row_number, tieke_data, encoding, reference_operators)
+    except ImportFailure as failure:
+        return [failure]
+
+    steps = plan_steps(prepared, state)
+    nonces = [client.reserve_nonce() for step in steps]
+
+    failures = []
+    sent = []
+
+    for index, (step, nonce) in enumerate(zip(steps, nonces)):
+        gas, args = build_step(step, prepared, step_gas)
+        try:
+            txid = await client.send_transaction(nonce, gas, step, *args)
+        except Exception as e:
+            # The node did not take the nonce. Later steps of the row depend on this one,
+            # so give up the row and fill its nonces, other rows have reserved the ones after them.
+            failures.append(ImportFailure(row_number, prepared["vat_id"], prepared["address"], step, None, str(e)))
+            for skipped in steps[index + 1:]:
+                failures.append(ImportFailure(row_number, prepared["vat_id"], prepared["address"], skipped, None,
+                                              "not sent, {} failed".format(step)))
+            for skipped in steps[index:]:
+                confirm_step(state, skipped, prepared, False)
+            for unused in nonces[index:]:
+                await client.fill_nonce(unused)
+            break
+        sent.append((step, txid, confirmer.submit(txid, timeout=timeout)))
+
+    for step, txid, future in sent:
+        try:
+            success = (await future).success
+            reason = "out of gas"
+        except ConfirmationTimeout as e:
+            success = False
+            reason = str(e)
+
+        confirm_step(state, step, prepared, success)
+        if not success:
+            failures.append(ImportFailure(row_number, prepared["vat_id"], prepared["address"], step, txid, reason))
+
+    return failures
+
+
+async def import_all_async(client: AsyncRegistryClient,
+                           confirmer: AsyncReceiptConfirmer,
+                           fname: str,
+                           state: ImportState,
+                           step_gas: Dict[str, int],
+                           max_in_flight=2000,
+                           timeout=180,
+                           encoding: Encoding=Encoding.json,
+                           reference_operators=False) -> List[ImportFailure]:
+    """Import all entries with up to ``max_in_flight`` rows waiting for their transactions on one event loop.
+
+    Waiting rows are coroutines, not threads, so the window can be much larger than the thread pool of :func:`import_all_pooled`.
+
+    :param step_gas: Fixed gas per contract function, see :func:`calibrate_step_gas`
+    :return: Failed transactions, each tied to its CSV row
+    """
+
+    semaphore = asyncio.Semaphore(max_in_flight)
+    failures = []
+    errors = []
+    tasks = set()
+
+    async def run(row_number, row):
+        try:
+            for failure in await import_invoicing_address_async(client, confirmer, row_number, row, state, step_gas, timeout, encoding,
+                                                                reference_operators):
+                print(failure)
+                failures.append(failure)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            semaphore.release()
+
+    for row_number, row in read_numbered_csv(fname):
+        await semaphore.acquire()
+        task = asyncio.ensure_future(run(row_number, row))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+        if row_number % 1000 == 0:
+            print("Import progress: row {}, confirmations {}".format(row_number, confirmer.get_stats()))
+
+    if tasks:
+        await asyncio.wait(list(tasks))
+
+    if errors:
+        raise errors[0]
+
+    return failures
+
+
+def import_all_asyncio(contract: Contract,
+                       fname: str,
+                       host="localhost",
+                       port=8545,
+                       max_in_flight=2000,
+                       state: Optional[ImportState]=None,
+                       timeout=180,
+                       encoding: Encoding=Encoding.json,
+                       reference_operators=False) -> List[ImportFailure]:
+    """Run :func:`import_all_async` on a new event loop talking JSON-RPC to ``host:port``.
+
+    :param state: Existing records, loaded from contract events if not given
+    :param encoding: How data payloads are encoded
+    :param reference_operators: Refer to operators by ID instead of repeating them, see :func:`import_operators`
+    """
+
+    assert contract.call().version().startswith("0.")
+
+    if state is None:
+        state = ImportState.load(contract)
+
+    step_gas = calibrate_step_gas(contract)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    rpc = AsyncRPC(host, port)
+    client = AsyncRegistryClient(contract, rpc, sender=contract.web3.eth.defaultAccount or None)
+    confirmer = AsyncReceiptConfirmer(rpc, timeout=timeout)
+
+    async def run():
+        await client.start()
+        await confirmer.start()
+        try:
+            return await import_all_async(client, confirmer, fname, state, step_gas, max_in_flight, timeout, encoding, reference_operators)
+        finally:
+            await confirmer.stop()
+            print("Confirmation stats", confirmer.get_stats())
+            print("RPC stats", rpc.get_stats())
+            rpc.close()
+
+    try:
+        failures = loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+    print("Import done, {} failed transactions".format(len(failures)))
+    return failures
+
+
+def authorize_writers(contract: Contract, addresses: List[str], timeout=180):
+    """Let import accounts add companies. Must be run by the registry master."""
+
+    for address in addresses:
+        if contract.call().isWriter(address):
+            continue
+        print("Adding registry writer", address)
+        txid = contract.transact().addWriter(address)
+        assert check_succesful_tx(contract.web3, txid, timeout), "Could not add writer {}".format(address)
+
+
+def import_all_batched(contract: Contract,
+                       fname: str,
+                       gas_limit: Optional[int]=None,
+                       max_in_flight=16,
+                       state: Optional[ImportState]=None,
+                       journal: Optional[ImportJournal]=None,
+                       resume: Optional[JournalState]=None,
+                       encoding: Encoding=Encoding.json,
+                       reference_operators=False) -> List[ImportFailure]:
+    """Import many rows per transaction with ``importInvoicingAddresses``.
+
+    Rows are packed to a batch until its estimated gas would exceed ``gas_limit``.
+    Batches are sent through a :class:`TransactionPipeline`.
+
+    :param gas_limit: Gas per batch transaction, defaults to a share of the current block gas limit
+    :param max_in_flight: How many unconfirmed batches we allow
+    :param state: Existing records, loaded from contract events if not given
+    :param journal: Record the progress of this run
+    :param resume: Progress of an earlier batched run of the same file, rows of landed batches are skipped
+    :param encoding: How data payloads are encoded
+    :param reference_operators: Refer to operators by ID instead of repeating them, see :func:`import_operators`
+    :return: Failed transactions, one entry for every row of a failed batch
+    """
+
+    assert contract.call().version().startswith("0.")
+
+    web3 = contract.web3
+
+    if not gas_limit:
+        gas_limit = int(web3.eth.getBlock("latest")["gasLimit"] * BATCH_BLOCK_FILL)
+
+    if resume:
+        # Records created by transactions in flight at the crash must be in the state
+        resume.check_run("batched", fname)
+        settle_unconfirmed(web3, resume, journal)
+
+    if state is None:
+        state = ImportState.load(contract)
+
+    step_gas = calibrate_step_gas(contract)
+
+    failures = []
+
+    on_failure = record_failures(failures, state)
+    on_success = record_successes(state)
+    on_sent = None
+    if journal:
+        on_failure, on_success, on_sent = journal_callbacks(journal, on_failure, on_success)
+
+    with ReceiptConfirmer(web3) as confirmer:
+
+        pipeline = TransactionPipeline(contract, confirmer, on_failure, max_in_flight,
+                                       on_success=on_success, on_sent=on_sent)
+
+        batch = []
+        batch_gas = BATCH_BASE_GAS
+
+        for row_number, prepared in prepare_rows(fname, failures, encoding, reference_operators):
+
+            if resume and resume.get_remaining_steps(row_number) == []:
+                # Landed in an earlier run
+                continue
+
+            vat_id = prepared["vat_id"]
+            address = prepared["address"]
+
+            if not state.claim_address(address):
+                print("Already exists: VAT id: {}, address: {}".format(vat_id, address))
+                if journal:
+                    journal.record_planned(row_number, [])
+                continue
+
+            new_company = state.claim_company(vat_id)
+            if not new_company:
+                # Do not pay calldata for something the contract ignores
+                prepared["company_data"] = ""
+
+            if journal:
+                journal.record_planned(row_number, ["importInvoicingAddresses"])
+
+            row_gas = estimate_batch_row_gas(prepared, new_company, step_gas)
+
+            if batch and batch_gas + row_gas > gas_limit:
+                keys, packed, lengths = pack_rows(prepared for row_number, prepared in batch)
+                pipeline.send(batch, batch_gas, "importInvoicingAddresses", keys, packed, lengths)
+                print("Sent batch of {} rows, gas {}".format(len(batch), batch_gas))
+                batch = []
+                batch_gas = BATCH_BASE_GAS
+
+            batch.append((row_number, prepared))
+            batch_gas += row_gas
+
+        if batch:
+            keys, packed, lengths = pack_rows(prepared for row_number, prepared in batch)
+            pipeline.send(batch, batch_gas, "importInvoicingAddresses", keys, packed, lengths)
+            print("Sent batch of {} rows, gas {}".format(len(batch), batch_gas))
+
+        pipeline.drain()
+
+        print("Confirmation stats", confirmer.get_stats())
+
+    print("Import done, {} failed rows".format(len(failures)))
+    return failures
+
+
+def import_all_merkle(contract: Contract,
+                      fname: str,
+                      store: ContentStore,
+                      batch_size=1000,
+                      max_in_flight=16,
+                      encoding: Encoding=Encoding.json,
+                      reference_operators=False) -> List[ImportFailure]:
+    """Import rows off chain and commit only a Merkle root per batch.
+
+    Each batch of ``batch_size`` rows is written to the content store with
+    a proof for every row, and its root is committed with ``commitBatchRoot``.
+    Readers get rows from the store and check them with :class:`eireg.merkle.MerkleVerifier`.
+    Batches whose roots were already committed by an earlier run are skipped.
+
+    :param store: Local store for the rows
+    :param max_in_flight: How many unconfirmed root commits we allow
+    :param encoding: How data payloads are encoded
+    :param reference_operators: Refer to operators by ID instead of repeating them, see :func:`import_operators`
+    :return: Failed transactions, one entry for every row of a failed batch
+    """
+
+    assert contract.call().version().startswith("0.")
+
+    failures = []
+    roots = {}
+
+    def on_success(rows, step, txid):
+        store.set_committed(roots.pop(txid), txid)
+
+    on_failure = record_failures(failures)
+
+    def send(batch: list):
+        root = store.add_batch([batch_record(prepared) for row_number, prepared in batch])
+        if store.is_committed(root):
+            print("Batch {} already committed".format(root.hex()))
+            return
+        txid = pipeline.send(batch, MERKLE_COMMIT_GAS, "commitBatchRoot", root, len(batch))
+        if txid:
+            roots[txid] = root
+            print("Sent root {} of {} rows".format(root.hex(), len(batch)))
+
+    with ReceiptConfirmer(contract.web3) as confirmer:
+
+        pipeline = TransactionPipeline(contract, confirmer, on_failure, max_in_flight, on_success=on_success)
+
+        batch = []
+        for row_number, prepared in prepare_rows(fname, failures, encoding, reference_operators):
+            batch.append((row_number, prepared))
+            if len(batch) >= batch_size:
+                send(batch)
+                batch = []
+
+        if batch:
+            send(batch)
+
+        pipeline.drain()
+
+        print("Confirmation stats", confirmer.get_stats())
+
+    print("Merkle import done: {}, {} failed rows".format(store.get_stats(), len(failures)))
+    return failures
+
+
+def read_chain_index(contract: Contract, fname: str, encoding: Encoding=Encoding.json, reference_operators=False) -> FingerprintIndex:
+    """Fingerprint what the registry holds for the companies and invoicing addresses of an export.
+
+    The baseline of a first delta import. Reads go out in JSON-RPC batches, four per row at most.
+    Records which do not exist on the chain are left out.
+    """
+
+    companies = {}
+    addresses = {}
+    index = FingerprintIndex()
+
+    with RegistryClient(contract) as client:
+
+        # Rows which cannot be stored are reported by the import itself
+        for row_number, prepared in prepare_rows(fname, None, encoding, reference_operators):
+            vat_id = prepared["vat_id"]
+            address = prepared["address"]
+
+            if vat_id not in companies:
+                companies[vat_id] = (client.submit("hasCompany", vat_id),
+                                     client.submit("getBusinessInformation", vat_id, ContentType.TiekeCompanyData.value))
+
+            if address not in addresses:
+                addresses[address] = (client.submit("getVatIdByAddress", address),
+                                      client.submit("getAddressInformation", address, ContentType.TiekeAddressData.value))
+
+        for vat_id, (exists, data) in companies.items():
+            if exists.result():
+                index.set_company(vat_id, data.result())
+
+        for address, (owner, data) in addresses.items():
+            if owner.result():
+                index.set_address(owner.result(), address, data.result())
+
+    return index
+
+
+def import_delta(contract: Contract, fname: str, index_path: str, max_in_flight=256, encoding: Encoding=Encoding.json,
+                 reference_operators=False) -> List[ImportFailure]:
+    """Import only the rows added or changed since the previous export.
+
+    ``index_path`` holds a :class:`FingerprintIndex` of the last imported export.
+    Rows with the same content hashes are skipped without any RPC calls.
+    New rows are created, changed company or address data is updated in place
+    with ``setCompanyData`` and ``setInvoicingAddressData`` and an address of another
+    company is moved with ``moveInvoicingAddress``. Records of the previous
+    export are taken as existing, so no event scan is needed either. Without a previous
+    index the data of the export's records is first read from the contract, see :func:`read_chain_index`.
+
+    The index is rewritten after the import. Hashes are recorded as transactions land,
+    so the records of failed transactions keep their old hashes and are tried again with the next export.
+    Rows dropped from the export are only reported, the registry cannot delete them.
+
+    :param encoding: How data payloads are encoded. Changing it rewrites every row once.
+    :param reference_operators: Refer to operators by ID instead of repeating them, see :func:`import_operators`
+    :return: Failed transactions, each tied to its CSV row
+    """
+
+    assert contract.call().version().startswith("0.")
+
+    step_gas = calibrate_step_gas(contract)
+
+    if os.path.exists(index_path):
+        previous = FingerprintIndex.load(index_path)
+    else:
+        # First delta import, the registry may already hold records e.g. from a full import
+        previous = read_chain_index(contract, fname, encoding, reference_operators)
+
+    current = FingerprintIndex()
+
+    # Everything in the previous index is on the chain
+    state = ImportState()
+    state.companies.update(previous.companies.keys())
+    state.addresses.update(previous.addresses.keys())
+
+    failures = []
+    counts = collections.Counter()
+    updated_companies = set()
+    seen_addresses = set()
+
+    record_success = record_successes(state)
+
+    def on_success(rows, step, txid):
+        record_success(rows, step, txid)
+        for row_number, prepared in rows:
+            if step == "createCompany":
+                current.set_company(prepared["vat_id"], "")
+            elif step == "setCompanyData":
+                current.set_company(prepared["vat_id"], prepared["company_data"])
+            elif step == "createInvoicingAddress":
+                current.set_address(prepared["vat_id"], prepared["address"], "")
+            elif step == "moveInvoicingAddress":
+                current.move_address(prepared["address"], prepared["vat_id"])
+            elif step == "setInvoicingAddressData":
+                current.set_address_data(prepared["address"], prepared["address_data"])
+
+    with ReceiptConfirmer(contract.web3) as confirmer:
+
+        on_failure = record_failures(failures, state)
+        pipeline = TransactionPipeline(contract, confirmer, on_failure, max_in_flight, on_success=on_success)
+
+        for row_number, prepared in prepare_rows(fname, failures, encoding, reference_operators):
+            vat_id = prepared["vat_id"]
+            address = prepared["address"]
+
+            change = previous.compare(prepared)
+
+            # Until new data lands, the index tells what was there before
+            current.keep_company(vat_id, previous)
+            current.keep_address(address, previous)
+            seen_addresses.add(address)
+
+            if change.is_unchanged():
+                counts["unchanged"] += 1
+                continue
+
+            steps = []
+
+            if change.new_company or change.new_address:
+                counts["new"] += 1
+                steps += plan_steps(prepared, state)
+
+            if change.company_changed and vat_id not in updated_companies:
+                # Several rows of a company carry the same company data
+                counts["changed companies"] += 1
+                steps.append("setCompanyData")
+                updated_companies.add(vat_id)
+
+            if change.address_moved:
+                counts["moved addresses"] += 1
+                steps.append("moveInvoicingAddress")
+
+            if change.address_changed:
+                counts["changed addresses"] += 1
+                steps.append("setInvoicingAddressData")
+
+            rows = [(row_number, prepared)]
+            for step in steps:
+                if step == "moveInvoicingAddress":
+                    try:
+                        gas = estimate_move_gas(contract, pipeline.sender, prepared)
+                    except Exception as e:
+                        # The node would reject the move, the address data can still be updated
+                        on_failure(rows, step, None, "rejected: {}".format(e))
+                        continue
+                    args = (prepared["vat_key"], prepared["address_key"])
+                else:
+                    gas, args = build_step(step, prepared, step_gas)
+                pipeline.send(rows, gas, step, *args)
+
+        pipeline.drain()
+
+        print("Confirmation stats", confirmer.get_stats())
+
+    counts["removed"] = len(set(previous.addresses) - seen_addresses)
+
+    current.save(index_path)
+
+    print("Delta import done: {}, {} failed transactions".format(dict(counts), len(failures)))
+    return failures
+
+
+def dry_run(project: Project, args: argparse.Namespace, encoding: Encoding):
+    """Print a gas profile and cost projection of importing a file."""
+
+    # Late import, the profiler builds on this module
+    from eireg.profiler import profile_import
+
+    chain_name = "tester" if args.dry_run == "tester" else args.chain_name
+
+    with project.get_chain(chain_name) as chain:
+
+        if args.dry_run == "tester":
+            contract = chain.get_contract('EInvoicingRegistry')
+        else:
+            get_unlocked_deploy_from_address(chain)
+            contract = chain.get_contract_factory('EInvoicingRegistry')(address=args.address)
+
+        web3 = contract.web3
+
+        if args.reference_operators and args.dry_run == "tester":
+            import_operators(contract, collect_operators(args.fname), encoding)
+
+        profile = profile_import(contract, args.fname, send=args.dry_run == "tester", encoding=encoding,
+                                 reference_operators=args.reference_operators, limit=args.limit)
+
+        block_gas_limit = args.block_gas_limit or web3.eth.getBlock("latest")["gasLimit"]
+        gas_price = args.gas_price if args.gas_price is not None else web3.eth.gasPrice
+
+        print(profile.format_report(block_gas_limit, args.block_time, gas_price))
 
 
 def main():
@@ -149,15 +1310,71 @@ def main():
     Wrapper script defind in setup.py
     """
 
-    fname = sys.argv[1]
+    parser = argparse.ArgumentParser(description="Import Tieke CSV export to EInvoicingRegistry smart contract")
+    parser.add_argument("fname", help="Tieke CSV export file")
+    parser.add_argument("chain_name", help="Populus chain name, e.g. local_test")
+    parser.add_argument("address", help="Address of the deployed EInvoicingRegistry contract")
+    parser.add_argument("--mode", choices=["pooled", "pipelined", "batched", "delta", "async", "merkle"], default="pooled",
+                        help="pooled: confirm each transaction within a worker thread, "
+                             "async: keep thousands of rows in flight on one asyncio event loop, "
+                             "pipelined: keep many transactions in flight from one account, "
+                             "batched: import many rows per transaction, "
+                             "delta: import only rows changed since the previous export, "
+                             "merkle: keep rows in a local store and commit only a Merkle root per batch")
+    parser.add_argument("--index", help="Fingerprint index of the previously imported export, needed by delta mode")
+    parser.add_argument("--journal", help="Journal file of pipelined and batched modes, defaults to <fname>.journal")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted import from its journal")
+    parser.add_argument("--keyfiles", help="Directory of keystore files to sign and spread pipelined transactions with, "
+                                           "password is read from EIREG_KEYFILE_PASSWORD or asked")
+    parser.add_argument("--encoding", choices=[encoding.value for encoding in Encoding], default=Encoding.json.value,
+                        help="Payload encoding: json is self describing, compact stores only the values and costs less gas")
+    parser.add_argument("--reference-operators", action="store_true",
+                        help="Write operators once as their own records and refer to them by ID from address data")
+    parser.add_argument("--store", help="Content store of merkle mode, defaults to <fname>.merkle")
+    parser.add_argument("--dry-run", choices=["tester", "estimate"],
+                        help="Profile gas instead of importing: tester runs the import on a fresh contract on the in-process tester chain, "
+                             "estimate asks eth_estimateGas of the given chain for each transaction")
+    parser.add_argument("--limit", type=int, help="Profile only this many rows in a dry run")
+    parser.add_argument("--block-gas-limit", type=int, help="Block gas limit of dry run projections, defaults to the chain's")
+    parser.add_argument("--block-time", type=float, default=15.0, help="Seconds between blocks in dry run projections")
+    parser.add_argument("--gas-price", type=int, help="Wei per gas in dry run projections, defaults to the chain's")
+    parser.add_argument("--workers", type=int, help="Fixed worker count of pooled mode, scaled by confirmation latency if not given")
+    args = parser.parse_args()
+
+    journal_path = args.journal or args.fname + ".journal"
+
+    if args.mode in ("pooled", "delta", "async", "merkle"):
+        if args.resume:
+            parser.error("--resume needs --mode pipelined or batched")
+        if args.mode == "delta" and not args.index:
+            parser.error("--mode delta needs --index")
+    elif os.path.exists(journal_path) and not args.resume:
+        parser.error("Journal {} exists, use --resume to continue or remove it".format(journal_path))
+
+    if args.keyfiles and args.mode != "pipelined":
+        parser.error("--keyfiles needs --mode pipelined")
+
+    accounts = None
+    if args.keyfiles:
+        password = os.environ.get("EIREG_KEYFILE_PASSWORD") or getpass.getpass("Keyfile password: ")
+        accounts = load_keyfiles(args.keyfiles, password)
+        print("Sending from", accounts)
+
+    fname = args.fname
+
+    encoding = Encoding(args.encoding)
 
     # Connection info
-    chain_name = sys.argv[2]
+    chain_name = args.chain_name
 
-    address = sys.argv[3]
+    address = args.address
 
     project = Project()
 
+    if args.dry_run:
+        dry_run(project, args, encoding)
+        return
+
     print("Make sure {} is running or you'll get timeout".format(chain_name))
 
     with project.get_chain(chain_name) as chain:
@@ -167,8 +1384,40 @@ def main():
 
         EInvoicingRegistry = chain.get_contract_factory('EInvoicingRegistry')
         contract = EInvoicingRegistry(address=address)
-        import_all_pooled(contract, fname)
 
+        if accounts:
+            authorize_writers(contract, [account.address for account in accounts])
+
+        reference_operators = args.reference_operators
+        if reference_operators:
+            import_operators(contract, collect_operators(fname), encoding)
+
+        if args.mode == "pooled":
+            import_all_pooled(contract, fname, workers=args.workers, encoding=encoding, reference_operators=reference_operators)
+            return
+
+        if args.mode == "delta":
+            import_delta(contract, fname, args.index, encoding=encoding, reference_operators=reference_operators)
+            return
+
+        if args.mode == "merkle":
+            store = ContentStore(args.store or fname + ".merkle")
+            import_all_merkle(contract, fname, store, encoding=encoding, reference_operators=reference_operators)
+            store.close()
+            return
 
+        if args.mode == "async":
+            provider = contract.web3.currentProvider
+            import_all_asyncio(contract, fname, host=getattr(provider, "host", "localhost"), port=getattr(provider, "port", 8545),
+                               encoding=encoding, reference_operators=reference_operators)
+            return
 
+        resume = ImportJournal.load(journal_path) if args.resume else None
 
+        with ImportJournal(journal_path, args.mode, fname) as journal:
+            if args.mode == "pipelined":
+                import_all_pipelined(contract, fname, journal=journal, resume=resume, accounts=accounts,
+                                     encoding=encoding, reference_operators=reference_operators)
+            else:
+                import_all_batched(contract, fname, journal=journal, resume=resume,
+                                   encoding=encoding, reference_operators=reference_operators)
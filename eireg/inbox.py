@@ -0,0 +1,217 @@
+"""Receive invoices sent to our invoicing addresses and send invoices in bulk."""
+
+import os
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from ethereum.utils import encode_hex, sha3
+from web3.contract import Contract
+
+from eireg.backfill import EventBackfill
+from eireg.blockchain import STORAGE_WORD_GAS
+from eireg.client import RegistryClient
+from eireg.confirmer import ReceiptConfirmer
+from eireg.events import get_events
+from eireg.pipeline import TransactionPipeline
+
+
+#: Fixed gas of a ``sendInvoice`` transaction, excluding the payload it stores
+SEND_INVOICE_BASE_GAS = 80000
+
+
+def address_topic(invoicing_address: str) -> bytes:
+    """Topic of an indexed invoicing address: Keccak-256 of the string, as Solidity logs indexed strings."""
+    return sha3(invoicing_address.encode("utf-8"))
+
+
+class Invoice:
+    """An invoice sent to one of our invoicing addresses."""
+
+    def __init__(self, invoice_id: str, to_address: str, from_topic: bytes, payload: str, block_number: int, txid: str):
+        self.invoice_id = invoice_id
+        self.to_address = to_address
+
+        #: Indexed strings are logged only as their hash, so we do not know the sender address
+        self.from_topic = from_topic
+
+        self.payload = payload
+        self.block_number = block_number
+        self.txid = txid
+
+    def __repr__(self):
+        return "<Invoice {} to {} in block {}>".format(self.invoice_id, self.to_address, self.block_number)
+
+
+class InvoiceInbox:
+    """Stream invoices sent to a set of our invoicing addresses.
+
+    Only ``InvoiceSent`` logs whose indexed ``toInvoiceAddress`` is one of ours are
+    asked from the node, so an operator with thousands of addresses does not scan
+    every invoice on the chain. History is fetched in parallel chunks by :class:`EventBackfill`
+    and the payloads of each chunk with one batch of ``getInvoice`` calls.
+
+    Delivery is at least once: the last block of a chunk is written to the checkpoint file
+    only after the consumer has taken all of its invoices. After a crash
+    the invoices of the chunk being processed are delivered again.
+
+    Usage::
+
+        inbox = InvoiceInbox(contract, ["OVT:3724303727"], checkpoint_path="inbox.checkpoint")
+        for invoice in inbox.follow():
+            process(invoice)
+
+    """
+
+    def __init__(self,
+                 contract: Contract,
+                 addresses: Iterable[str],
+                 client: Optional[RegistryClient]=None,
+                 checkpoint_path: Optional[str]=None,
+                 start_block=0,
+                 chunk_size=5000,
+                 poll_interval=1.0):
+        """
+        :param addresses: Our receiving invoicing addresses
+        :param client: :class:`RegistryClient` for the payload reads, a new one is created if not given
+        :param checkpoint_path: File keeping the last fully consumed block, resume from it. Nothing is kept if not given.
+        :param start_block: Block where the contract was deployed, for the first run
+        :param chunk_size: Blocks per first log requests
+        :param poll_interval: Seconds between checks for new blocks in :meth:`follow`
+        :raise ValueError: If no addresses are given
+        """
+        #: Topic -> our invoicing address
+        self.addresses = {address_topic(address): address for address in addresses}
+
+        # An empty topic list would match the invoices of everybody
+        if not self.addresses:
+            raise ValueError("Need at least one invoicing address")
+
+        self.contract = contract
+        self.client = client or RegistryClient(contract)
+        self.owns_client = client is None
+        self.checkpoint_path = checkpoint_path
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+
+        #: Last block whose invoices have been consumed
+        self.last_block = self.load_checkpoint()
+        if self.last_block is None:
+            self.last_block = start_block - 1
+
+    def close(self):
+        """Close the client unless it was given to us."""
+        if self.owns_client:
+            self.client.close()
+
+    def load_checkpoint(self) -> Optional[int]:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path, "rt") as inp:
+            return int(inp.read().strip())
+
+    def save_checkpoint(self, block_number: int):
+        """Move the checkpoint after the invoices up to the block have been consumed."""
+        self.last_block = block_number
+        if not self.checkpoint_path:
+            return
+        temp = self.checkpoint_path + ".tmp"
+        with open(temp, "wt") as out:
+            out.write(str(block_number))
+        os.replace(temp, self.checkpoint_path)
+
+    def get_events(self, from_block: int, to_block: int) -> List[dict]:
+        """``InvoiceSent`` events to our addresses."""
+        topics = [["0x" + encode_hex(topic) for topic in self.addresses]]
+        return get_events(self.contract, ["InvoiceSent"], from_block, to_block, topics=topics)
+
+    def fetch_invoices(self, events: List[dict]) -> List[Invoice]:
+        """Read the payloads of invoice events in one batch.
+
+        Payloads are stored by invoice ID and read at the latest block, not at the block of the event.
+        If a sender reuses an invoice ID, every event of it gives the payload sent last.
+        """
+
+        payloads = [self.client.submit("getInvoice", event["args"]["invoiceId"]) for event in events]
+
+        invoices = []
+        for event, payload in zip(events, payloads):
+            args = event["args"]
+            invoices.append(Invoice(args["invoiceId"], self.addresses[args["toInvoiceAddress"]], args["fromInvoiceAddress"],
+                                    payload.result(), event["blockNumber"], event["transactionHash"]))
+        return invoices
+
+    def iter_invoices(self, to_block: Optional[int]=None) -> Iterator[Invoice]:
+        """Yield invoices received since the checkpoint, in block order.
+
+        :param to_block: Last block, inclusive, defaults to the latest block
+        """
+
+        if to_block is None:
+            to_block = self.contract.web3.eth.blockNumber
+
+        if to_block <= self.last_block:
+            return
+
+        backfill = EventBackfill(self.contract, ["InvoiceSent"], chunk_size=self.chunk_size, fetch_range=self.get_events)
+
+        for chunk_end, events in backfill.iter_chunks(self.last_block + 1, to_block):
+            for invoice in self.fetch_invoices(events):
+                yield invoice
+            self.save_checkpoint(chunk_end)
+
+    def follow(self) -> Iterator[Invoice]:
+        """Yield received invoices forever, polling for new blocks."""
+        while True:
+            for invoice in self.iter_invoices():
+                yield invoice
+            time.sleep(self.poll_interval)
+
+
+class InvoiceFailure(Exception):
+    """A ``sendInvoice`` transaction did not go through."""
+
+    def __init__(self, invoice_id: str, txid: str, reason: str):
+        self.invoice_id = invoice_id
+        self.txid = txid
+        self.reason = reason
+        super(InvoiceFailure, self).__init__("Invoice {} failed ({}), txid {}".format(invoice_id, reason, txid))
+
+
+def estimate_invoice_gas(payload: str) -> int:
+    words = (len(payload.encode("utf-8")) + 31) // 32
+    return SEND_INVOICE_BASE_GAS + words * STORAGE_WORD_GAS
+
+
+def send_invoices(contract: Contract,
+                  invoices: Iterable[Tuple[str, str, str, str]],
+                  max_in_flight=256,
+                  sender: Optional[str]=None) -> List[InvoiceFailure]:
+    """Send many invoices without waiting for each transaction.
+
+    Transactions go through a :class:`TransactionPipeline` with locally assigned nonces and static gas limits.
+
+    :param invoices: (to invoicing address, from invoicing address, invoice id, payload) tuples
+    :param max_in_flight: How many unconfirmed transactions we allow
+    :param sender: Sending account, defaults to the coinbase
+    :return: Invoices whose transactions failed
+    """
+
+    failures = []
+
+    def on_failure(invoice_id, step, txid, reason):
+        failure = InvoiceFailure(invoice_id, txid, reason)
+        print(failure)
+        failures.append(failure)
+
+    with ReceiptConfirmer(contract.web3) as confirmer:
+        pipeline = TransactionPipeline(contract, confirmer, on_failure, max_in_flight, sender=sender)
+
+        count = 0
+        for to_address, from_address, invoice_id, payload in invoices:
+            pipeline.send(invoice_id, estimate_invoice_gas(payload), "sendInvoice", to_address, from_address, invoice_id, payload)
+            count += 1
+
+        pipeline.drain()
+
+    print("Sent {} invoices, {} failed".format(count, len(failures)))
+    return failures
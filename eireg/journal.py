@@ -0,0 +1,166 @@
+"""Append-only on-disk journal of import progress for crash-safe resume."""
+
+import json
+import os
+import threading
+from typing import List, Optional
+
+
+class JournalState:
+    """Import progress read back from a journal file."""
+
+    def __init__(self):
+        #: Import mode and absolute path of the CSV file of the run
+        self.mode = None
+        self.fname = None
+
+        #: Row number -> list of contract function names the row needs
+        self.planned = {}
+
+        #: txid -> (row numbers, contract function name, nonce)
+        self.sent = {}
+
+        #: txid -> True if the transaction went through
+        self.confirmed = {}
+
+        #: Row number -> txids sent for it
+        self.txids_by_row = {}
+
+    def apply(self, record: dict):
+        if record["type"] == "run":
+            self.mode = record["mode"]
+            self.fname = record["fname"]
+        elif record["type"] == "planned":
+            self.planned[record["row"]] = record["steps"]
+        elif record["type"] == "sent":
+            self.sent[record["txid"]] = (record["rows"], record["step"], record["nonce"])
+            for row_number in record["rows"]:
+                self.txids_by_row.setdefault(row_number, []).append(record["txid"])
+        elif record["type"] == "confirmed":
+            self.confirmed[record["txid"]] = record["success"]
+
+    def check_run(self, mode: str, fname: str):
+        """Refuse to resume the journal of another import mode or CSV file.
+
+        Row numbers and steps mean nothing for another file or mode.
+
+        :raise ValueError: If the journal was written by another kind of run
+        """
+        fname = os.path.abspath(fname)
+        if self.mode != mode or self.fname != fname:
+            raise ValueError("Journal is of {} import of {}, cannot resume {} import of {}".format(
+                self.mode, self.fname, mode, fname))
+
+    def get_unconfirmed(self) -> List[str]:
+        """Transactions which were in flight when the import stopped."""
+        return [txid for txid in self.sent if txid not in self.confirmed]
+
+    def get_completed_steps(self, row_number: int) -> set:
+        """Steps of a row whose transaction went through."""
+        return {
+            self.sent[txid][1]
+            for txid in self.txids_by_row.get(row_number, [])
+            if self.confirmed.get(txid)
+        }
+
+    def get_remaining_steps(self, row_number: int) -> Optional[List[str]]:
+        """Steps of a row still to be sent.
+
+        :return: Planned steps without a successful transaction, in order, or None if the row was never planned
+        """
+        if row_number not in self.planned:
+            return None
+        completed = self.get_completed_steps(row_number)
+        return [step for step in self.planned[row_number] if step not in completed]
+
+
+class ImportJournal:
+    """Record which transactions were sent for which CSV rows and how they ended.
+
+    One JSON object per line. Every record is flushed to the operating system
+    as it is written, so killing the process loses nothing. The file is
+    fsync'ed every ``sync_every`` records and on close, against power loss.
+    A half written line left by a crash is skipped on load.
+
+    Records:
+
+    * ``run``: import mode and CSV file, written first to a new journal
+    * ``planned``: steps a row needs, written before any of them is sent
+    * ``sent``: txid and nonce of a transaction and the rows it carries
+    * ``confirmed``: whether a transaction went through
+    """
+
+    def __init__(self, path: str, mode: str, fname: str, sync_every=100):
+        """
+        :param mode: Import mode, ``pipelined`` or ``batched``
+        :param fname: CSV file imported
+        """
+        self.path = path
+        self.sync_every = sync_every
+        self.lock = threading.Lock()
+        self.unsynced = 0
+
+        # Terminate a line torn by a crash, so that it does not swallow our first record
+        torn = False
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new:
+            with open(path, "rb") as inp:
+                inp.seek(-1, os.SEEK_END)
+                torn = inp.read(1) != b"\n"
+
+        self.file = open(path, "at", encoding="utf-8")
+        if torn:
+            self.file.write("\n")
+
+        if new:
+            self.write({"type": "run", "mode": mode, "fname": os.path.abspath(fname)})
+
+    @staticmethod
+    def load(path: str) -> JournalState:
+        """Read the progress of an earlier run."""
+
+        state = JournalState()
+
+        if not os.path.exists(path):
+            return state
+
+        with open(path, "rt", encoding="utf-8") as inp:
+            for line in inp:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn write by a crash
+                    continue
+                state.apply(record)
+
+        return state
+
+    def write(self, record: dict):
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+            self.unsynced += 1
+            if self.unsynced >= self.sync_every:
+                os.fsync(self.file.fileno())
+                self.unsynced = 0
+
+    def record_planned(self, row_number: int, steps: List[str]):
+        self.write({"type": "planned", "row": row_number, "steps": steps})
+
+    def record_sent(self, row_numbers: List[int], step: str, txid: str, nonce: int):
+        self.write({"type": "sent", "rows": row_numbers, "step": step, "txid": txid, "nonce": nonce})
+
+    def record_confirmed(self, txid: str, success: bool):
+        self.write({"type": "confirmed", "txid": txid, "success": success})
+
+    def close(self):
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,245 @@
+"""Merkle-batched records: only batch roots go on chain, rows stay in a local store and are served with proofs."""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+from web3.contract import Contract
+
+
+#: Prefixes keep a leaf from being passed off as an inner node
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+class VerificationError(Exception):
+    """A record does not match a root committed to the registry."""
+
+
+def batch_record(prepared: dict) -> dict:
+    """The part of a prepared row we commit to: the same values an import would store in the contract."""
+    return {
+        "vat_id": prepared["vat_id"],
+        "address": prepared["address"],
+        "company_data": prepared["company_data"],
+        "address_data": prepared["address_data"],
+    }
+
+
+def encode_record(record: dict) -> bytes:
+    """Canonical bytes of a record: JSON with sorted keys and no whitespace."""
+    return json.dumps(record, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def hash_leaf(record: dict) -> bytes:
+    return hashlib.sha256(LEAF_PREFIX + encode_record(record)).digest()
+
+
+def hash_node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+class MerkleTree:
+    """Binary SHA-256 hash tree over the records of one batch.
+
+    An odd node at the end of a level is moved up a level as is.
+    """
+
+    def __init__(self, records: List[dict]):
+        assert records, "Empty batch"
+
+        self.levels = [[hash_leaf(record) for record in records]]
+
+        while len(self.levels[-1]) > 1:
+            level = self.levels[-1]
+            parents = [hash_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                parents.append(level[-1])
+            self.levels.append(parents)
+
+    @property
+    def root(self) -> bytes:
+        return self.levels[-1][0]
+
+    def get_proof(self, index: int) -> List[Tuple[bool, bytes]]:
+        """Sibling hashes from the leaf up to the root.
+
+        :return: List of (sibling is on the left, sibling hash)
+        """
+        proof = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                proof.append((sibling < index, level[sibling]))
+            index //= 2
+        return proof
+
+
+def compute_root(record: dict, proof: List[Tuple[bool, bytes]]) -> bytes:
+    """Root of the tree a record and its proof belong to."""
+    node = hash_leaf(record)
+    for left, sibling in proof:
+        node = hash_node(sibling, node) if left else hash_node(node, sibling)
+    return node
+
+
+def encode_proof(proof: List[Tuple[bool, bytes]]) -> str:
+    return json.dumps([[left, sibling.hex()] for left, sibling in proof])
+
+
+def decode_proof(value: str) -> List[Tuple[bool, bytes]]:
+    return [(left, bytes.fromhex(sibling)) for left, sibling in json.loads(value)]
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    root TEXT PRIMARY KEY,
+    row_count INTEGER NOT NULL,
+    txid TEXT,
+    committed INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS records (
+    root TEXT NOT NULL,
+    address TEXT NOT NULL,
+    vat_id TEXT NOT NULL,
+    record TEXT NOT NULL,
+    proof TEXT NOT NULL,
+    PRIMARY KEY (root, address)
+);
+
+CREATE INDEX IF NOT EXISTS records_address ON records (address);
+CREATE INDEX IF NOT EXISTS records_vat_id ON records (vat_id);
+"""
+
+
+class ContentStore:
+    """Local SQLite store of the rows of Merkle-batched imports, each with its proof.
+
+    A batch is added before its root is committed and marked committed when the
+    transaction lands. Lookups only see committed batches. If an address is in
+    several batches, the latest committed one wins.
+    """
+
+    def __init__(self, path=":memory:"):
+        """
+        :param path: SQLite database file
+        """
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def add_batch(self, records: List[dict]) -> bytes:
+        """Build the tree of a batch and store its records with their proofs.
+
+        :return: Merkle root to commit
+        """
+        tree = MerkleTree(records)
+        root = tree.root.hex()
+
+        rows = [(root, record["address"], record["vat_id"], json.dumps(record), encode_proof(tree.get_proof(index)))
+                for index, record in enumerate(records)]
+
+        with self.lock, self.db:
+            self.db.execute("INSERT OR IGNORE INTO batches (root, row_count) VALUES (?, ?)", (root, len(records)))
+            self.db.executemany("INSERT OR REPLACE INTO records (root, address, vat_id, record, proof) VALUES (?, ?, ?, ?, ?)", rows)
+
+        return tree.root
+
+    def is_committed(self, root: bytes) -> bool:
+        with self.lock:
+            row = self.db.execute("SELECT committed FROM batches WHERE root=?", (root.hex(),)).fetchone()
+        return bool(row and row[0])
+
+    def set_committed(self, root: bytes, txid: str):
+        with self.lock, self.db:
+            self.db.execute("UPDATE batches SET committed=1, txid=? WHERE root=?", (txid, root.hex()))
+
+    def get_record(self, address: str) -> Optional[Tuple[dict, List[Tuple[bool, bytes]], bytes]]:
+        """Latest committed record of an invoicing address.
+
+        :return: (record, proof, root), None if the address is in no committed batch
+        """
+        with self.lock:
+            row = self.db.execute("""
+                SELECT records.record, records.proof, records.root FROM records JOIN batches ON batches.root=records.root
+                WHERE records.address=? AND batches.committed=1 ORDER BY batches.rowid DESC LIMIT 1""", (address,)).fetchone()
+
+        if not row:
+            return None
+
+        return json.loads(row[0]), decode_proof(row[1]), bytes.fromhex(row[2])
+
+    def get_invoicing_addresses(self, vat_id: str) -> List[str]:
+        with self.lock:
+            rows = self.db.execute("""
+                SELECT DISTINCT records.address FROM records JOIN batches ON batches.root=records.root
+                WHERE records.vat_id=? AND batches.committed=1 ORDER BY records.address""", (vat_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            batches, committed, rows = self.db.execute("SELECT COUNT(*), SUM(committed), SUM(row_count) FROM batches").fetchone()
+        return {"batches": batches, "committed": committed or 0, "rows": rows or 0}
+
+
+class MerkleVerifier:
+    """Serve records from a :class:`ContentStore`, checked against the roots committed to the registry.
+
+    Usage::
+
+        verifier = MerkleVerifier(contract, ContentStore("sample.csv.merkle"))
+        record = verifier.get_address_record("OVT:3724303727")
+
+    """
+
+    def __init__(self, contract: Contract, store: ContentStore):
+        self.contract = contract
+        self.store = store
+
+        #: Roots seen committed, a commit is never undone
+        self.committed_roots = set()
+
+    def is_committed(self, root: bytes) -> bool:
+        if root in self.committed_roots:
+            return True
+
+        if self.contract.call().getBatchRootBlock(root) > 0:
+            self.committed_roots.add(root)
+            return True
+
+        return False
+
+    def verify(self, record: dict, proof: List[Tuple[bool, bytes]], root: bytes):
+        """Check a record belongs to a batch committed to the registry.
+
+        :raise VerificationError: If it does not
+        """
+        if compute_root(record, proof) != root:
+            raise VerificationError("Record of {} does not match its batch root".format(record.get("address")))
+
+        if not self.is_committed(root):
+            raise VerificationError("Batch root {} is not committed to the registry".format(root.hex()))
+
+    def get_address_record(self, address: str) -> Optional[dict]:
+        """Verified record of an invoicing address, None if there is none.
+
+        :return: dict with ``vat_id``, ``address``, ``company_data`` and ``address_data``
+        """
+        found = self.store.get_record(address)
+        if not found:
+            return None
+
+        record, proof, root = found
+        self.verify(record, proof, root)
+
+        # A valid proof of some other row does not answer for this address
+        if record["address"] != address:
+            raise VerificationError("Store gave the record of {} for {}".format(record["address"], address))
+
+        return record
@@ -0,0 +1,206 @@
+"""Send many contract transactions from one account without waiting their receipts."""
+
+import collections
+import zlib
+from typing import Any, Callable, List, Optional
+
+from web3.contract import Contract
+
+from eireg.blockchain import GasPriceCache, NonceManager
+from eireg.confirmer import ReceiptConfirmer
+from eireg.signer import LocalAccount
+
+
+class TransactionPipeline:
+    """Keep a window of unconfirmed transactions in flight.
+
+    Nonces are assigned locally, so the node mines our transactions in the same
+    order we send them and a later transaction never lands before an earlier one.
+    Receipts are resolved by a shared :class:`ReceiptConfirmer`. When ``max_in_flight``
+    transactions are unconfirmed, :meth:`send` waits for the oldest one first.
+
+    Each transaction carries a ``context`` object, e.g. the CSV rows it imports,
+    which is given back to ``on_failure`` or ``on_success`` when the transaction is confirmed.
+
+    A transaction the node rejects, e.g. as underpriced, goes to ``on_failure`` without a txid
+    and the import goes on. Following transactions with the same context object, the later
+    steps of a row, depend on it and are not sent either.
+    """
+
+    def __init__(self,
+                 contract: Contract,
+                 confirmer: ReceiptConfirmer,
+                 on_failure: Callable[[Any, str, str, str], None],
+                 max_in_flight=256,
+                 sender: Optional[str]=None,
+                 on_success: Optional[Callable[[Any, str, str], None]]=None,
+                 on_sent: Optional[Callable[[Any, str, str, int], None]]=None,
+                 signer: Optional[LocalAccount]=None,
+                 gas_price_interval=60.0):
+        """
+        :param on_failure: Called with (context, contract function name, txid, reason)
+        :param on_success: Called with (context, contract function name, txid) when a transaction lands
+        :param on_sent: Called with (context, contract function name, txid, nonce) when a transaction has been sent
+        :param max_in_flight: How many unconfirmed transactions we allow
+        :param sender: Account sending the transactions, defaults to the coinbase
+        :param signer: Sign transactions locally with this account and send them raw, instead of having the node sign them
+        :param gas_price_interval: See :class:`GasPriceCache`
+        """
+        web3 = contract.web3
+        self.contract = contract
+        self.confirmer = confirmer
+        self.on_failure = on_failure
+        self.on_success = on_success
+        self.on_sent = on_sent
+        self.max_in_flight = max_in_flight
+        self.signer = signer
+        self.gas_prices = GasPriceCache(gas_price_interval)
+        if signer:
+            self.sender = signer.address
+        else:
+            self.sender = sender or web3.eth.defaultAccount or web3.eth.coinbase
+        self.nonces = NonceManager(web3, self.sender)
+        self.in_flight = collections.deque()
+
+        #: (context, contract function name) of the last transaction the node rejected
+        self.rejected = None
+
+    def get_gas_price(self) -> int:
+        if self.gas_prices.is_stale():
+            self.gas_prices.update(self.contract.web3.eth.gasPrice)
+        return self.gas_prices.price
+
+    def has_room(self) -> bool:
+        """Can we send a transaction without waiting for a receipt."""
+        return len(self.in_flight) < self.max_in_flight
+
+    def send(self, context: Any, gas: int, function_name: str, *args) -> Optional[str]:
+        """Send a contract transaction and start following its receipt.
+
+        :param context: Passed back to ``on_failure``
+        :param gas: Gas limit, we never ask the node to estimate it
+        :return: txid, None if the transaction was not sent
+        """
+
+        if self.rejected and self.rejected[0] is context:
+            self.on_failure(context, function_name, None, "not sent, {} was rejected".format(self.rejected[1]))
+            return None
+        self.rejected = None
+
+        while len(self.in_flight) >= self.max_in_flight:
+            self.collect_oldest()
+
+        nonce = self.nonces.next()
+        try:
+            if self.signer:
+                data = self.contract.encodeABI(function_name, args)
+                raw = self.signer.sign_transaction(nonce, self.get_gas_price(), gas, self.contract.address, data)
+                txid = self.contract.web3.eth.sendRawTransaction(raw)
+            else:
+                transaction = {"from": self.sender, "nonce": nonce, "gas": gas}
+                txid = getattr(self.contract.transact(transaction), function_name)(*args)
+        except Exception as e:
+            # The node rejected the transaction and did not consume the nonce
+            self.nonces.reset()
+            self.rejected = (context, function_name)
+            self.on_failure(context, function_name, None, "rejected: {}".format(str(e) or e.__class__.__name__))
+            return None
+
+        if self.on_sent:
+            self.on_sent(context, function_name, txid, nonce)
+
+        self.in_flight.append((context, function_name, txid, self.confirmer.submit(txid)))
+        return txid
+
+    def collect_oldest(self):
+        """Wait for the oldest transaction in flight."""
+
+        context, function_name, txid, future = self.in_flight.popleft()
+
+        try:
+            success = future.result().success
+            reason = "out of gas"
+        except Exception as e:
+            success = False
+            reason = str(e) or e.__class__.__name__
+
+        if not success:
+            self.on_failure(context, function_name, txid, reason)
+        elif self.on_success:
+            self.on_success(context, function_name, txid)
+
+    def collect_done(self):
+        """Handle the oldest transactions which are already confirmed, without waiting."""
+        while self.in_flight and self.in_flight[0][3].done():
+            self.collect_oldest()
+
+    def drain(self):
+        """Wait until all transactions have been confirmed."""
+        while self.in_flight:
+            self.collect_oldest()
+
+
+class ShardedPipeline:
+    """Spread transactions over several sending accounts, each with its own :class:`TransactionPipeline`.
+
+    One account's nonces serialize all of its transactions. With several
+    accounts the node accepts and miners include transactions of each
+    account independently. Transactions with the same shard key, e.g. the
+    VAT ID of a company, always go through the same account, so they still
+    land in the order they were sent.
+
+    When the window of an account is full, its transactions wait in a backlog
+    and :meth:`send` returns, so one slow account does not hold back the others.
+    Only when ``max_backlog`` transactions are waiting, :meth:`send` blocks
+    for the receipts of the account with the longest backlog.
+    """
+
+    def __init__(self, pipelines: List[TransactionPipeline], max_backlog=1024):
+        """
+        :param max_backlog: How many transactions may wait for a full window over all accounts
+        """
+        assert pipelines, "Need at least one sender"
+        self.pipelines = pipelines
+        self.max_backlog = max_backlog
+
+        #: Transactions not sent yet, per pipeline, in the order they were given
+        self.backlogs = [collections.deque() for pipeline in pipelines]
+        self.backlog_size = 0
+
+    def get_shard(self, key: str) -> int:
+        # Stable across runs, unlike hash()
+        return zlib.crc32(key.encode("utf-8")) % len(self.pipelines)
+
+    def get_pipeline(self, key: str) -> TransactionPipeline:
+        return self.pipelines[self.get_shard(key)]
+
+    def send(self, key: str, context: Any, gas: int, function_name: str, *args):
+        """Send a transaction from the account of the shard key, or queue it until the account has room."""
+
+        self.backlogs[self.get_shard(key)].append((context, gas, function_name, args))
+        self.backlog_size += 1
+        self.flush()
+
+        while self.backlog_size > self.max_backlog:
+            shard = max(range(len(self.pipelines)), key=lambda shard: len(self.backlogs[shard]))
+            self.pipelines[shard].collect_oldest()
+            self.flush()
+
+    def flush(self):
+        """Send waiting transactions of all accounts which have room in their window."""
+        for pipeline, backlog in zip(self.pipelines, self.backlogs):
+            pipeline.collect_done()
+            while backlog and pipeline.has_room():
+                context, gas, function_name, args = backlog.popleft()
+                self.backlog_size -= 1
+                pipeline.send(context, gas, function_name, *args)
+
+    def drain(self):
+        """Send the backlogs and wait until transactions of all accounts have been confirmed."""
+        for pipeline, backlog in zip(self.pipelines, self.backlogs):
+            while backlog:
+                context, gas, function_name, args = backlog.popleft()
+                self.backlog_size -= 1
+                pipeline.send(context, gas, function_name, *args)
+        for pipeline in self.pipelines:
+            pipeline.drain()
@@ -0,0 +1,66 @@
+"""Call a function periodically in the background, surviving node hiccups."""
+
+import asyncio
+import threading
+from typing import Callable
+
+
+def report_failure(name: str, e: Exception):
+    # Node hiccup, try again with the next tick
+    print("{} failed: {}".format(name, e))
+
+
+class Poller:
+    """Call ``poll`` every ``interval`` seconds in a daemon thread until stopped.
+
+    An exception from ``poll`` is printed and the next tick calls it again.
+
+    Usage::
+
+        self.poller = Poller("CachedRegistry sync", self.sync, poll_interval)
+        self.poller.start()
+
+    """
+
+    def __init__(self, name: str, poll: Callable[[], None], interval: float):
+        """
+        :param name: Thread name and prefix of failure messages
+        :param interval: Seconds between calls. A poller following the chain notices a new block this much late at worst.
+        """
+        self.name = name
+        self.poll = poll
+        self.interval = interval
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def start(self):
+        assert not self.thread, "Already started"
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop after the current call, if any, has returned."""
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                report_failure(self.name, e)
+
+
+async def poll_forever(name: str, poll: Callable, interval: float):
+    """Await ``poll()`` every ``interval`` seconds until the task is cancelled, the asyncio counterpart of :class:`Poller`."""
+    while True:
+        try:
+            await poll()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            report_failure(name, e)
+        await asyncio.sleep(interval)
@@ -0,0 +1,205 @@
+"""Dry-run gas profile of an import, to learn what an import costs before sending anything for real."""
+
+import collections
+import contextlib
+import math
+import time
+from typing import Optional
+
+from web3 import Web3
+from web3.contract import Contract
+from web3.utils.transactions import wait_for_transaction_receipt
+
+from eireg.data import ContentType, Encoding
+from eireg.importer import IMPORT_STEPS, ImportFailure, build_step, calibrate_step_gas, plan_steps, prepare_rows
+from eireg.state import ImportState
+
+#: Step writing the payload of each content type
+PAYLOAD_STEPS = {
+    "setCompanyData": ContentType.TiekeCompanyData,
+    "setInvoicingAddressData": ContentType.TiekeAddressData,
+}
+
+
+class ImportProfile:
+    """Gas, transactions and RPC calls of an import, per step and per payload content type."""
+
+    def __init__(self):
+        self.rows = 0
+        self.skipped_rows = 0
+
+        #: Rows which cannot be stored in the registry, as :class:`eireg.importer.ImportFailure`
+        self.invalid_rows = []
+        self.duration = 0.0
+
+        #: Step -> transaction count, gas used, gas limit we would give it, most gas used by one transaction
+        self.transactions = collections.Counter()
+        self.gas = collections.Counter()
+        self.limits = collections.Counter()
+        self.max_gas = collections.Counter()
+
+        #: Content type -> payload count, total UTF-8 bytes, largest payload
+        self.payloads = collections.Counter()
+        self.payload_bytes = collections.Counter()
+        self.max_payload_bytes = collections.Counter()
+
+        #: JSON-RPC method -> calls made by the dry run
+        self.rpc_calls = collections.Counter()
+
+    def record_step(self, step: str, gas: int, limit: int, payload: Optional[str]=None):
+        self.transactions[step] += 1
+        self.gas[step] += gas
+        self.limits[step] += limit
+        self.max_gas[step] = max(self.max_gas[step], gas)
+
+        if payload is not None:
+            content_type = PAYLOAD_STEPS[step]
+            size = len(payload.encode("utf-8"))
+            self.payloads[content_type] += 1
+            self.payload_bytes[content_type] += size
+            self.max_payload_bytes[content_type] = max(self.max_payload_bytes[content_type], size)
+
+    def get_total_gas(self) -> int:
+        return sum(self.gas.values())
+
+    def get_total_transactions(self) -> int:
+        return sum(self.transactions.values())
+
+    def project(self, block_gas_limit: int, block_time=15.0, gas_price: Optional[int]=None) -> dict:
+        """Project the cost and duration of the real import.
+
+        Assumes the import fills whole blocks, as the pipelined and pooled modes do.
+
+        :param block_gas_limit: Gas limit of the target chain's blocks
+        :param block_time: Average seconds between blocks
+        :param gas_price: Wei per gas, no cost is projected if not given
+        """
+        total_gas = self.get_total_gas()
+        blocks = math.ceil(total_gas / block_gas_limit)
+        return {
+            "gas": total_gas,
+            "transactions": self.get_total_transactions(),
+            "blocks": blocks,
+            "duration": blocks * block_time,
+            "cost_wei": total_gas * gas_price if gas_price is not None else None,
+        }
+
+    def format_report(self, block_gas_limit: int, block_time=15.0, gas_price: Optional[int]=None) -> str:
+        rows = self.rows or 1
+        lines = [
+            "Rows: {}, of which {} need no transactions, and {} rows which cannot be imported".format(
+                self.rows, self.skipped_rows, len(self.invalid_rows)),
+            "",
+            "{:<26}{:>8}{:>14}{:>12}{:>12}{:>14}".format("Step", "Txs", "Gas", "Gas/tx", "Max gas", "Gas limits"),
+        ]
+
+        for step in IMPORT_STEPS:
+            count = self.transactions[step]
+            lines.append("{:<26}{:>8}{:>14}{:>12}{:>12}{:>14}".format(
+                step, count, self.gas[step], self.gas[step] // count if count else 0, self.max_gas[step], self.limits[step]))
+
+        lines += ["", "{:<26}{:>8}{:>14}{:>12}{:>12}".format("Payload", "Count", "Bytes", "Bytes/each", "Max bytes")]
+        for content_type in PAYLOAD_STEPS.values():
+            count = self.payloads[content_type]
+            lines.append("{:<26}{:>8}{:>14}{:>12}{:>12}".format(
+                content_type.name, count, self.payload_bytes[content_type],
+                self.payload_bytes[content_type] // count if count else 0, self.max_payload_bytes[content_type]))
+
+        lines += ["", "RPC calls of the dry run: {}".format(", ".join("{} {}".format(method, count) for method, count in sorted(self.rpc_calls.items())))]
+
+        projection = self.project(block_gas_limit, block_time, gas_price)
+        lines += [
+            "",
+            "Per row: {:.1f} transactions, {} gas, {:.1f} RPC calls".format(
+                projection["transactions"] / rows, projection["gas"] // rows, sum(self.rpc_calls.values()) / rows),
+            "Total: {} transactions, {} gas".format(projection["transactions"], projection["gas"]),
+            "Projected at block gas limit {} and {} s blocks: {} blocks, {:.0f} s".format(
+                block_gas_limit, block_time, projection["blocks"], projection["duration"]),
+        ]
+
+        if projection["cost_wei"] is not None:
+            lines.append("Projected cost at {} wei/gas: {} ETH".format(gas_price, Web3.fromWei(projection["cost_wei"], "ether")))
+
+        return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def count_requests(web3: Web3, counter: collections.Counter):
+    """Count the JSON-RPC requests made through the provider of a web3 instance, by method."""
+
+    provider = web3.currentProvider
+    original = provider.make_request
+
+    def make_request(method, params):
+        counter[method] += 1
+        return original(method, params)
+
+    provider.make_request = make_request
+    try:
+        yield counter
+    finally:
+        provider.make_request = original
+
+
+def profile_import(contract: Contract,
+                   fname: str,
+                   send=False,
+                   encoding: Encoding=Encoding.json,
+                   reference_operators=False,
+                   limit: Optional[int]=None,
+                   timeout=180) -> ImportProfile:
+    """Run the transactions of an import one by one and measure them.
+
+    With ``send`` the transactions are really sent and their receipts tell the gas used.
+    This spends gas, use it only with a contract on a throwaway chain, like the in-process tester chain.
+
+    Without ``send`` the gas of each transaction is asked with ``eth_estimateGas``
+    and nothing is written. The estimates are made against the current state, so a
+    ``createInvoicingAddress`` of a company which does not exist yet does not include
+    adding the address to its company.
+
+    :param limit: Profile only this many rows
+    :raise ImportFailure: If a sent transaction failed or ran out of gas
+    """
+
+    web3 = contract.web3
+    sender = web3.eth.defaultAccount or web3.eth.coinbase
+    profile = ImportProfile()
+    started = time.time()
+
+    with count_requests(web3, profile.rpc_calls):
+
+        state = ImportState.load(contract)
+        step_gas = calibrate_step_gas(contract, sender)
+
+        for row_number, prepared in prepare_rows(fname, profile.invalid_rows, encoding, reference_operators):
+
+            if limit and row_number > limit:
+                break
+
+            steps = plan_steps(prepared, state)
+
+            profile.rows += 1
+            if not steps:
+                profile.skipped_rows += 1
+
+            for step in steps:
+                gas_limit, args = build_step(step, prepared, step_gas)
+                transaction = {"from": sender, "to": contract.address, "data": contract.encodeABI(step, args)}
+
+                if send:
+                    transaction["gas"] = gas_limit
+                    txid = web3.eth.sendTransaction(transaction)
+                    receipt = wait_for_transaction_receipt(web3, txid, timeout=timeout)
+                    gas = receipt["gasUsed"]
+                    # Before Byzantium a failed transaction has no status and uses all of its gas
+                    if receipt.get("status") == 0 or gas >= gas_limit:
+                        raise ImportFailure(row_number, prepared["vat_id"], prepared["address"], step, txid)
+                else:
+                    gas = web3.eth.estimateGas(transaction)
+
+                payload = args[-1] if step in PAYLOAD_STEPS else None
+                profile.record_step(step, gas, gas_limit, payload)
+
+    profile.duration = time.time() - started
+    return profile
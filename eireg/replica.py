@@ -0,0 +1,302 @@
+"""Local SQLite read replica of the registry, kept up to date from contract events."""
+
+import argparse
+import sqlite3
+import threading
+from typing import Callable, List, Optional, Set
+
+from populus import Project
+from web3.contract import Contract
+
+from eireg.client import RegistryClient
+from eireg.data import ContentType
+from eireg.backfill import EventBackfill
+
+
+#: Events which tell a record has changed. They carry only the key, the data is read with a call.
+COMPANY_EVENTS = ("CompanyCreated", "CompanyUpdated")
+ADDRESS_EVENTS = ("InvoicingAddressCreated", "InvoicingAddressUpdated")
+PREFERENCES_EVENTS = ("CompanyPreferencesUpdated",)
+OPERATOR_EVENTS = ("OperatorUpdated",)
+
+SYNCED_EVENTS = COMPANY_EVENTS + ADDRESS_EVENTS + PREFERENCES_EVENTS + OPERATOR_EVENTS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS companies (
+    vat_id TEXT PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS company_data (
+    vat_id TEXT NOT NULL,
+    content_type INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (vat_id, content_type)
+);
+
+CREATE TABLE IF NOT EXISTS addresses (
+    address TEXT PRIMARY KEY,
+    vat_id TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS addresses_by_vat_id ON addresses (vat_id);
+
+CREATE TABLE IF NOT EXISTS address_data (
+    address TEXT NOT NULL,
+    content_type INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (address, content_type)
+);
+
+CREATE TABLE IF NOT EXISTS preferences (
+    vat_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS operators (
+    operator_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+
+class RegistryReplica:
+    """Materialize registry state to a local SQLite database.
+
+    :meth:`sync` reads contract events since the last synced block and
+    refreshes every company, invoicing address and preference record they mention.
+    Each record is read from the contract once per synced chunk of blocks,
+    no matter how many events touched it, at the last block of the chunk.
+    Syncing old history therefore needs a node which keeps old state, like an archive node.
+    The last synced block is stored with the data, so the next run resumes where the previous one stopped.
+
+    The reads of a chunk are sent in JSON-RPC batches through :class:`RegistryClient`.
+
+    Query methods mirror the contract getters, but never touch the chain.
+    """
+
+    def __init__(self, contract: Contract, path=":memory:", start_block=0, client: Optional[RegistryClient]=None):
+        """
+        :param path: SQLite database file
+        :param start_block: Block where the contract was deployed, sync starts here on an empty database
+        :param client: :class:`RegistryClient` for the record reads, a new one is created if not given
+        """
+        self.contract = contract
+        self.client = client or RegistryClient(contract)
+        self.owns_client = client is None
+        self.start_block = start_block
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get_last_block(self) -> Optional[int]:
+        """Last block whose events are reflected in the database."""
+        row = self.db.execute("SELECT value FROM meta WHERE key='last_block'").fetchone()
+        return int(row[0]) if row else None
+
+    def sync(self, to_block: Optional[int]=None, chunk_size=1000, on_change: Optional[Callable[[Set[str]], None]]=None) -> int:
+        """Bring the replica up to date.
+
+        Event history is fetched in parallel by :class:`EventBackfill` and applied chunk by chunk in block order.
+
+        :param to_block: Sync until this block, defaults to the latest block
+        :param chunk_size: Blocks per first event requests, each chunk is one database transaction
+        :param on_change: Called with the VAT IDs of companies whose records changed, after each chunk is stored
+            and before the sync marker moves past it. If it raises, the chunk is applied again by the next sync.
+        :return: Last synced block
+        """
+
+        if to_block is None:
+            to_block = self.contract.web3.eth.blockNumber
+
+        last_block = self.get_last_block()
+        from_block = self.start_block if last_block is None else last_block + 1
+
+        backfill = EventBackfill(self.contract, SYNCED_EVENTS, chunk_size=chunk_size)
+        for chunk_end, events in backfill.iter_chunks(from_block, to_block):
+            self.apply_events(events, chunk_end, on_change)
+
+        return self.get_last_block()
+
+    def apply_events(self, events: List[dict], last_block: int, on_change: Optional[Callable[[Set[str]], None]]=None) -> Set[str]:
+        """Refresh all records touched by the events and move the sync marker.
+
+        The records are committed first and the marker only after ``on_change`` has returned,
+        so a consumer failing or crashing in between sees the chunk again. Records are read
+        at ``last_block``, which makes applying a chunk twice harmless.
+
+        :param last_block: Block the replica is synced to after these events
+        :param on_change: See :meth:`sync`
+        :return: VAT IDs of companies whose data, preferences or invoicing addresses changed
+        """
+
+        companies = set()
+        addresses = []
+        preferences = set()
+        operators = set()
+
+        for event in events:
+            name = event["event"]
+            if name in COMPANY_EVENTS:
+                companies.add(event["args"]["vatId"])
+            elif name in ADDRESS_EVENTS:
+                # Keep creation order, so that addresses list in the same order as on the chain
+                address = event["args"]["invoicingAddress"]
+                if address not in addresses:
+                    addresses.append(address)
+            elif name in PREFERENCES_EVENTS:
+                preferences.add(event["args"]["vatId"])
+            elif name in OPERATOR_EVENTS:
+                operators.add(event["args"]["operatorId"])
+
+        # Read the state at the marker block before taking the lock.
+        # Submit all reads first, so they go out in a few batches.
+        def submit(function_name, *args):
+            return self.client.submit(function_name, *args, block_identifier=last_block)
+
+        company_rows = []
+        for vat_id in companies:
+            for content_type in ContentType:
+                if content_type != ContentType.Undefined:
+                    company_rows.append((vat_id, content_type.value, submit("getBusinessInformation", vat_id, content_type.value)))
+
+        address_rows = []
+        address_data_rows = []
+        for address in addresses:
+            address_rows.append((address, submit("getVatIdByAddress", address)))
+            for content_type in ContentType:
+                if content_type != ContentType.Undefined:
+                    address_data_rows.append((address, content_type.value, submit("getAddressInformation", address, content_type.value)))
+
+        preference_rows = [(vat_id, submit("getCompanyPreferences", vat_id)) for vat_id in preferences]
+        operator_rows = [(operator_id, submit("getOperatorData", operator_id)) for operator_id in operators]
+
+        company_rows = [(vat_id, content_type, future.result()) for vat_id, content_type, future in company_rows]
+        address_rows = [(address, future.result()) for address, future in address_rows]
+        address_data_rows = [(address, content_type, future.result()) for address, content_type, future in address_data_rows]
+        preference_rows = [(vat_id, future.result()) for vat_id, future in preference_rows]
+        operator_rows = [(operator_id, future.result()) for operator_id, future in operator_rows]
+
+        changed = companies | preferences | {vat_id for address, vat_id in address_rows if vat_id}
+
+        with self.lock, self.db:
+            # An address moved to another company changes the old company too
+            for address, vat_id in address_rows:
+                row = self.db.execute("SELECT vat_id FROM addresses WHERE address=?", (address,)).fetchone()
+                if row:
+                    changed.add(row[0])
+
+            self.db.executemany("INSERT OR IGNORE INTO companies (vat_id) VALUES (?)", [(vat_id,) for vat_id in companies])
+            self.db.executemany("INSERT OR REPLACE INTO company_data (vat_id, content_type, data) VALUES (?, ?, ?)",
+                                [row for row in company_rows if row[2]])
+            # Data cleared on the chain reads as an empty string
+            self.db.executemany("DELETE FROM company_data WHERE vat_id=? AND content_type=?",
+                                [(vat_id, content_type) for vat_id, content_type, data in company_rows if not data])
+            # Update in place to keep the rowid, which gives the address order
+            self.db.executemany("UPDATE addresses SET vat_id=? WHERE address=?", [(vat_id, address) for address, vat_id in address_rows])
+            self.db.executemany("INSERT OR IGNORE INTO addresses (address, vat_id) VALUES (?, ?)", address_rows)
+            self.db.executemany("INSERT OR REPLACE INTO address_data (address, content_type, data) VALUES (?, ?, ?)",
+                                [row for row in address_data_rows if row[2]])
+            self.db.executemany("DELETE FROM address_data WHERE address=? AND content_type=?",
+                                [(address, content_type) for address, content_type, data in address_data_rows if not data])
+            self.db.executemany("INSERT OR REPLACE INTO preferences (vat_id, data) VALUES (?, ?)", preference_rows)
+            self.db.executemany("INSERT OR REPLACE INTO operators (operator_id, data) VALUES (?, ?)", operator_rows)
+
+        # Outside the lock, the consumer reads the replica
+        if on_change and changed:
+            on_change(changed)
+
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_block', ?)", (str(last_block),))
+
+        return changed
+
+    def close(self):
+        """Close the database, and the client unless it was given to us."""
+        if self.owns_client:
+            self.client.close()
+        self.db.close()
+
+    def query_value(self, sql: str, *params) -> str:
+        with self.lock:
+            row = self.db.execute(sql, params).fetchone()
+        return row[0] if row else ""
+
+    def has_company(self, vat_id: str) -> bool:
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM companies WHERE vat_id=?", (vat_id,)).fetchone() is not None
+
+    def get_vat_ids(self) -> List[str]:
+        """VAT IDs of all companies."""
+        with self.lock:
+            rows = self.db.execute("SELECT vat_id FROM companies ORDER BY vat_id").fetchall()
+        return [row[0] for row in rows]
+
+    def get_addresses(self) -> List[str]:
+        """All invoicing addresses."""
+        with self.lock:
+            rows = self.db.execute("SELECT address FROM addresses ORDER BY address").fetchall()
+        return [row[0] for row in rows]
+
+    def get_operator_ids(self) -> List[str]:
+        with self.lock:
+            rows = self.db.execute("SELECT operator_id FROM operators ORDER BY operator_id").fetchall()
+        return [row[0] for row in rows]
+
+    def get_vat_id_by_address(self, address: str) -> str:
+        """Return VAT ID for a given invoicing address or empty string."""
+        return self.query_value("SELECT vat_id FROM addresses WHERE address=?", address)
+
+    def get_business_information(self, vat_id: str, content_type: int) -> str:
+        return self.query_value("SELECT data FROM company_data WHERE vat_id=? AND content_type=?", vat_id, content_type)
+
+    def get_invoicing_addresses(self, vat_id: str) -> List[str]:
+        """All invoicing addresses of a company in the order they were created."""
+        with self.lock:
+            rows = self.db.execute("SELECT address FROM addresses WHERE vat_id=? ORDER BY rowid", (vat_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def get_address_information(self, address: str, content_type: int) -> str:
+        return self.query_value("SELECT data FROM address_data WHERE address=? AND content_type=?", address, content_type)
+
+    def get_company_preferences(self, vat_id: str) -> str:
+        return self.query_value("SELECT data FROM preferences WHERE vat_id=?", vat_id)
+
+    def get_operator_data(self, operator_id: str) -> str:
+        return self.query_value("SELECT data FROM operators WHERE operator_id=?", operator_id)
+
+
+def main():
+    """Entry point for syncing a local replica.
+
+    Wrapper script defined in setup.py
+    """
+
+    parser = argparse.ArgumentParser(description="Sync EInvoicingRegistry contract state to a local SQLite database")
+    parser.add_argument("database", help="SQLite database file, created if it does not exist")
+    parser.add_argument("chain_name", help="Populus chain name, e.g. local_test")
+    parser.add_argument("address", help="Address of the deployed EInvoicingRegistry contract")
+    parser.add_argument("--start-block", type=int, default=0, help="Block where the contract was deployed")
+    args = parser.parse_args()
+
+    project = Project()
+
+    with project.get_chain(args.chain_name) as chain:
+        EInvoicingRegistry = chain.get_contract_factory('EInvoicingRegistry')
+        contract = EInvoicingRegistry(address=args.address)
+
+        replica = RegistryReplica(contract, args.database, start_block=args.start_block)
+        last_block = replica.sync()
+        print("Synced up to block {}".format(last_block))
+        print("RPC stats", replica.client.get_stats())
+        replica.close()
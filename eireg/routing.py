@@ -0,0 +1,311 @@
+"""Resolve where to send an invoice from precomputed per-company routes."""
+
+import argparse
+import functools
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from populus import Project
+
+from eireg.data import ContentType, decode_company_preferences, decode_payload
+from eireg.poller import Poller
+from eireg.replica import RegistryReplica
+
+
+class Receiver:
+    """Invoicing address of a company which receives invoices."""
+
+    def __init__(self, address: str, receive_preferences: Iterable[str]):
+        self.address = address
+        self.receive_preferences = frozenset(receive_preferences)
+
+    def __repr__(self):
+        return "<Receiver {}>".format(self.address)
+
+
+class Route:
+    """Receiving invoicing addresses of one company, best first."""
+
+    def __init__(self, vat_id: str, receivers: List[Receiver]):
+        self.vat_id = vat_id
+        self.receivers = receivers
+
+        #: Receive preference, e.g. "tax" -> best address having it
+        self.by_preference = {}
+        for receiver in receivers:
+            for preference in receiver.receive_preferences:
+                self.by_preference.setdefault(preference, receiver.address)
+
+    def __repr__(self):
+        return "<Route {} receivers:{}>".format(self.vat_id, len(self.receivers))
+
+    def resolve(self, preference: Optional[str]=None) -> Optional[str]:
+        """Best receiving address, preferring one which lists the receive preference.
+
+        :return: None if the company receives no invoices
+        """
+        if preference and preference in self.by_preference:
+            return self.by_preference[preference]
+        return self.receivers[0].address if self.receivers else None
+
+    def to_json(self) -> dict:
+        return {
+            "vatId": self.vat_id,
+            "address": self.resolve(),
+            "receivers": [{"address": receiver.address, "receivePreferences": sorted(receiver.receive_preferences)} for receiver in self.receivers],
+        }
+
+
+def decode_stored(decode: Callable[[str], Optional[dict]], payload: str) -> Optional[dict]:
+    """Decode a payload read from the chain, None if it is not a valid record.
+
+    Anybody allowed to update a company may store any string, and one bad
+    record must not keep the routes of every other company from being computed.
+    """
+    try:
+        data = decode(payload)
+    except (ValueError, KeyError, IndexError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def get_address_preferences(preferences: dict) -> Dict[str, dict]:
+    """Per address flags of company preferences, keyed by invoicing address.
+
+    ``invoiceAddresses`` is a dict keyed by address, or in preferences written
+    by older clients a list of dicts each naming its ``address``. Entries of any
+    other shape are ignored.
+    """
+    entries = preferences.get("invoiceAddresses")
+
+    if isinstance(entries, dict):
+        return {address: flags for address, flags in entries.items() if isinstance(flags, dict)}
+
+    if isinstance(entries, list):
+        return {entry["address"]: entry for entry in entries if isinstance(entry, dict) and isinstance(entry.get("address"), str)}
+
+    return {}
+
+
+def compute_route(vat_id: str, addresses: List[str], address_data: Dict[str, Optional[dict]], preferences: Optional[dict]) -> Route:
+    """Rank the invoicing addresses of a company for receiving invoices.
+
+    Flags given for an address in company preferences override its ``TiekeAddressData``.
+    Only addresses which receive invoices are kept. The default address of the
+    preferences comes first, then addresses with permission to send, each group in creation order.
+
+    :param addresses: Invoicing addresses of the company in the order they were created
+    :param address_data: Address -> decoded ``TiekeAddressData``, None if not set
+    :param preferences: Decoded company preferences, None if not set
+    """
+
+    default_address = None
+    address_preferences = {}
+    if preferences:
+        default_address = preferences.get("defaultAddress")
+        address_preferences = get_address_preferences(preferences)
+
+    ranked = []
+    for index, address in enumerate(addresses):
+        flags = dict(address_data.get(address) or {})
+        flags.update(address_preferences.get(address, {}))
+        if not flags.get("receives"):
+            continue
+        rank = (address != default_address, not flags.get("permissionToSend"), index)
+        ranked.append((rank, Receiver(address, flags.get("receivePreferences", []))))
+
+    ranked.sort(key=lambda item: item[0])
+    return Route(vat_id, [receiver for rank, receiver in ranked])
+
+
+class RoutingTable:
+    """In-memory routes of every company, kept up to date from a :class:`RegistryReplica`.
+
+    Routes are computed once when the table is loaded. Lookups are a dictionary read
+    and never touch the database or the chain. :meth:`sync` brings the replica up to date
+    and recomputes only the routes of companies named by the new events.
+    A route is replaced as a whole, so readers never see a half updated one.
+
+    Usage::
+
+        table = RoutingTable(RegistryReplica(contract, "registry.sqlite"))
+        table.start()
+        address = table.resolve("FI24303727", preference="tax")
+
+    """
+
+    def __init__(self, replica: RegistryReplica, poll_interval=1.0):
+        """
+        :param poll_interval: Interval of the background :class:`Poller` running :meth:`sync`
+        """
+        self.replica = replica
+        self.poll_interval = poll_interval
+
+        #: VAT ID -> route
+        self.routes = {}
+
+        #: Serializes syncs, route reads take no lock
+        self.lock = threading.Lock()
+
+        #: Statistics only, a lookup lost to a race between HTTP server threads does not matter
+        self.lookups = 0
+        self.recomputed = 0
+
+        self.poller = Poller("RoutingTable sync", self.sync, poll_interval)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def load_route(self, vat_id: str) -> Route:
+        replica = self.replica
+        addresses = replica.get_invoicing_addresses(vat_id)
+        decode_address_data = functools.partial(decode_payload, ContentType.TiekeAddressData)
+        address_data = {address: decode_stored(decode_address_data,
+                                               replica.get_address_information(address, ContentType.TiekeAddressData.value))
+                        for address in addresses}
+        preferences = decode_stored(decode_company_preferences, replica.get_company_preferences(vat_id))
+        return compute_route(vat_id, addresses, address_data, preferences)
+
+    def refresh(self, vat_ids: Iterable[str]):
+        """Recompute the routes of companies."""
+        for vat_id in vat_ids:
+            self.routes[vat_id] = self.load_route(vat_id)
+            self.recomputed += 1
+
+    def load(self):
+        """Sync the replica and compute the routes of all companies."""
+        with self.lock:
+            self.replica.sync()
+            self.refresh(self.replica.get_vat_ids())
+
+    def sync(self):
+        """Apply new blocks, recomputing the routes of changed companies."""
+        with self.lock:
+            self.replica.sync(on_change=self.refresh)
+
+    def start(self):
+        """Load the table and follow new blocks in a background thread."""
+        self.load()
+        self.poller.start()
+
+    def stop(self):
+        self.poller.stop()
+
+    def get_route(self, vat_id: str) -> Optional[Route]:
+        self.lookups += 1
+        return self.routes.get(vat_id)
+
+    def resolve(self, vat_id: str, preference: Optional[str]=None) -> Optional[str]:
+        """Best receiving invoicing address of a company.
+
+        :param preference: Receive preference the invoice needs, e.g. "tax"
+        :return: None if the company is unknown or receives no invoices
+        """
+        route = self.get_route(vat_id)
+        return route.resolve(preference) if route else None
+
+    def get_stats(self) -> dict:
+        return {
+            "companies": len(self.routes),
+            "lookups": self.lookups,
+            "recomputed": self.recomputed,
+            "last_block": self.replica.get_last_block(),
+        }
+
+
+class RoutingRequestHandler(BaseHTTPRequestHandler):
+    """JSON API of a :class:`RoutingTable`.
+
+    ``GET /route/<VAT ID>?preference=tax`` returns the route of a company with its best address,
+    ``GET /stats`` the table statistics.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+
+        if parts == ["stats"]:
+            self.send_json(200, self.server.table.get_stats())
+            return
+
+        if len(parts) == 2 and parts[0] == "route":
+            route = self.server.table.get_route(parts[1])
+            if not route:
+                self.send_json(404, {"error": "Unknown company {}".format(parts[1])})
+                return
+
+            data = route.to_json()
+            preference = parse_qs(url.query).get("preference")
+            if preference:
+                data["address"] = route.resolve(preference[0])
+            self.send_json(200, data)
+            return
+
+        self.send_json(404, {"error": "Not found"})
+
+    def send_json(self, status: int, data: dict):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Lookups are the hot path, do not print a line for each
+        pass
+
+
+class RoutingServer(socketserver.ThreadingMixIn, HTTPServer):
+    """HTTP server answering route lookups from a :class:`RoutingTable`, a thread per connection."""
+
+    daemon_threads = True
+
+    def __init__(self, table: RoutingTable, host="localhost", port=8600):
+        HTTPServer.__init__(self, (host, port), RoutingRequestHandler)
+        self.table = table
+
+
+def main():
+    """Entry point for serving invoice routes over HTTP.
+
+    Wrapper script defined in setup.py
+    """
+
+    parser = argparse.ArgumentParser(description="Serve invoice routes of EInvoicingRegistry companies over HTTP")
+    parser.add_argument("database", help="SQLite replica database file, created if it does not exist")
+    parser.add_argument("chain_name", help="Populus chain name, e.g. local_test")
+    parser.add_argument("address", help="Address of the deployed EInvoicingRegistry contract")
+    parser.add_argument("--start-block", type=int, default=0, help="Block where the contract was deployed")
+    parser.add_argument("--host", default="localhost", help="Interface to listen")
+    parser.add_argument("--port", type=int, default=8600, help="Port to listen")
+    args = parser.parse_args()
+
+    project = Project()
+
+    with project.get_chain(args.chain_name) as chain:
+        EInvoicingRegistry = chain.get_contract_factory('EInvoicingRegistry')
+        contract = EInvoicingRegistry(address=args.address)
+
+        replica = RegistryReplica(contract, args.database, start_block=args.start_block)
+        started = time.time()
+        with RoutingTable(replica) as table:
+            print("Loaded {} routes in {:.1f} s".format(len(table.routes), time.time() - started))
+            server = RoutingServer(table, args.host, args.port)
+            print("Serving routes at http://{}:{}/route/<VAT ID>".format(args.host, args.port))
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.server_close()
+        replica.close()
@@ -0,0 +1,164 @@
+"""Schedule import jobs so that rows of one company never run concurrently."""
+
+import collections
+import concurrent.futures
+import threading
+from typing import Any, Callable, Optional
+
+
+def company_key(row: dict) -> str:
+    """Lane key of a Tieke CSV row."""
+    return row["Y-tunnus"].strip()
+
+
+class CompanyScheduler:
+    """Run jobs in parallel across companies, but one at a time and in order within a company.
+
+    Each company gets a lane. A row submitted while its company already has a job
+    running waits in the lane queue and starts when the previous row of the same
+    company has completed. Rows of different companies run in parallel on the executor.
+
+    This prevents two workers from both seeing a company missing and both
+    sending ``createCompany`` and ``setCompanyData``.
+
+    With ``max_pending`` set, :meth:`submit` blocks while that many rows are queued or running.
+    This pushes back on the CSV reader, so memory use does not depend on the file size.
+    """
+
+    def __init__(self,
+                 executor: concurrent.futures.Executor,
+                 job: Callable[[dict], Any],
+                 key: Callable[[dict], str]=company_key,
+                 on_done: Optional[Callable[[dict, concurrent.futures.Future], None]]=None,
+                 max_pending: Optional[int]=None):
+        """
+        :param job: Called with a row in a worker thread
+        :param key: Tells the lane of a row
+        :param on_done: Called with the row and its completed future
+        :param max_pending: How many submitted rows may wait or run at a time, unbounded if not given
+        """
+        self.executor = executor
+        self.job = job
+        self.key = key
+        self.on_done = on_done
+        self.max_pending = max_pending
+
+        self.lock = threading.Condition()
+
+        #: Active lanes: key -> queue of rows waiting for the running job
+        self.lanes = {}
+
+        #: Per-company progress of active lanes: key -> [done, total]
+        self.progress = {}
+
+        #: Rows queued or running
+        self.pending = 0
+
+        self.completed_companies = 0
+        self.completed_rows = 0
+        self.failed_rows = 0
+        self.first_error = None
+
+    def submit(self, row: dict):
+        """Queue a row to its company lane.
+
+        Blocks while ``max_pending`` rows are already waiting or running.
+        """
+
+        key = self.key(row)
+
+        with self.lock:
+            while self.max_pending and self.pending >= self.max_pending:
+                self.lock.wait()
+
+            self.pending += 1
+            self.progress.setdefault(key, [0, 0])[1] += 1
+
+            if key in self.lanes:
+                self.lanes[key].append(row)
+                return
+
+            self.lanes[key] = collections.deque()
+
+        self.start(key, row)
+
+    def set_max_pending(self, max_pending: Optional[int]):
+        """Change how many rows may wait or run, e.g. by :class:`eireg.concurrency.ConcurrencyController`.
+
+        Lowering the limit does not cancel anything, :meth:`submit` just blocks until enough rows complete.
+        """
+        with self.lock:
+            self.max_pending = max_pending
+            self.lock.notify_all()
+
+    def start(self, key: str, row: dict):
+        future = self.executor.submit(self.job, row)
+        future.add_done_callback(lambda future: self.complete(key, row, future))
+
+    def complete(self, key: str, row: dict, future: concurrent.futures.Future):
+        """A job finished, start the next row of the same company."""
+
+        try:
+            if self.on_done:
+                self.on_done(row, future)
+        finally:
+            self.advance(key, future)
+
+    def advance(self, key: str, future: concurrent.futures.Future):
+        """Count a finished job and start the next row of its lane.
+
+        Runs even if ``on_done`` raised, so that the lane and :meth:`wait` never hang.
+        """
+
+        with self.lock:
+            self.pending -= 1
+            self.completed_rows += 1
+            if future.exception():
+                self.failed_rows += 1
+                self.first_error = self.first_error or future.exception()
+
+            progress = self.progress[key]
+            progress[0] += 1
+
+            queue = self.lanes[key]
+            if queue:
+                next_row = queue.popleft()
+            else:
+                next_row = None
+                del self.lanes[key]
+                del self.progress[key]
+                self.completed_companies += 1
+
+            # Wake up both submit() waiting for room and wait()
+            self.lock.notify_all()
+
+        if next_row is not None:
+            self.start(key, next_row)
+        else:
+            print("Company {} done, {} rows".format(key, progress[0]))
+
+    def get_progress(self) -> dict:
+        """Report progress of active companies and totals.
+
+        :return: dict with ``companies`` mapping active company key to (done, total) rows
+        """
+        with self.lock:
+            return {
+                "companies": {key: tuple(progress) for key, progress in self.progress.items()},
+                "completed_companies": self.completed_companies,
+                "completed_rows": self.completed_rows,
+                "failed_rows": self.failed_rows,
+                "pending_rows": self.pending,
+            }
+
+    def wait(self):
+        """Block until all lanes are empty.
+
+        Raises the first job exception, if any.
+        """
+        with self.lock:
+            while self.lanes:
+                self.lock.wait()
+
+        if self.first_error:
+            raise self.first_error
@@ -0,0 +1,51 @@
+"""Sign import transactions locally with keys of several accounts."""
+
+import json
+import os
+from typing import List
+
+import rlp
+from ethereum.keys import decode_keystore_json
+from ethereum.transactions import Transaction
+from ethereum.utils import decode_hex, encode_hex, privtoaddr
+
+
+class LocalAccount:
+    """Account whose private key we hold, so the node does not need to unlock or sign anything."""
+
+    def __init__(self, private_key: bytes):
+        self.private_key = private_key
+        self.address = "0x" + encode_hex(privtoaddr(private_key))
+
+    def __repr__(self):
+        return "<LocalAccount {}>".format(self.address)
+
+    def sign_transaction(self, nonce: int, gas_price: int, gas: int, to: str, data: str, value=0) -> str:
+        """Build a signed raw transaction for ``eth_sendRawTransaction``.
+
+        :param to: Contract address as hex
+        :param data: ABI encoded call as hex
+        :return: RLP encoded transaction as hex
+        """
+        tx = Transaction(nonce, gas_price, gas, decode_hex(to[2:]), value, decode_hex(data[2:]))
+        tx.sign(self.private_key)
+        return "0x" + encode_hex(rlp.encode(tx))
+
+
+def load_keyfile(path: str, password: str) -> LocalAccount:
+    """Decrypt a geth keystore file."""
+    with open(path, "rt") as inp:
+        keystore = json.load(inp)
+    return LocalAccount(decode_keystore_json(keystore, password))
+
+
+def load_keyfiles(directory: str, password: str) -> List[LocalAccount]:
+    """Decrypt all keystore files of a directory, e.g. ``keyfiles/``.
+
+    All files must share the same password.
+    """
+    return [
+        load_keyfile(os.path.join(directory, fname), password)
+        for fname in sorted(os.listdir(directory))
+        if fname.startswith("UTC--")
+    ]
@@ -0,0 +1,286 @@
+"""Memory-mapped registry snapshot, for readers which start without scanning the chain."""
+
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+from typing import Iterable, List, Optional
+
+from populus import Project
+
+from eireg.data import RECORD_CONTENT_TYPES
+from eireg.replica import RegistryReplica
+
+
+MAGIC = b"EIRSNAP1"
+
+VERSION = 1
+
+#: Magic, format version, block the snapshot was taken at,
+#: then (index offset, index slots, records) of the company, address and operator tables
+HEADER = struct.Struct("<8sIQ9Q")
+
+#: Hash index slot: key hash, record offset. Offset 0 marks an empty slot, as the header is there.
+SLOT = struct.Struct("<QQ")
+
+#: Field count of a record, and length of each field
+COUNT = struct.Struct("<I")
+
+#: Tables in the order of the header
+TABLES = ("companies", "addresses", "operators")
+
+
+def hash_key(key: bytes) -> int:
+    """64-bit hash of a record key, stable across processes unlike hash()."""
+    return struct.unpack("<Q", hashlib.md5(key).digest()[:8])[0]
+
+
+def encode_record(fields: List[str]) -> bytes:
+    parts = [COUNT.pack(len(fields))]
+    for field in fields:
+        data = field.encode("utf-8")
+        parts.append(COUNT.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def write_snapshot(path: str, block_number: int, companies: Iterable[List[str]], addresses: Iterable[List[str]], operators: Iterable[List[str]]):
+    """Write a snapshot file.
+
+    Each record is a list of strings whose first one is the key. Records are written sorted by their key,
+    each table followed by its open addressing hash index. The file is written next to the target and moved
+    in place, so readers never map a half written snapshot.
+
+    :param companies: VAT ID, company data of each of :data:`RECORD_CONTENT_TYPES`, preferences, invoicing addresses
+    :param addresses: Invoicing address, VAT ID, address data of each of :data:`RECORD_CONTENT_TYPES`
+    :param operators: Operator ID, operator data
+    """
+
+    temp = path + ".tmp"
+    header = []
+
+    with open(temp, "wb") as out:
+        out.write(b"\0" * HEADER.size)
+        offset = HEADER.size
+
+        for records in (companies, addresses, operators):
+            records = sorted(records, key=lambda record: record[0])
+
+            slot_count = 1
+            while slot_count < len(records) * 2:
+                slot_count *= 2
+            slots = [(0, 0)] * slot_count
+
+            for record in records:
+                key = record[0].encode("utf-8")
+                key_hash = hash_key(key)
+                slot = key_hash & (slot_count - 1)
+                while slots[slot][1]:
+                    slot = (slot + 1) & (slot_count - 1)
+                slots[slot] = (key_hash, offset)
+
+                data = encode_record(record)
+                out.write(data)
+                offset += len(data)
+
+            out.write(b"".join(SLOT.pack(*slot) for slot in slots))
+            header += [offset, slot_count, len(records)]
+            offset += SLOT.size * slot_count
+
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, block_number, *header))
+
+    os.replace(temp, path)
+
+
+def export_snapshot(replica: RegistryReplica, path: str) -> int:
+    """Write the state of a synced replica as a snapshot.
+
+    :return: Block the snapshot was taken at
+    """
+
+    block_number = replica.get_last_block()
+    assert block_number is not None, "Replica has not been synced"
+
+    companies = []
+    for vat_id in replica.get_vat_ids():
+        companies.append([vat_id] +
+                         [replica.get_business_information(vat_id, content_type.value) for content_type in RECORD_CONTENT_TYPES] +
+                         [replica.get_company_preferences(vat_id)] +
+                         replica.get_invoicing_addresses(vat_id))
+
+    addresses = []
+    for address in replica.get_addresses():
+        addresses.append([address, replica.get_vat_id_by_address(address)] +
+                         [replica.get_address_information(address, content_type.value) for content_type in RECORD_CONTENT_TYPES])
+
+    operators = [[operator_id, replica.get_operator_data(operator_id)] for operator_id in replica.get_operator_ids()]
+
+    write_snapshot(path, block_number, companies, addresses, operators)
+    return block_number
+
+
+class SnapshotError(Exception):
+    """The file is not a snapshot this version can read."""
+
+
+class RegistrySnapshot:
+    """Look up registry records straight from a memory-mapped snapshot file.
+
+    Opening reads only the header. A lookup hashes the key, probes the index and
+    decodes just the fields it returns. The pages are shared by all processes
+    mapping the same file, so many workers cost the memory of one.
+
+    Query methods are those of :class:`eireg.replica.RegistryReplica`.
+
+    Usage::
+
+        snapshot = RegistrySnapshot("registry.snapshot")
+        vat_id = snapshot.get_vat_id_by_address("OVT:3724303727")
+
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as inp:
+            if os.fstat(inp.fileno()).st_size < HEADER.size:
+                raise SnapshotError("{} is not a registry snapshot".format(path))
+            self.map = mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+
+        magic, version, self.block_number, *tables = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError("{} is not a version {} registry snapshot".format(path, VERSION))
+
+        #: Table name -> (index offset, slots, records)
+        self.tables = {name: tuple(tables[i * 3:i * 3 + 3]) for i, name in enumerate(TABLES)}
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get_last_block(self) -> int:
+        """Block the snapshot was taken at."""
+        return self.block_number
+
+    def get_count(self, table: str) -> int:
+        return self.tables[table][2]
+
+    def read_field(self, offset: int) -> tuple:
+        """:return: (field bytes as a memoryview, offset of the next field)"""
+        length, = COUNT.unpack_from(self.map, offset)
+        start = offset + COUNT.size
+        return self.view[start:start + length], start + length
+
+    def find(self, table: str, key: str) -> Optional[int]:
+        """Offset of the record of a key, None if there is none."""
+
+        index_offset, slot_count, record_count = self.tables[table]
+        if not record_count:
+            return None
+
+        key = key.encode("utf-8")
+        key_hash = hash_key(key)
+        slot = key_hash & (slot_count - 1)
+
+        while True:
+            slot_hash, offset = SLOT.unpack_from(self.map, index_offset + slot * SLOT.size)
+            if not offset:
+                return None
+            if slot_hash == key_hash and self.read_field(offset + COUNT.size)[0] == key:
+                return offset
+            slot = (slot + 1) & (slot_count - 1)
+
+    def get_fields(self, table: str, key: str, start=0, stop: Optional[int]=None) -> Optional[List[str]]:
+        """Decode fields of a record, skipping the ones before ``start``.
+
+        :return: None if the key is not in the table
+        """
+
+        offset = self.find(table, key)
+        if offset is None:
+            return None
+
+        count, = COUNT.unpack_from(self.map, offset)
+        stop = count if stop is None else min(stop, count)
+        offset += COUNT.size
+
+        fields = []
+        for index in range(stop):
+            if index < start:
+                length, = COUNT.unpack_from(self.map, offset)
+                offset += COUNT.size + length
+            else:
+                field, offset = self.read_field(offset)
+                fields.append(bytes(field).decode("utf-8"))
+        return fields
+
+    def get_field(self, table: str, key: str, index: int) -> str:
+        fields = self.get_fields(table, key, index, index + 1)
+        return fields[0] if fields else ""
+
+    def has_company(self, vat_id: str) -> bool:
+        return self.find("companies", vat_id) is not None
+
+    def get_vat_id_by_address(self, address: str) -> str:
+        """Return VAT ID for a given invoicing address or empty string."""
+        return self.get_field("addresses", address, 1)
+
+    def get_business_information(self, vat_id: str, content_type: int) -> str:
+        if not 0 < content_type <= len(RECORD_CONTENT_TYPES):
+            return ""
+        return self.get_field("companies", vat_id, content_type)
+
+    def get_company_preferences(self, vat_id: str) -> str:
+        return self.get_field("companies", vat_id, len(RECORD_CONTENT_TYPES) + 1)
+
+    def get_invoicing_addresses(self, vat_id: str) -> List[str]:
+        """All invoicing addresses of a company in the order they were created."""
+        return self.get_fields("companies", vat_id, len(RECORD_CONTENT_TYPES) + 2) or []
+
+    def get_address_information(self, address: str, content_type: int) -> str:
+        if not 0 < content_type <= len(RECORD_CONTENT_TYPES):
+            return ""
+        return self.get_field("addresses", address, content_type + 1)
+
+    def get_operator_data(self, operator_id: str) -> str:
+        return self.get_field("operators", operator_id, 1)
+
+
+def main():
+    """Entry point for exporting a registry snapshot.
+
+    Wrapper script defined in setup.py
+    """
+
+    parser = argparse.ArgumentParser(description="Export EInvoicingRegistry contract state to a memory-mapped snapshot file")
+    parser.add_argument("database", help="SQLite replica database file, created if it does not exist")
+    parser.add_argument("chain_name", help="Populus chain name, e.g. local_test")
+    parser.add_argument("address", help="Address of the deployed EInvoicingRegistry contract")
+    parser.add_argument("output", help="Snapshot file to write")
+    parser.add_argument("--block", type=int, default=None, help="Refuse to export unless the chain head is at this block")
+    parser.add_argument("--start-block", type=int, default=0, help="Block where the contract was deployed")
+    args = parser.parse_args()
+
+    project = Project()
+
+    with project.get_chain(args.chain_name) as chain:
+        EInvoicingRegistry = chain.get_contract_factory('EInvoicingRegistry')
+        contract = EInvoicingRegistry(address=args.address)
+
+        # Replica records are read from the latest state, an older block cannot be reproduced
+        head = contract.web3.eth.blockNumber
+        if args.block is not None and args.block != head:
+            raise SystemExit("Chain head is at block {}, not {}. Snapshots can only be taken at the head.".format(head, args.block))
+
+        with RegistryReplica(contract, args.database, start_block=args.start_block) as replica:
+            replica.sync(to_block=head)
+            block_number = export_snapshot(replica, args.output)
+
+        print("Wrote snapshot of block {} to {}, {} bytes".format(block_number, args.output, os.path.getsize(args.output)))
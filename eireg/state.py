@@ -0,0 +1,139 @@
+"""In-memory view of which companies and invoicing addresses already exist in the registry."""
+
+import threading
+import time
+from typing import Optional
+
+from web3.contract import Contract
+
+from eireg.backfill import EventBackfill
+from eireg.confirmer import ConfirmationTimeout
+
+
+class ImportState:
+    """Existing VAT IDs and invoicing addresses for the importer.
+
+    Loaded in bulk from ``CompanyCreated`` and ``InvoicingAddressCreated`` events once,
+    so that the importer does not need ``hasCompany`` and ``getVatIdByAddress`` calls per row.
+
+    Import workers *claim* a record before sending the transaction creating it,
+    so no other worker creates it again. When the transaction lands the claim
+    is confirmed, and if it fails the claim is released so that the record can be retried.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+        #: Notified when a claim is confirmed or released
+        self.settled = threading.Condition(self.lock)
+
+        #: Records known to be on the chain
+        self.companies = set()
+        self.addresses = set()
+
+        #: Records our in-flight transactions are creating
+        self.claimed_companies = set()
+        self.claimed_addresses = set()
+
+        #: Block until which events have been read
+        self.last_block = None
+
+    @classmethod
+    def load(cls, contract: Contract, from_block=0, to_block: Optional[int]=None, chunk_size=5000) -> "ImportState":
+        """Read all existing companies and invoicing addresses from contract events.
+
+        :param from_block: Block where the contract was deployed
+        :param chunk_size: Blocks per first event requests, see :class:`EventBackfill`
+        """
+        state = cls()
+
+        if to_block is None:
+            to_block = contract.web3.eth.blockNumber
+
+        backfill = EventBackfill(contract, ["CompanyCreated", "InvoicingAddressCreated"], chunk_size=chunk_size)
+        for event in backfill.iter_events(from_block, to_block):
+            if event["event"] == "CompanyCreated":
+                state.companies.add(event["args"]["vatId"])
+            else:
+                state.addresses.add(event["args"]["invoicingAddress"])
+
+        state.last_block = to_block
+        return state
+
+    def has_company(self, vat_id: str) -> bool:
+        """Company exists or is being created."""
+        with self.lock:
+            return vat_id in self.companies or vat_id in self.claimed_companies
+
+    def has_address(self, address: str) -> bool:
+        """Invoicing address exists or is being created."""
+        with self.lock:
+            return address in self.addresses or address in self.claimed_addresses
+
+    def claim_company(self, vat_id: str) -> bool:
+        """Reserve the creation of a company.
+
+        :return: True if the caller should create the company, False if it exists or somebody else is creating it
+        """
+        with self.lock:
+            if vat_id in self.companies or vat_id in self.claimed_companies:
+                return False
+            self.claimed_companies.add(vat_id)
+            return True
+
+    def claim_company_or_wait(self, vat_id: str, timeout: float) -> bool:
+        """Reserve the creation of a company, or wait until another worker's claim of it is settled.
+
+        An invoicing address must not be created before its company has landed,
+        or the contract does not list the address under the company.
+
+        :return: True if the caller should create the company, False if it exists
+        :raise ConfirmationTimeout: If the other worker's transaction did not settle in time
+        """
+        deadline = time.time() + timeout
+        with self.settled:
+            while vat_id in self.claimed_companies:
+                left = deadline - time.time()
+                if left <= 0:
+                    raise ConfirmationTimeout("Company {} was not created by another worker in time".format(vat_id))
+                self.settled.wait(left)
+
+            if vat_id in self.companies:
+                return False
+            self.claimed_companies.add(vat_id)
+            return True
+
+    def claim_address(self, address: str) -> bool:
+        """Reserve the creation of an invoicing address.
+
+        :return: True if the caller should create the address
+        """
+        with self.lock:
+            if address in self.addresses or address in self.claimed_addresses:
+                return False
+            self.claimed_addresses.add(address)
+            return True
+
+    def confirm_company(self, vat_id: str):
+        """Transaction creating the company landed."""
+        with self.lock:
+            self.claimed_companies.discard(vat_id)
+            self.companies.add(vat_id)
+            self.settled.notify_all()
+
+    def confirm_address(self, address: str):
+        """Transaction creating the invoicing address landed."""
+        with self.lock:
+            self.claimed_addresses.discard(address)
+            self.addresses.add(address)
+
+    def release_company(self, vat_id: str):
+        """Transaction creating the company failed."""
+        with self.lock:
+            self.claimed_companies.discard(vat_id)
+            self.settled.notify_all()
+
+    def release_address(self, address: str):
+        """Transaction creating the invoicing address failed."""
+        with self.lock:
+            self.claimed_addresses.discard(address)
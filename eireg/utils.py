@@ -2,17 +2,33 @@ def string_to_bytes32(str):
     """Convert OVT formatted invoicing address to internal bytes32 format.
 
     Right pad addresses with zero.
+
+    :raise ValueError: If the key is not ASCII or does not fit in 32 bytes
+    """
+    try:
+        b = str.encode("ascii")
+    except UnicodeEncodeError:
+        raise ValueError("Registry key {!r} is not ASCII".format(str))
+    if len(b) > 32:
+        raise ValueError("Registry key {!r} is longer than 32 bytes".format(str))
+    return b + b'\0' * (32 - len(b))
+
+
+def bytes32_to_string(b):
+    """Convert internal bytes32 format back to a string.
+
+    Zero padding is dropped, so an unset key gives an empty string.
     """
-    b = str.encode("ascii")
-    assert len(b) < 32
-    b += b'\0' * (32 - len(b))
-    assert len(b) == 32
-    return b
+    return b.rstrip(b'\0').decode("ascii")
 
 
 def ytunnus_to_vat_id(str):
-    """Convert Y-Tunnus to international format."""
-    assert str[-2] == "-"
+    """Convert Y-Tunnus to international format.
+
+    See :func:`eireg.validation.normalize_ytunnus` for checking it.
+    """
+    if len(str) < 3 or str[-2] != "-":
+        raise ValueError("Malformed Y-tunnus {!r}".format(str))
     return "FI" + str[0:-2] + str[-1]
 
 
@@ -30,7 +46,11 @@ def normalize_invoicing_address(str) -> str:
         "IBAN": "IBAN",
     }
 
-    address, spec = str.split(" ")
+    parts = str.split(" ")
+    if len(parts) != 2 or parts[1] not in mappings:
+        raise ValueError("Unknown invoicing address format {!r}".format(str))
+
+    address, spec = parts
 
     if spec == "OVT-tunnus":
         address = address.lstrip("0")  # Dunno?
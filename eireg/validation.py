@@ -0,0 +1,299 @@
+"""Validate and normalize a Tieke CSV export before importing it."""
+
+import argparse
+import concurrent.futures
+import csv
+import itertools
+import os
+import re
+import sys
+from typing import Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from eireg.data import pack_flags, unpack_flags
+from eireg.utils import normalize_invoicing_address, ytunnus_to_vat_id
+
+
+#: First line of a validated file, :func:`eireg.importer.read_csv` reads such files directly
+VALIDATED_MAGIC = "#eireg-validated 2"
+
+#: Row number in the original export, kept in validated files and rejects
+ROW_NUMBER_COLUMN = "row"
+
+#: Tieke columns kept in a validated file, the rest are not imported
+VALIDATED_COLUMNS = ["Y-tunnus", "Yrityksen nimi", "Vastaanotto-osoite", "OVT-tunnus", "Operaattori", "Välittäjän tunnus"]
+
+#: Yes/no columns, packed as bits of one number in the ``flags`` column of a validated file
+FLAG_COLUMNS = ["Lähetyslupa", "Lähettää", "Vastaanottaa"]
+
+YES = "Kyllä"
+NO = "Ei"
+
+#: Weights of the Y-tunnus check digit, mod 11
+YTUNNUS_WEIGHTS = (7, 9, 10, 5, 8, 4, 2)
+
+YTUNNUS_RE = re.compile(r"^(\d{6,7})-(\d)$")
+IBAN_RE = re.compile(r"^([A-Z]{2})(\d{2})([A-Z0-9]{11,30})$")
+
+#: OVT: 0037, Y-tunnus digits with the check digit and an optional suffix
+OVT_RE = re.compile(r"^(?:00)?37(\d{8})([0-9A-Z]{0,5})$")
+
+#: Length of IBANs of countries we meet in the registry
+IBAN_LENGTHS = {"FI": 18, "SE": 24, "EE": 20, "DE": 22, "NO": 15, "DK": 18}
+
+
+class ValidationError(Exception):
+    """A row cannot be imported. The message tells why."""
+
+
+def ytunnus_check_digit(digits: str) -> Optional[int]:
+    """Check digit of the seven first Y-tunnus digits, None if no check digit makes them valid."""
+    remainder = sum(int(digit) * weight for digit, weight in zip(digits, YTUNNUS_WEIGHTS)) % 11
+    if remainder == 1:
+        return None
+    return 0 if remainder == 0 else 11 - remainder
+
+
+def normalize_ytunnus(value: str) -> str:
+    """Check a Y-tunnus and give it without surrounding whitespace, in the form ``1234567-8``.
+
+    Old six digit identifiers are checked as zero padded, but keep their digits,
+    as the VAT ID of the company is already stored without the padding.
+
+    :raise ValidationError: If the format or the check digit is wrong
+    """
+    match = YTUNNUS_RE.match(value.strip())
+    if not match:
+        raise ValidationError("Malformed Y-tunnus {!r}".format(value))
+
+    if ytunnus_check_digit(match.group(1).zfill(7)) != int(match.group(2)):
+        raise ValidationError("Y-tunnus {} has a wrong check digit".format(value))
+
+    return match.group(1) + "-" + match.group(2)
+
+
+def normalize_iban(value: str) -> str:
+    """Check an IBAN and give it without spaces, in upper case.
+
+    :raise ValidationError: If the format, length or the mod 97 checksum is wrong
+    """
+    iban = value.replace(" ", "").upper()
+    match = IBAN_RE.match(iban)
+    if not match:
+        raise ValidationError("Malformed IBAN {!r}".format(value))
+
+    expected = IBAN_LENGTHS.get(match.group(1))
+    if expected and len(iban) != expected:
+        raise ValidationError("IBAN {} should have {} characters".format(value, expected))
+
+    # Move the country and the check digits to the end and read letters as numbers, A=10 ... Z=35
+    number = "".join(str(int(char, 36)) for char in iban[4:] + iban[:4])
+    if int(number) % 97 != 1:
+        raise ValidationError("IBAN {} has a wrong checksum".format(value))
+
+    return iban
+
+
+def check_ovt(value: str):
+    """Check an OVT identifier, with or without its leading zeros.
+
+    :raise ValidationError: If the format or the check digit of the Y-tunnus in it is wrong
+    """
+    match = OVT_RE.match(value)
+    if not match:
+        raise ValidationError("Malformed OVT {!r}".format(value))
+
+    digits = match.group(1)
+    if ytunnus_check_digit(digits[:7]) != int(digits[7]):
+        raise ValidationError("OVT {} has a wrong Y-tunnus check digit".format(value))
+
+
+def normalize_flag(row: dict, column: str) -> str:
+    value = (row.get(column) or "").strip()
+    if value not in (YES, NO, ""):
+        raise ValidationError("{} should be {} or {}, not {!r}".format(column, YES, NO, value))
+    return YES if value == YES else NO
+
+
+def check_key(key: str, name: str):
+    """Registry keys are stored as ``bytes32``, see :func:`eireg.utils.string_to_bytes32`."""
+    try:
+        data = key.encode("ascii")
+    except UnicodeEncodeError:
+        raise ValidationError("{} {!r} is not ASCII".format(name, key))
+    if len(data) > 32:
+        raise ValidationError("{} {} is too long for a registry key".format(name, key))
+
+
+def validate_row(row: dict) -> dict:
+    """Validate one Tieke CSV row and normalize the columns we import.
+
+    The normalized row gives the same VAT ID and invoicing address with
+    :func:`eireg.importer.prepare_invoicing_address` as the original one,
+    except for IBANs, which are upper cased without spaces.
+
+    :return: Row with :data:`VALIDATED_COLUMNS` and :data:`FLAG_COLUMNS`
+    :raise ValidationError: If the row cannot be imported
+    """
+
+    normalized = {column: (row.get(column) or "").strip() for column in VALIDATED_COLUMNS}
+
+    normalized["Y-tunnus"] = normalize_ytunnus(normalized["Y-tunnus"])
+
+    address = normalized["Vastaanotto-osoite"]
+    if address:
+        parts = address.split()
+        if len(parts) != 2:
+            raise ValidationError("Malformed invoicing address {!r}".format(address))
+        number, spec = parts
+        if spec == "IBAN":
+            number = normalize_iban(number)
+        elif spec == "OVT-tunnus":
+            check_ovt(number)
+        else:
+            raise ValidationError("Unknown invoicing address type {!r}".format(spec))
+        normalized["Vastaanotto-osoite"] = number + " " + spec
+        invoicing_address = normalize_invoicing_address(normalized["Vastaanotto-osoite"])
+    elif normalized["OVT-tunnus"]:
+        check_ovt(normalized["OVT-tunnus"])
+        invoicing_address = "OVT:" + normalized["OVT-tunnus"]
+    else:
+        raise ValidationError("Invoicing address and OVT-tunnus are both missing")
+
+    check_key(ytunnus_to_vat_id(normalized["Y-tunnus"]), "VAT ID")
+    check_key(invoicing_address, "Invoicing address")
+
+    for column in FLAG_COLUMNS:
+        normalized[column] = normalize_flag(row, column)
+
+    return normalized
+
+
+def validate_chunk(start: int, rows: List[dict]) -> Tuple[List[Tuple[int, dict]], List[Tuple[int, str, dict]]]:
+    """Validate rows in a worker process.
+
+    :param start: CSV row number of the first row
+    :return: (normalized rows as (row number, row), rejects as (row number, reason, original row))
+    """
+    valid = []
+    rejects = []
+    for row_number, row in enumerate(rows, start=start):
+        try:
+            valid.append((row_number, validate_row(row)))
+        except ValidationError as e:
+            rejects.append((row_number, str(e), row))
+    return valid, rejects
+
+
+def iter_chunks(rows: Iterable[dict], chunk_size: int) -> Iterator[Tuple[int, List[dict]]]:
+    rows = iter(rows)
+    start = 1
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def write_validated_row(writer, row_number: int, row: dict):
+    flags = pack_flags({column: row[column] == YES for column in FLAG_COLUMNS}, FLAG_COLUMNS)
+    writer.writerow([row_number] + [row[column] for column in VALIDATED_COLUMNS] + [flags])
+
+
+def read_validated_rows(inp: TextIO) -> Iterator[dict]:
+    """Read rows of a validated file, positioned after its magic line, as Tieke CSV rows.
+
+    Each row also has its number in the original export in :data:`ROW_NUMBER_COLUMN`.
+    """
+    reader = csv.reader(inp, delimiter="\t")
+    header = next(reader)
+    assert header == [ROW_NUMBER_COLUMN] + VALIDATED_COLUMNS + ["flags"], "Unknown validated file columns {}".format(header)
+
+    for values in reader:
+        row = dict(zip(VALIDATED_COLUMNS, values[1:]))
+        row[ROW_NUMBER_COLUMN] = int(values[0])
+        flags = unpack_flags(values[-1], FLAG_COLUMNS)
+        for column in FLAG_COLUMNS:
+            row[column] = YES if flags[column] else NO
+        yield row
+
+
+def validate_csv(fname: str, output: str, rejects_path: str, workers: Optional[int]=None, chunk_size=10000) -> dict:
+    """Validate a whole Tieke CSV export in worker processes.
+
+    Valid rows are written to ``output`` in their original order, as a tab separated file
+    with their row number, only the imported columns and the yes/no columns packed into one number.
+    Rejected rows go to ``rejects_path`` as CSV with their row number and the reason.
+    Rows are numbered from 1, like the import modes number them, and importing the validated
+    file reports failures with the numbers of the original export.
+
+    :param workers: Worker processes, defaults to the CPU count
+    :param chunk_size: Rows a worker validates at a time
+    :return: Row counts
+    """
+
+    workers = workers or os.cpu_count() or 1
+    stats = {"rows": 0, "valid": 0, "rejected": 0}
+    temp = output + ".tmp"
+
+    with open(fname) as inp, open(temp, "wt", newline="") as out, open(rejects_path, "wt", newline="") as rejects_out, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+
+        reader = csv.DictReader(inp)
+
+        out.write(VALIDATED_MAGIC + "\n")
+        writer = csv.writer(out, delimiter="\t", lineterminator="\n")
+        writer.writerow([ROW_NUMBER_COLUMN] + VALIDATED_COLUMNS + ["flags"])
+
+        rejects_writer = csv.DictWriter(rejects_out, [ROW_NUMBER_COLUMN, "reason"] + reader.fieldnames, extrasaction="ignore")
+        rejects_writer.writeheader()
+
+        chunks = iter_chunks(reader, chunk_size)
+
+        # Keep a few chunks per worker queued instead of reading the whole file in memory
+        pending = [executor.submit(validate_chunk, start, rows) for start, rows in itertools.islice(chunks, workers * 2)]
+
+        while pending:
+            valid, rejects = pending.pop(0).result()
+            for start, rows in itertools.islice(chunks, 1):
+                pending.append(executor.submit(validate_chunk, start, rows))
+
+            for row_number, row in valid:
+                write_validated_row(writer, row_number, row)
+
+            for row_number, reason, row in rejects:
+                print("Row {}: {}".format(row_number, reason))
+                rejects_writer.writerow(dict(row, **{ROW_NUMBER_COLUMN: row_number, "reason": reason}))
+
+            stats["rows"] += len(valid) + len(rejects)
+            stats["valid"] += len(valid)
+            stats["rejected"] += len(rejects)
+
+    os.replace(temp, output)
+    return stats
+
+
+def main():
+    """Entry point for validating a Tieke CSV export before import.
+
+    Wrapper script defined in setup.py
+    """
+
+    parser = argparse.ArgumentParser(description="Validate and normalize a Tieke CSV export, writing a file import-tieke-csv reads directly")
+    parser.add_argument("fname", help="Tieke CSV export file")
+    parser.add_argument("--output", help="Validated file, defaults to <fname>.validated")
+    parser.add_argument("--rejects", help="CSV of rejected rows and reasons, defaults to <fname>.rejects.csv")
+    parser.add_argument("--workers", type=int, help="Worker processes, defaults to the CPU count")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows a worker validates at a time")
+    args = parser.parse_args()
+
+    output = args.output or args.fname + ".validated"
+    rejects = args.rejects or args.fname + ".rejects.csv"
+
+    stats = validate_csv(args.fname, output, rejects, args.workers, args.chunk_size)
+    print("Validated {rows} rows, {valid} valid, {rejected} rejected".format(**stats))
+    print("Wrote {}".format(output))
+
+    if stats["rejected"]:
+        print("Rejected rows are in {}".format(rejects))
+        sys.exit(1)
@@ -1,20 +1,93 @@
 export default {
     "EInvoicingRegistry": {
         "abi": [
+            {
+                "inputs": [],
+                "payable": false,
+                "type": "constructor"
+            },
+            {
+                "constant": true,
+                "inputs": [
+                    {
+                        "name": "vatId",
+                        "type": "bytes32"
+                    }
+                ],
+                "name": "hasCompany",
+                "outputs": [
+                    {
+                        "name": "",
+                        "type": "bool"
+                    }
+                ],
+                "payable": false,
+                "type": "function"
+            },
+            {
+                "constant": true,
+                "inputs": [
+                    {
+                        "name": "invoicingAddress",
+                        "type": "bytes32"
+                    }
+                ],
+                "name": "hasInvoicingAddress",
+                "outputs": [
+                    {
+                        "name": "",
+                        "type": "bool"
+                    }
+                ],
+                "payable": false,
+                "type": "function"
+            },
+            {
+                "constant": true,
+                "inputs": [
+                    {
+                        "name": "invoicingAddress",
+                        "type": "bytes32"
+                    }
+                ],
+                "name": "getVatIdByAddress",
+                "outputs": [
+                    {
+                        "name": "",
+                        "type": "bytes32"
+                    }
+                ],
+                "payable": false,
+                "type": "function"
+            },
             {
                 "constant": false,
                 "inputs": [
                     {
                         "name": "vatId",
-                        "type": "string"
+                        "type": "bytes32"
+                    }
+                ],
+                "name": "createCompany",
+                "outputs": [],
+                "payable": false,
+                "type": "function"
+            },
+            {
+                "constant": false,
+                "inputs": [
+                    {
+                        "name": "vatId",
+                        "type": "bytes32"
                     },
                     {
                         "name": "invoicingAddress",
-                        "type": "string"
+                        "type": "bytes32"
                     }
                 ],
-                "name": "createInvoiciexngAddress",
+                "name": "createInvoicingAddress",
                 "outputs": [],
+                "payable": false,
                 "type": "function"
             },
             {
@@ -22,32 +95,83 @@ export default {
                 "inputs": [
                     {
                         "name": "vatId",
-                        "type": "string"
+                        "type": "bytes32"
                     },
                     {
-                        "name": "preferences",
+                        "name": "contentType",
+                        "type": "uint8"
+                    },
+                    {
+                        "name": "data",
                         "type": "string"
                     }
                 ],
-                "name": "updateRoutingPreference",
+                "name": "setCompanyData",
                 "outputs": [],
+                "payable": false,
                 "type": "function"
             },
             {
-                "constant": true,
+                "constant": false,
                 "inputs": [
                     {
                         "name": "vatId",
+                        "type": "bytes32"
+                    },
+                    {
+                        "name": "invoicingAddress",
+                        "type": "bytes32"
+                    },
+                    {
+                        "name": "contentType",
+                        "type": "uint8"
+                    },
+                    {
+                        "name": "data",
                         "type": "string"
                     }
                 ],
-                "name": "getInvoicingAddressCount",
-                "outputs": [
+                "name": "setInvoicingAddressData",
+                "outputs": [],
+                "payable": false,
+                "type": "function"
+            },
+            {
+                "constant": false,
+                "inputs": [
                     {
-                        "name": "",
-                        "type": "uint256"
+                        "name": "vatId",
+                        "type": "bytes32"
+                    },
+                    {
+                        "name": "invoicingAddress",
+                        "type": "bytes32"
                     }
                 ],
+                "name": "moveInvoicingAddress",
+                "outputs": [],
+                "payable": false,
+                "type": "function"
+            },
+            {
+                "constant": false,
+                "inputs": [
+                    {
+                        "name": "keys",
+                        "type": "bytes32[]"
+                    },
+                    {
+                        "name": "packed",
+                        "type": "string"
+                    },
+                    {
+                        "name": "lengths",
+                        "type": "uint256[]"
+                    }
+                ],
+                "name": "importInvoicingAddresses",
+                "outputs": [],
+                "payable": false,
                 "type": "function"
             },
             {
@@ -55,16 +179,21 @@ export default {
                 "inputs": [
                     {
                         "name": "vatId",
-                        "type": "string"
+                        "type": "bytes32"
+                    },
+                    {
+                        "name": "contentType",
+                        "type": "uint8"
                     }
                 ],
-                "name": "hasCompany",
+                "name": "getBusinessInformation",
                 "outputs": [
                     {
                         "name": "",
-                        "type": "bool"
+                        "type": "string"
                     }
                 ],
+                "payable": false,
                 "type": "function"
             },
             {
@@ -72,28 +201,39 @@ export default {
                 "inputs": [
                     {
                         "name": "vatId",
-                        "type": "string"
+                        "type": "bytes32"
                     }
                 ],
-                "name": "getCompanyPreferences",
+                "name": "getInvoicingAddressCount",
                 "outputs": [
                     {
                         "name": "",
-                        "type": "string"
+                        "type": "uint256"
                     }
                 ],
+                "payable": false,
                 "type": "function"
             },
             {
                 "constant": true,
-                "inputs": [],
-                "name": "version",
+                "inputs": [
+                    {
+                        "name": "vatId",
+                        "type": "bytes32"
+                    },
+                    {
+                        "name": "idx",
+                        "type": "uint256"
+                    }
+                ],
+                "name": "getInvoicingAddressByIndex",
                 "outputs": [
                     {
                         "name": "",
-                        "type": "string"
+                        "type": "bytes32"
                     }
                 ],
+                "payable": false,
                 "type": "function"
             },
             {
@@ -101,7 +241,7 @@ export default {
                 "inputs": [
                     {
                         "name": "invoicingAddress",
-                        "type": "string"
+                        "type": "bytes32"
                     },
                     {
                         "name": "contentType",
@@ -115,43 +255,77 @@ export default {
                         "type": "string"
                     }
                 ],
+                "payable": false,
                 "type": "function"
             },
             {
                 "constant": false,
                 "inputs": [
                     {
-                        "name": "vatId",
+                        "name": "operatorId",
                         "type": "string"
                     },
-                    {
-                        "name": "contentType",
-                        "type": "uint8"
-                    },
                     {
                         "name": "data",
                         "type": "string"
                     }
                 ],
-                "name": "setCompanyData",
+                "name": "setOperatorData",
                 "outputs": [],
+                "payable": false,
                 "type": "function"
             },
             {
                 "constant": true,
                 "inputs": [
                     {
-                        "name": "invoicingAddress",
+                        "name": "operatorId",
                         "type": "string"
                     }
                 ],
-                "name": "getVatIdByAddress",
+                "name": "getOperatorData",
                 "outputs": [
                     {
                         "name": "",
                         "type": "string"
                     }
                 ],
+                "payable": false,
+                "type": "function"
+            },
+            {
+                "constant": false,
+                "inputs": [
+                    {
+                        "name": "root",
+                        "type": "bytes32"
+                    },
+                    {
+                        "name": "rowCount",
+                        "type": "uint256"
+                    }
+                ],
+                "name": "commitBatchRoot",
+                "outputs": [],
+                "payable": false,
+                "type": "function"
+            },
+            {
+                "constant": true,
+                "inputs": [
+                    {
+                        "name": "root",
+                        "type": "bytes32"
+                    }
+                ],
+                "name": "getBatchRootBlock",
+                "outputs": [
+                    {
+                        "name": "",
+                        "type": "uint256"
+                    }
+                ],
+                "payable": false,
                 "type": "function"
             },
             {
@@ -159,41 +333,112 @@ export default {
                 "inputs": [
                     {
                         "name": "vatId",
-                        "type": "string"
+                        "type": "bytes32"
                     },
                     {
-                        "name": "idx",
+                        "name": "offset",
+                        "type": "uint256"
+                    },
+                    {
+                        "name": "limit",
                         "type": "uint256"
                     }
                 ],
-                "name": "getInvoicingAddressByIndex",
+                "name": "getCompanyRecord",
                 "outputs": [
                     {
-                        "name": "",
+                        "name": "packed",
                         "type": "string"
+                    },
+                    {
+                        "name": "lengths",
+                        "type": "uint256[]"
+                    },
+                    {
+                        "name": "addressCount",
+                        "type": "uint256"
                     }
                 ],
+                "payable": false,
+                "type": "function"
+            },
+            {
+                "constant": false,
+                "inputs": [
+                    {
+                        "name": "vatId",
+                        "type": "bytes32"
+                    },
+                    {
+                        "name": "preferences",
+                        "type": "string"
+                    }
+                ],
+                "name": "updateRoutingPreference",
+                "outputs": [],
+                "payable": false,
                 "type": "function"
             },
             {
                 "constant": true,
                 "inputs": [
                     {
-                        "name": "invoicingAddress",
+                        "name": "vatId",
+                        "type": "bytes32"
+                    }
+                ],
+                "name": "getCompanyPreferences",
+                "outputs": [
+                    {
+                        "name": "",
                         "type": "string"
-                    },
+                    }
+                ],
+                "payable": false,
+                "type": "function"
+            },
+            {
+                "constant": false,
+                "inputs": [
                     {
-                        "name": "sender",
+                        "name": "writer",
                         "type": "address"
                     }
                 ],
-                "name": "canUpdateInvoicingAddress",
+                "name": "addWriter",
+                "outputs": [],
+                "payable": false,
+                "type": "function"
+            },
+            {
+                "constant": false,
+                "inputs": [
+                    {
+                        "name": "writer",
+                        "type": "address"
+                    }
+                ],
+                "name": "removeWriter",
+                "outputs": [],
+                "payable": false,
+                "type": "function"
+            },
+            {
+                "constant": true,
+                "inputs": [
+                    {
+                        "name": "writer",
+                        "type": "address"
+                    }
+                ],
+                "name": "isWriter",
                 "outputs": [
                     {
                         "name": "",
                         "type": "bool"
                     }
                 ],
+                "payable": false,
                 "type": "function"
             },
             {
@@ -201,27 +446,28 @@ export default {
                 "inputs": [
                     {
                         "name": "vatId",
-                        "type": "string"
+                        "type": "bytes32"
                     },
                     {
-                        "name": "contentType",
-                        "type": "uint8"
+                        "name": "sender",
+                        "type": "address"
                     }
                 ],
-                "name": "getBusinessInformation",
+                "name": "canUpdateCompany",
                 "outputs": [
                     {
                         "name": "",
-                        "type": "string"
+                        "type": "bool"
                     }
                 ],
+                "payable": false,
                 "type": "function"
             },
             {
                 "constant": true,
                 "inputs": [
                     {
-                        "name": "vatId",
+                        "name": "operatorId",
                         "type": "string"
                     },
                     {
@@ -229,37 +475,58 @@ export default {
                         "type": "address"
                     }
                 ],
-                "name": "canUpdateCompany",
+                "name": "canUpdateOperator",
                 "outputs": [
                     {
                         "name": "",
                         "type": "bool"
                     }
                 ],
+                "payable": false,
                 "type": "function"
             },
             {
-                "constant": false,
+                "constant": true,
                 "inputs": [
                     {
-                        "name": "vatId",
-                        "type": "string"
+                        "name": "root",
+                        "type": "bytes32"
                     },
+                    {
+                        "name": "sender",
+                        "type": "address"
+                    }
+                ],
+                "name": "canCommitBatch",
+                "outputs": [
+                    {
+                        "name": "",
+                        "type": "bool"
+                    }
+                ],
+                "payable": false,
+                "type": "function"
+            },
+            {
+                "constant": true,
+                "inputs": [
                     {
                         "name": "invoicingAddress",
-                        "type": "string"
+                        "type": "bytes32"
                     },
                     {
-                        "name": "contentType",
-                        "type": "uint8"
-                    },
+                        "name": "sender",
+                        "type": "address"
+                    }
+                ],
+                "name": "canUpdateInvoicingAddress",
+                "outputs": [
                     {
-                        "name": "data",
-                        "type": "string"
+                        "name": "",
+                        "type": "bool"
                     }
                 ],
-                "name": "setInvoicingAddressData",
-                "outputs": [],
+                "payable": false,
                 "type": "function"
             },
             {
@@ -267,7 +534,7 @@ export default {
                 "inputs": [
                     {
                         "name": "vatId",
-                        "type": "string"
+                        "type": "bytes32"
                     },
                     {
                         "name": "sender",
@@ -281,23 +548,64 @@ export default {
                         "type": "bool"
                     }
                 ],
+                "payable": false,
                 "type": "function"
             },
             {
                 "constant": false,
                 "inputs": [
                     {
-                        "name": "vatId",
+                        "name": "toInvoiceAddress",
+                        "type": "string"
+                    },
+                    {
+                        "name": "fromInvoiceAddress",
+                        "type": "string"
+                    },
+                    {
+                        "name": "invoiceId",
+                        "type": "string"
+                    },
+                    {
+                        "name": "payload",
                         "type": "string"
                     }
                 ],
-                "name": "createCompany",
+                "name": "sendInvoice",
                 "outputs": [],
+                "payable": false,
                 "type": "function"
             },
             {
+                "constant": true,
+                "inputs": [
+                    {
+                        "name": "invoiceId",
+                        "type": "string"
+                    }
+                ],
+                "name": "getInvoice",
+                "outputs": [
+                    {
+                        "name": "",
+                        "type": "string"
+                    }
+                ],
+                "payable": false,
+                "type": "function"
+            },
+            {
+                "constant": true,
                 "inputs": [],
-                "type": "constructor"
+                "name": "version",
+                "outputs": [
+                    {
+                        "name": "",
+                        "type": "string"
+                    }
+                ],
+                "payable": false,
+                "type": "function"
             },
             {
                 "anonymous": false,
@@ -305,7 +613,7 @@ export default {
                     {
                         "indexed": false,
                         "name": "vatId",
-                        "type": "string"
+                        "type": "bytes32"
                     }
                 ],
                 "name": "CompanyCreated",
@@ -317,7 +625,7 @@ export default {
                     {
                         "indexed": false,
                         "name": "vatId",
-                        "type": "string"
+                        "type": "bytes32"
                     }
                 ],
                 "name": "CompanyUpdated",
@@ -329,7 +637,7 @@ export default {
                     {
                         "indexed": false,
                         "name": "vatId",
-                        "type": "string"
+                        "type": "bytes32"
                     }
                 ],
                 "name": "CompanyPreferencesUpdated",
@@ -341,7 +649,7 @@ export default {
                     {
                         "indexed": false,
                         "name": "invoicingAddress",
-                        "type": "string"
+                        "type": "bytes32"
                     }
                 ],
                 "name": "InvoicingAddressCreated",
@@ -353,11 +661,86 @@ export default {
                     {
                         "indexed": false,
                         "name": "invoicingAddress",
-                        "type": "string"
+                        "type": "bytes32"
                     }
                 ],
                 "name": "InvoicingAddressUpdated",
                 "type": "event"
+            },
+            {
+                "anonymous": false,
+                "inputs": [
+                    {
+                        "indexed": false,
+                        "name": "operatorId",
+                        "type": "string"
+                    }
+                ],
+                "name": "OperatorUpdated",
+                "type": "event"
+            },
+            {
+                "anonymous": false,
+                "inputs": [
+                    {
+                        "indexed": false,
+                        "name": "root",
+                        "type": "bytes32"
+                    },
+                    {
+                        "indexed": false,
+                        "name": "rowCount",
+                        "type": "uint256"
+                    }
+                ],
+                "name": "BatchRootCommitted",
+                "type": "event"
+            },
+            {
+                "anonymous": false,
+                "inputs": [
+                    {
+                        "indexed": false,
+                        "name": "writer",
+                        "type": "address"
+                    }
+                ],
+                "name": "WriterAdded",
+                "type": "event"
+            },
+            {
+                "anonymous": false,
+                "inputs": [
+                    {
+                        "indexed": false,
+                        "name": "writer",
+                        "type": "address"
+                    }
+                ],
+                "name": "WriterRemoved",
+                "type": "event"
+            },
+            {
+                "anonymous": false,
+                "inputs": [
+                    {
+                        "indexed": true,
+                        "name": "toInvoiceAddress",
+                        "type": "string"
+                    },
+                    {
+                        "indexed": true,
+                        "name": "fromInvoiceAddress",
+                        "type": "string"
+                    },
+                    {
+                        "indexed": false,
+                        "name": "invoiceId",
+                        "type": "string"
+                    }
+                ],
+                "name": "InvoiceSent",
+                "type": "event"
             }
         ],
         "code": "0x60a060405260036060527f302e330000000000000000000000000000000000000000000000000000000000608052600080548180527f302e330000000000000000000000000000000000000000000000000000000006825560af907f290decd9548b62a8d60345a988386fc84ba6bc95484008f6362f93160ef3e563602060026001841615610100026000190190931692909204601f01919091048101905b8082111560d157838155600101609e565b505060018054600160a060020a031916331790556116e8806100d56000396000f35b509056606060405236156100c45760e060020a60003504630df7637081146100c657806313dce04f1461016d57806323807da8146101ff57806324f55e29146102a857806351a3aed51461034a57806354fd4d501461045257806364afed73146104b057806380a4170c146105d4578063885819c21461067c57806389b38d2f1461078a5780638c56159214610847578063a30cd1361461089d578063bd6bf475146109c1578063cfcf0f1d14610a31578063f5a9e21f14610847578063fd7f611e14610b07575b005b6100c46004808035906020019082018035906020019191908080601f01602080910402602001604051908101604052809392919081815260200183838082843750506040805160208835808b0135601f810183900483028401830190945283835297999860449892975091909101945090925082915084018382808284375094965050505050505060006000835160001480610163575082516000145b15610c8e57610002565b6100c46004808035906020019082018035906020019191908080601f01602080910402602001604051908101604052809392919081815260200183838082843750506040805160208835808b0135601f8101839004830284018301909452838352979998604498929750919091019450909250829150840183828082843750949650505050505050610faa8233610894565b610b606004808035906020019082018035906020019191908080601f0160208091040260200160405190810160405280939291908181526020018383808284375094965050505050505060006000600260005083604051808280519060200190808383829060006004602084601f0104600f02600301f1509050019150509081526020016040518091039020600050905080600001600050805490506000141561107857610002565b610b726004808035906020019082018035906020019191908080601f0160208091040260200160405190810160405280939291908181526020018383808284375094965050505050505060006000600260005083604051808280519060200190808383829060006004602084601f0104600f02600301f1509050019150509081526020016040518091039020600050600001600050805490501190505b919050565b610b866004808035906020019082018035906020019191908080601f016020809104026020016040519081016040528093929190818152602001838380828437509496505050505050506020604051908101604052806000815260200150600460005082604051808280519060200190808383829060006004602084601f0104600f02600301f15090500191505090815260200160405180910390206000508054600181600116156101000203166002900480601f0160208091040260200160405190810160405280929190818152602001828054600181600116156101000203166002900480156110ad5780601f10611082576101008083540402835291602001916110ad565b6040805160008054602060026001831615610100026000190190921691909104601f8101829004820284018201909452838352610b8693908301828280156110e45780601f106110b9576101008083540402835291602001916110e4565b610b866004808035906020019082018035906020019191908080601f0160208091040260200160405190810160405280939291908181526020018383808284375094965050933593505050506020604051908101604052806000815260200150600360005083604051808280519060200190808383829060006004602084601f0104600f02600301f150905001915050908152602001604051809103902060005060020160005060008381526020019081526020016000206000508054600181600116156101000203166002900480601f0160208091040260200160405190810160405280929190818152602001828054600181600116156101000203166002900480156111175780601f106110ec57610100808354040283529160200191611117565b6100c46004808035906020019082018035906020019191908080601f0160208091040260200160405190810160405280939291908181526020018383808284375050604080516020604435808b0135601f810183900483028401830190945283835297998935999098606498509296509190910193509091508190840183828082843750949650505050505050825160001480610672575080516000145b1561112357610002565b610b866004808035906020019082018035906020019191908080601f016020809104026020016040519081016040528093929190818152602001838380828437509496505050505050506020604051908101604052806000815260200150600360005082604051808280519060200190808383829060006004602084601f0104600f02600301f15090500191505090815260200160405180910390206000506001016000508054600181600116156101000203166002900480601f0160208091040260200160405190810160405280929190818152602001828054600181600116156101000203166002900480156110ad5780601f10611082576101008083540402835291602001916110ad565b610b866004808035906020019082018035906020019191908080601f01602080910402602001604051908101604052809392919081815260200183838082843750949650509335935050505060206040519081016040528060008152602001506000600260005084604051808280519060200190808383829060006004602084601f0104600f02600301f150905001915050908152602001604051809103902060005090508060000160005080549050600014156112ab57610002565b610b726004808035906020019082018035906020019191908080601f0160208091040260200160405190810160405280939291908181526020018383808284375094965050933593505050505b60015b92915050565b610b866004808035906020019082018035906020019191908080601f0160208091040260200160405190810160405280939291908181526020018383808284375094965050933593505050506020604051908101604052806000815260200150600260005083604051808280519060200190808383829060006004602084601f0104600f02600301f150905001915050908152602001604051809103902060005060010160005060008381526020019081526020016000206000508054600181600116156101000203166002900480601f0160208091040260200160405190810160405280929190818152602001828054600181600116156101000203166002900480156111175780601f106110ec57610100808354040283529160200191611117565b610b726004808035906020019082018035906020019191908080601f0160208091040260200160405190810160405280939291908181526020018383808284375094965050933593505050505b60015473ffffffffffffffffffffffffffffffffffffffff828116911614610897565b6100c46004808035906020019082018035906020019191908080601f01602080910402602001604051908101604052809392919081815260200183838082843750506040805160208835808b0135601f810183900483028401830190945283835297999860449892975091909101945090925082915084018382808284375050604080516020606435808b0135601f810183900483028401830190945283835297999835989760849750919550602491909101935090915081908401838280828437509496505050505050506113568333610894565b6100c46004808035906020019082018035906020019191908080601f0160208091040260200160405190810160405280939291908181526020018383808284375094965050505050505080516000141561159f57610002565b60408051918252519081900360200190f35b604080519115158252519081900360200190f35b60405180806020018281038252838181518152602001915080519060200190808383829060006004602084601f0104600f02600301f150905090810190601f168015610be65780820380516001836020036101000a031916815260200191505b509250505060405180910390f35b5050505b7f7d4daa322c894ce384dbbb2fb04db1ab4128076ee5b2440ae0b43874a48bcb8d8360405180806020018281038252838181518152602001915080519060200190808383829060006004602084601f0104600f02600301f150905090810190601f168015610c7a5780820380516001836020036101000a031916815260200191505b509250505060405180910390a15b50505050565b610c988333610894565b1515610ca357610002565b600260005084604051808280519060200190808383829060006004602084601f0104600f02600301f15090500191505090815260200160405180910390206000509150600360005083604051808280519060200190808383829060006004602084601f0104600f02600301f15090500191505090815260200160405180910390206000509050600081600001600050805490501115610d4157610002565b8054600181018083558291908281838015829011610d7257818360005260206000209182019101610d729190610e34565b5050506000928352506020808320909101805473ffffffffffffffffffffffffffffffffffffffff191633179055604051855187936003938893928392858301928291859183918691600490601f850104600f028c01f15090500191505090815260200160405180910390206000506001016000509080519060200190828054600181600116156101000203166002900490600052602060002090601f016020900481019282601f10610e4c57805160ff19168380011785555b50610e7c9291505b80821115610e485760008155600101610e34565b5090565b82800160010185558215610e2c579182015b82811115610e2c578251826000505591602001919060010190610e5e565b505081546000901115610bf857600482018054600181018083558281838015829011610ebb57818360005260206000209182019101610ebb9190610f2a565b5050509190906000526020600020900160008590919091509080519060200190828054600181600116156101000203166002900490600052602060002090601f016020900481019282601f10610f7a57805160ff19168380011785555b50610bf4929150610e34565b50506001015b80821115610e48576000818150805460018160011615610100020316600290046000825580601f10610f5c5750610f24565b601f016020900490600052602060002090810190610f249190610e34565b82800160010185558215610f18579182015b82811115610f18578251826000505591602001919060010190610f8c565b1515610fb557610002565b80600460005083604051808280519060200190808383829060006004602084601f0104600f02600301f15090500191505090815260200160405180910390206000509080519060200190828054600181600116156101000203166002900490600052602060002090601f016020900481019282601f1061104857805160ff19168380011785555b50610c88929150610e34565b8280016001018555821561103c579182015b8281111561103c57825182600050559160200191906001019061105a565b6004015492915050565b820191906000526020600020905b81548152906001019060200180831161109057829003601f168201915b50505050509050610345565b820191906000526020600020905b8154815290600101906020018083116110c757829003601f168201915b505050505081565b820191906000526020600020905b8154815290600101906020018083116110fa57829003601f168201915b50505050509050610897565b61112d8333610a0e565b151561113857610002565b80600260005084604051808280519060200190808383829060006004602084601f0104600f02600301f150905001915050908152602001604051809103902060005060010160005060008481526020019081526020016000206000509080519060200190828054600181600116156101000203166002900490600052602060002090601f016020900481019282601f106111e557805160ff19168380011785555b50611215929150610e34565b828001600101855582156111d9579182015b828111156111d95782518260005055916020019190600101906111f7565b50507f938f59463ddbc4b75fa674cac95e8b8ea67937c8d351fe5609b25b068ae89d5a8360405180806020018281038252838181518152602001915080519060200190808383829060006004602084601f0104600f02600301f150905090810190601f1680156112995780820380516001836020036101000a031916815260200191505b509250505060405180910390a1505050565b60048101805484908110156100025750600090815260209081902060408051918601805460026001821615610100026000190190911604601f810185900485028401850190925281835291928301828280156113485780601f1061131d57610100808354040283529160200191611348565b820191906000526020600020905b81548152906001019060200180831161132b57829003601f168201915b505050505091505092915050565b151561136157610002565b80600360005084604051808280519060200190808383829060006004602084601f0104600f02600301f150905001915050908152602001604051809103902060005060020160005060008481526020019081526020016000206000509080519060200190828054600181600116156101000203166002900490600052602060002090601f016020900481019282601f1061140e57805160ff19168380011785555b5061143e929150610e34565b82800160010185558215611402579182015b82811115611402578251826000505591602001919060010190611420565b505083600360005084604051808280519060200190808383829060006004602084601f0104600f02600301f15090500191505090815260200160405180910390206000506001016000509080519060200190828054600181600116156101000203166002900490600052602060002090601f016020900481019282601f106114d957805160ff19168380011785555b50611509929150610e34565b828001600101855582156114cd579182015b828111156114cd5782518260005055916020019190600101906114eb565b50507f4775fa5d057bad90c8c8235478eb71a66acb9f84cfc469aa3a4990af31df02438360405180806020018281038252838181518152602001915080519060200190808383829060006004602084601f0104600f02600301f150905090810190601f168015610c7a5780820380516001836020036101000a03191681526020019150509250505060405180910390a150505050565b6115a98133610a0e565b15156115b457610002565b600260005081604051808280519060200190808383829060006004602084601f0104600f02600301f1509050019150509081526020016040518091039020600050600001600050805480600101828181548183558181151161162757600083815260209020611627918101908301610e34565b505050600092835250602080832091909101805473ffffffffffffffffffffffffffffffffffffffff1916331790556040805182815284518184015284517f7da4327c1ec38f4517c10fa51c2eaef57e5b4ec9f1abd5406b04b367926f1bdc94869492938493908401928682019290918291859183918691600490601f850104600f02600301f150905090810190601f1680156116d85780820380516001836020036101000a031916815260200191505b509250505060405180910390a15056",
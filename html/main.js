@@ -27,6 +27,9 @@
         });
     }
 
+    /**
+     * Registry keys, VAT IDs and invoicing addresses, are zero padded ASCII in bytes32.
+     */
     function convertInvoicingAddressToBytes32(invoicingAddress) {
 
         while(invoicingAddress.length < 32) {
@@ -36,6 +39,10 @@
         return web3.fromAscii(invoicingAddress);
     }
 
+    function convertBytes32ToString(key) {
+        return web3.toAscii(key).replace(/\0+$/, "");
+    }
+
     function checkConnection() {
         console.log(web3.version);
         if(web3.isConnected()) {
@@ -81,6 +88,8 @@
             return;
         }
 
+        watchOperators();
+
         $("#active-address").text(address);
         $("#active-version").text(ver);
         $("#alert-contract-success").show();
@@ -108,6 +117,115 @@
         $("#result").show();
     }
 
+    // Compact payload encoding, see eireg/data.py
+    var COMPACT_MARKER = "\x1e";
+    var FIELD_SEPARATOR = "\x1f";
+
+    // Content type -> schema version -> [string field names, boolean field names packed as bits]
+    var COMPACT_SCHEMAS = {
+        3: {1: [["name"], []]}, // OperatorPublicData
+        4: {1: [["name"], []]}, // TiekeCompanyData
+        5: {
+            1: [["operatorName", "operatorId"], ["permissionToSend", "sends", "receives"]],
+            2: [["operatorId"], ["permissionToSend", "sends", "receives"]] // Operator referenced by ID
+        } // TiekeAddressData
+    };
+
+    // Operator ID -> decoded operator record, shared by all addresses of the operator
+    var operators = {};
+
+    // Filter of OperatorUpdated events of the current contract
+    var operatorFilter = null;
+
+    /**
+     * Drop cached operator records when they are updated in the contract.
+     */
+    function watchOperators() {
+        operators = {};
+
+        if(operatorFilter) {
+            operatorFilter.stopWatching();
+        }
+
+        operatorFilter = contract.OperatorUpdated({}, {fromBlock: "latest"});
+        operatorFilter.watch(function(err, event) {
+            if(err) {
+                // We cannot tell what changed, so forget everything
+                console.warn("Operator event watch failed", err);
+                operators = {};
+                return;
+            }
+            delete operators[event.args.operatorId];
+        });
+    }
+
+    /**
+     * Fill in the operator name of address data which only references the operator by ID.
+     */
+    function resolveOperator(addressData) {
+        if(!addressData.operatorId || addressData.operatorName !== undefined) {
+            return addressData;
+        }
+
+        if(!(addressData.operatorId in operators)) {
+            operators[addressData.operatorId] = decodePayload(3, contract.getOperatorData(addressData.operatorId));
+        }
+
+        var operator = operators[addressData.operatorId];
+        if(operator) {
+            addressData.operatorName = operator.name;
+        }
+        return addressData;
+    }
+
+    /**
+     * Decode a stored payload, either JSON or compact.
+     */
+    function decodePayload(contentType, payload) {
+        if(!payload) {
+            return null;
+        }
+
+        if(payload.charAt(0) !== COMPACT_MARKER) {
+            return JSON.parse(payload);
+        }
+
+        var fields = payload.substr(1).split(FIELD_SEPARATOR);
+        var schema = COMPACT_SCHEMAS[contentType][parseInt(fields[0], 10)];
+        var strings = schema[0], flags = schema[1];
+        var data = {};
+        var i;
+
+        for(i=0; i<strings.length; i++) {
+            data[strings[i]] = fields[i + 1];
+        }
+
+        if(flags.length) {
+            var bits = parseInt(fields[strings.length + 1], 10);
+            for(i=0; i<flags.length; i++) {
+                data[flags[i]] = (bits & (1 << i)) !== 0;
+            }
+        }
+
+        return data;
+    }
+
+    /**
+     * Split strings concatenated by getCompanyRecord(). Lengths are in UTF-8 bytes.
+     */
+    function unpackStrings(packed, lengths) {
+        // One char per UTF-8 byte
+        var bytes = unescape(encodeURIComponent(packed));
+        var result = [];
+        var offset = 0;
+        for(var i=0; i<lengths.length; i++) {
+            var length = lengths[i].toNumber();
+            result.push(decodeURIComponent(escape(bytes.substr(offset, length))));
+            offset += length;
+        }
+        return result;
+    }
+
     function showCompany(vatId) {
         var res = $("#result");
         res.empty();
@@ -116,29 +234,39 @@
 
         data.vatId = vatId;
 
-        var coreData = contract.getBusinessInformation(vatId, 4); // TiekeCompanyData
+        // Company and up to 100 addresses in one call, companies with more addresses take more pages.
+        // Fields: data of content types 1-5, preferences, then for each address: address and data of content types 1-5
+        var pageSize = 100;
+        var key = convertInvoicingAddressToBytes32(vatId);
+        var record = contract.getCompanyRecord(key, 0, pageSize);
+        var fields = unpackStrings(record[0], record[1]);
+
+        var coreData = decodePayload(4, fields[3]); // TiekeCompanyData
         if(coreData) {
-            coreData = JSON.parse(coreData);
             data.businessInformation = coreData;
 
             data.addresses = {};
 
-            var bigNum = contract.getInvoicingAddressCount(vatId);
-
-            var addressCount = bigNum.toNumber();
-
+            var addressCount = record[2].toNumber();
             console.log("Found ", addressCount, " addresses");
 
-            for(var i=0; i<addressCount; i++) {
-                var address = contract.getInvoicingAddressByIndex(vatId, i);
+            for(var offset=0; offset<addressCount; offset+=pageSize) {
+                if(offset > 0) {
+                    record = contract.getCompanyRecord(key, offset, pageSize);
+                    fields = unpackStrings(record[0], record[1]);
+                }
+
+                for(var i=6; i<fields.length; i+=6) {
+                    var address = fields[i];
 
-                var addressData = contract.getAddressInformation(address, 5); // TiekeAddressData
-                console.log("Got data ", addressData);
+                    var addressData = decodePayload(5, fields[i + 5]); // TiekeAddressData
+                    console.log("Got data ", addressData);
 
-                if(addressData) {
-                    data.addresses[address] = JSON.parse(addressData);
-                } else {
-                    data.addresses[address] = "No data available";
+                    if(addressData) {
+                        data.addresses[address] = resolveOperator(addressData);
+                    } else {
+                        data.addresses[address] = "No data available";
+                    }
                 }
             }
         } else {
@@ -161,7 +289,7 @@
 
         console.log("Fetching data from", invoicingAddress);
 
-        var vatId = contract.getVatIdByAddress(invoicingAddress);
+        var vatId = convertBytes32ToString(contract.getVatIdByAddress(convertInvoicingAddressToBytes32(invoicingAddress)));
         if(!vatId) {
             setErrorResult("No company found for invoicing address " + invoicingAddress + ". Use OVT:xxx or IBAN:xxx prefix when typing in the address")
         }
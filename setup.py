@@ -54,6 +54,10 @@ setup(
     entry_points="""\
     [console_scripts]
     import-tieke-csv = eireg.importer:main
+    sync-registry-replica = eireg.replica:main
+    serve-invoice-routes = eireg.routing:main
+    export-registry-snapshot = eireg.snapshot:main
+    validate-tieke-csv = eireg.validation:main
     """,
 
 )
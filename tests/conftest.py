@@ -0,0 +1,8 @@
+import pytest
+from web3.contract import Contract
+
+
+@pytest.fixture()
+def registry_contract(chain) -> Contract:
+    contract = chain.get_contract('EInvoicingRegistry')
+    return contract
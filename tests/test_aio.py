@@ -0,0 +1,121 @@
+import asyncio
+import http.server
+import json
+import socketserver
+import threading
+import time
+
+import pytest
+
+from eireg.aio import AsyncReceiptConfirmer, AsyncRPC
+from eireg.confirmer import ConfirmationTimeout
+
+
+class RPCHandler(http.server.BaseHTTPRequestHandler):
+    """Answer eth_blockNumber, in chunks every other time."""
+
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        RPCHandler.connections += 1
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+        body = json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": "0x10"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if request["id"] % 2:
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            half = len(body) // 2
+            for chunk in (body[:half], body[half:], b""):
+                self.wfile.write("{:x}\r\n".format(len(chunk)).encode("ascii") + chunk + b"\r\n")
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+def test_async_rpc_keep_alive():
+    """Many concurrent requests share a small pool of persistent connections."""
+
+    server = ThreadingServer(("localhost", 0), RPCHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    try:
+        rpc = AsyncRPC("localhost", server.server_address[1], pool_size=2)
+
+        async def run():
+            return await asyncio.gather(*[rpc.request("eth_blockNumber", []) for i in range(20)])
+
+        assert loop.run_until_complete(run()) == ["0x10"] * 20
+        assert rpc.get_stats()["requests"] == 20
+        rpc.close()
+    finally:
+        loop.close()
+        server.shutdown()
+
+    assert RPCHandler.connections <= 2
+
+
+class FlakyRPC:
+    """Node whose receipt requests fail ``failures`` times."""
+
+    def __init__(self):
+        self.block_number = 0
+        self.failures = 1
+
+    async def request(self, method, params):
+        if method == "eth_blockNumber":
+            return hex(self.block_number)
+        if method == "eth_getBlockByNumber":
+            return {"transactions": [{"hash": "0x{:02x}".format(int(params[0], 16)), "gas": "0x64"}]}
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Node went away")
+        return {"gasUsed": "0x32"}
+
+
+def test_async_receipt_read_failure():
+    """A receipt which cannot be read is retried on the next poll, and fails at the deadline if it never can."""
+
+    rpc = FlakyRPC()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    async def run():
+        confirmer = AsyncReceiptConfirmer(rpc)
+        confirmer.last_block = 0
+        future = confirmer.submit("0x01")
+
+        rpc.block_number = 1
+        await confirmer.poll()
+        assert not future.done()
+
+        await confirmer.poll()
+        assert future.result().success
+
+        rpc.failures = 1000
+        future = confirmer.submit("0x02", timeout=0.01)
+        rpc.block_number = 2
+        time.sleep(0.02)
+        await confirmer.poll()
+        with pytest.raises(ConfirmationTimeout):
+            future.result()
+
+    try:
+        loop.run_until_complete(run())
+    finally:
+        loop.close()
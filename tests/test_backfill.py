@@ -0,0 +1,52 @@
+import threading
+
+from eireg.backfill import EventBackfill
+
+
+def make_events(from_block: int, to_block: int) -> list:
+    """Two events in every block."""
+    return [{"blockNumber": block, "logIndex": index} for block in range(from_block, to_block + 1) for index in range(2)]
+
+
+def test_events_in_block_order():
+    """Chunks fetched in parallel come out in block order, with a checkpoint after each."""
+
+    threads = set()
+
+    def fetch_range(from_block, to_block):
+        threads.add(threading.current_thread().name)
+        return make_events(from_block, to_block)
+
+    checkpoints = []
+    backfill = EventBackfill(None, [], chunk_size=10, max_workers=4, fetch_range=fetch_range)
+    events = list(backfill.iter_events(5, 1004, checkpoint=checkpoints.append))
+
+    assert events == make_events(5, 1004)
+    assert checkpoints == sorted(checkpoints)
+    assert checkpoints[-1] == 1004
+    assert len(threads) > 1
+
+    # Sparse chunks grew
+    assert backfill.get_stats()["chunk_size"] > 10
+
+
+def test_bisect_failing_chunks():
+    """Ranges the node refuses are split until they succeed."""
+
+    def fetch_range(from_block, to_block):
+        if to_block - from_block >= 8:
+            raise ValueError("query returned more than 10000 results")
+        return make_events(from_block, to_block)
+
+    backfill = EventBackfill(None, [], chunk_size=100, max_workers=2, fetch_range=fetch_range)
+    assert list(backfill.iter_events(0, 299)) == make_events(0, 299)
+
+    stats = backfill.get_stats()
+    assert stats["bisections"] > 0
+    assert stats["chunk_size"] <= 8
+
+
+def test_shrink_dense_chunks():
+    backfill = EventBackfill(None, [], chunk_size=1000, target_events=100, fetch_range=make_events)
+    list(backfill.iter_events(0, 4999))
+    assert backfill.get_stats()["chunk_size"] == 50
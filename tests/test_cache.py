@@ -0,0 +1,78 @@
+from web3.contract import Contract
+
+from eireg import importer
+from eireg.blockchain import check_succesful_tx
+from eireg.cache import CachedRegistry
+from eireg.client import RegistryClient
+from eireg.data import ContentType
+from eireg.utils import string_to_bytes32
+
+
+def test_invalidate_on_update(registry_contract: Contract):
+    """Repeated lookups hit the cache until an event tells the record changed."""
+
+    importer.import_all_pipelined(registry_contract, importer.SAMPLE_CSV)
+
+    with RegistryClient(registry_contract) as client:
+        registry = CachedRegistry(client)
+        registry.sync()
+
+        address = "OVT:3724303727"
+        original = registry.get_address_information(address, ContentType.TiekeAddressData.value)
+        assert registry.get_address_information(address, ContentType.TiekeAddressData.value) == original
+        assert registry.get_vat_id_by_address(address) == "FI24303727"
+        company = registry.get_company("FI24303727")
+        assert registry.get_stats()["hits"] == 1
+
+        txid = registry_contract.transact().setInvoicingAddressData(string_to_bytes32("FI24303727"), string_to_bytes32(address), ContentType.TiekeAddressData.value, '{"changed": true}')
+        assert check_succesful_tx(registry_contract, txid)
+        registry.sync()
+
+        # Entries of the address and its company are gone, the rest stays
+        assert registry.get_address_information(address, ContentType.TiekeAddressData.value) == '{"changed": true}'
+        assert registry.get_company("FI24303727").addresses[0].data[ContentType.TiekeAddressData] == '{"changed": true}'
+        assert company.addresses[0].data[ContentType.TiekeAddressData] == original
+
+        stats = registry.get_stats()
+        assert stats["invalidations"] == 3
+        assert stats["size"] == 2
+
+
+def test_lru_eviction(registry_contract: Contract):
+    """Least recently used entries go first when the cache is full."""
+
+    with RegistryClient(registry_contract) as client:
+        registry = CachedRegistry(client, max_size=2)
+
+        registry.get_company_preferences("FI1")
+        registry.get_company_preferences("FI2")
+        registry.get_company_preferences("FI1")
+        registry.get_company_preferences("FI3")
+
+        registry.get_company_preferences("FI1")
+        assert registry.get_stats()["evictions"] == 1
+        assert registry.get_stats()["hits"] == 2
+
+
+def test_referenced_operator(registry_contract: Contract):
+    """Addresses imported with operator references resolve the operator from one cached record."""
+
+    operators = importer.collect_operators(importer.SAMPLE_CSV)
+    assert importer.import_operators(registry_contract, operators) == len(operators)
+    assert importer.import_operators(registry_contract, operators) == 0
+    importer.import_all_pipelined(registry_contract, importer.SAMPLE_CSV, reference_operators=True)
+
+    with RegistryClient(registry_contract) as client:
+        registry = CachedRegistry(client)
+        registry.sync()
+
+        address = "OVT:3724303727"
+        assert "operatorName" not in registry.get_address_information(address, ContentType.TiekeAddressData.value)
+        data = registry.get_address_data(address)
+        assert data["operatorName"] == operators[data["operatorId"]]["name"]
+
+        txid = registry_contract.transact().setOperatorData(data["operatorId"], '{"name": "Renamed Oy"}')
+        assert check_succesful_tx(registry_contract, txid)
+        registry.sync()
+
+        assert registry.get_address_data(address)["operatorName"] == "Renamed Oy"
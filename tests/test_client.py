@@ -0,0 +1,124 @@
+import http.server
+import json
+import threading
+
+from web3.contract import Contract
+
+from eireg import importer
+from eireg.client import HTTPTransport, ProviderTransport, RegistryClient
+from eireg.data import ContentType, decode_company_record
+from eireg.utils import bytes32_to_string, string_to_bytes32
+
+
+def test_batched_calls(registry_contract: Contract):
+    """Concurrent calls are coalesced into batches and decoded like contract.call()."""
+
+    importer.import_all_pipelined(registry_contract, importer.SAMPLE_CSV)
+
+    addresses = ["OVT:3724303727", "IBAN:FI6213763000140986", "OVT:0000000000"]
+
+    # A long window so that all calls end up in one batch
+    with RegistryClient(registry_contract, window=0.5) as client:
+        futures = [client.submit("getVatIdByAddress", address) for address in addresses]
+        assert [future.result() for future in futures] == [bytes32_to_string(registry_contract.call().getVatIdByAddress(string_to_bytes32(address))) for address in addresses]
+        assert client.call().hasCompany("FI24303727")
+
+        stats = client.get_stats()
+        assert stats["calls"] == 4
+        assert stats["max_batch_size"] == 3
+
+
+def test_get_company(registry_contract: Contract):
+    """Whole company is read in one call, or in pages for many addresses."""
+
+    importer.import_all_pipelined(registry_contract, importer.SAMPLE_CSV)
+
+    with RegistryClient(registry_contract) as client:
+        company = client.get_company("FI26597538")
+        assert company.address_count == 2
+        assert [address.address for address in company.addresses] == [
+            bytes32_to_string(registry_contract.call().getInvoicingAddressByIndex(string_to_bytes32("FI26597538"), idx)) for idx in range(2)]
+        assert company.business_information[ContentType.TiekeCompanyData] == \
+            registry_contract.call().getBusinessInformation(string_to_bytes32("FI26597538"), ContentType.TiekeCompanyData.value)
+        assert company.addresses[0].data[ContentType.TiekeAddressData] == \
+            registry_contract.call().getAddressInformation(string_to_bytes32(company.addresses[0].address), ContentType.TiekeAddressData.value)
+
+        paged = client.get_company("FI26597538", page_size=1)
+        assert [address.address for address in paged.addresses] == [address.address for address in company.addresses]
+
+        assert client.get_company("FI00000000") is None
+        assert client.get_stats()["calls"] == 4
+
+
+def test_decode_company_record():
+    """Field lengths are UTF-8 byte lengths."""
+
+    fields = ["", "", "", '{"name": "Åke Oy"}', "", "{}", "OVT:1", "", "", "", "", "ä"]
+    record = decode_company_record("FI1", "".join(fields), [len(field.encode("utf-8")) for field in fields], 1)
+
+    assert record.business_information[ContentType.TiekeCompanyData] == '{"name": "Åke Oy"}'
+    assert record.preferences == "{}"
+    assert record.addresses[0].address == "OVT:1"
+    assert record.addresses[0].data[ContentType.TiekeAddressData] == "ä"
+
+
+class EchoHandler(http.server.BaseHTTPRequestHandler):
+    """Answer each request of a batch with the number of the connection it came in."""
+
+    protocol_version = "HTTP/1.1"
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        EchoHandler.connections += 1
+        self.connection_number = EchoHandler.connections
+
+    def do_POST(self):
+        requests = json.loads(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+        body = json.dumps([{"id": request["id"], "result": self.connection_number} for request in requests]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_keep_alive():
+    """Batches reuse one HTTP connection."""
+
+    server = http.server.HTTPServer(("localhost", 0), EchoHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    transport = HTTPTransport("localhost", server.server_address[1], pool_size=1)
+    try:
+        for i in range(3):
+            responses = transport.send_batch([{"id": 1, "method": "eth_call", "params": []}, {"id": 2, "method": "eth_call", "params": []}])
+            assert [response["result"] for response in responses] == [1, 1]
+    finally:
+        transport.close()
+        server.shutdown()
+
+    assert EchoHandler.connections == 1
+
+
+class FakeWeb3:
+    """Provider answering like the tester provider for eth_call and like an RPC provider otherwise."""
+
+    class currentProvider:
+
+        @staticmethod
+        def make_request(method, params):
+            if method == "eth_call":
+                return {"id": 0, "result": "0x1"}
+            return json.dumps({"id": 0, "error": {"message": "Unknown method"}}).encode("utf-8")
+
+
+def test_provider_transport():
+    """Responses of dict and raw body providers are tied to their request ids."""
+
+    responses = ProviderTransport(FakeWeb3()).send_batch([{"id": 1, "method": "eth_call", "params": []},
+                                                          {"id": 2, "method": "eth_foo", "params": []}])
+    assert responses == [{"id": 1, "result": "0x1"}, {"id": 2, "error": {"message": "Unknown method"}}]
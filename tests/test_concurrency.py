@@ -0,0 +1,51 @@
+from eireg.concurrency import ConcurrencyController
+
+
+class FakeConfirmer:
+
+    def __init__(self):
+        self.stats = {"confirmed": 0, "timed_out": 0, "total_latency": 0.0}
+
+    def get_stats(self):
+        return dict(self.stats)
+
+    def mine(self, count, latency):
+        self.stats["confirmed"] += count
+        self.stats["total_latency"] += count * latency
+
+
+def test_adapt_to_latency():
+    """Target grows while latency stays flat and backs off when it climbs."""
+
+    confirmer = FakeConfirmer()
+    targets = []
+    controller = ConcurrencyController(confirmer, on_change=targets.append, initial=8, step=4, maximum=20)
+
+    for i in range(5):
+        confirmer.mine(10, 2.0)
+        controller.adjust()
+
+    assert controller.target == 20
+    assert targets == [12, 16, 20]
+
+    confirmer.mine(10, 10.0)
+    assert controller.adjust() == 15
+
+    # Idle interval keeps the target
+    assert controller.adjust() == 15
+
+
+def test_back_off_on_timeouts():
+    """Timed out transactions and failed rows shrink the target down to the minimum."""
+
+    confirmer = FakeConfirmer()
+    controller = ConcurrencyController(confirmer, initial=4, minimum=2)
+
+    confirmer.mine(10, 2.0)
+    confirmer.stats["timed_out"] += 5
+    assert controller.adjust() == 3
+
+    confirmer.mine(10, 2.0)
+    controller.record_row(False)
+    assert controller.adjust() == 2
+    assert controller.get_stats()["decreases"] == 2
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+from web3.contract import Contract
+
+from eireg.confirmer import ConfirmationTimeout, ReceiptConfirmer
+from eireg.utils import string_to_bytes32
+
+
+def test_confirm_success_and_failure(registry_contract: Contract):
+    """Confirmer resolves both successful and thrown transactions."""
+
+    with ReceiptConfirmer(registry_contract.web3, poll_interval=0.1) as confirmer:
+        txid = registry_contract.transact().createCompany(string_to_bytes32("FI24303727"))
+        assert confirmer.submit(txid).result(timeout=30).success
+
+        # Empty VAT id throws
+        txid = registry_contract.transact({"gas": 100000}).createCompany("")
+        confirmation = confirmer.submit(txid).result(timeout=30)
+        assert not confirmation.success
+        assert confirmation.gas_used == 100000
+
+        stats = confirmer.get_stats()
+        assert stats["confirmed"] == 2
+        assert stats["failed"] == 1
+
+
+class FlakyEth:
+    """Node whose receipt requests fail ``failures`` times."""
+
+    def __init__(self):
+        self.blockNumber = 0
+        self.failures = 1
+
+    def getBlock(self, block_number, full):
+        return {"transactions": [{"hash": "0x{:02x}".format(block_number), "gas": 100}]}
+
+    def getTransactionReceipt(self, txid):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Node went away")
+        return {"gasUsed": 50}
+
+
+def test_receipt_read_failure():
+    """A receipt which cannot be read is retried on the next poll, and fails at the deadline if it never can."""
+
+    web3 = type("Web3", (), {})()
+    web3.eth = FlakyEth()
+
+    confirmer = ReceiptConfirmer(web3)
+    confirmer.last_block = 0
+    future = confirmer.submit("0x01")
+
+    web3.eth.blockNumber = 1
+    confirmer.poll()
+    assert not future.done()
+
+    confirmer.poll()
+    assert future.result(timeout=0).success
+
+    web3.eth.failures = 1000
+    future = confirmer.submit("0x02", timeout=0.01)
+    web3.eth.blockNumber = 2
+    time.sleep(0.02)
+    confirmer.poll()
+    with pytest.raises(ConfirmationTimeout):
+        future.result(timeout=0)
@@ -0,0 +1,63 @@
+import json
+
+from eireg.data import ContentType, Encoding, create_company_preferences, decode_company_preferences, decode_payload, encode_payload, \
+    resolve_operator
+
+
+def test_compact_address_data():
+    """Compact payloads decode to the same data and take a fraction of the space."""
+
+    data = {
+        "operatorName": "OpusCapita Group Oy",
+        "operatorId": "3710948874",
+        "permissionToSend": True,
+        "sends": False,
+        "receives": True,
+    }
+
+    payload = encode_payload(ContentType.TiekeAddressData, data, Encoding.compact)
+    assert decode_payload(ContentType.TiekeAddressData, payload) == data
+    assert len(payload) < len(json.dumps(data)) / 2
+
+    # Readers detect the encoding
+    assert decode_payload(ContentType.TiekeAddressData, json.dumps(data)) == data
+    assert decode_payload(ContentType.TiekeAddressData, "") is None
+
+
+def test_compact_fallback():
+    """Data that does not fit the schema is stored as JSON."""
+
+    data = {"name": "Adusso Oy", "extra": 1}
+    assert encode_payload(ContentType.TiekeCompanyData, data, Encoding.compact) == json.dumps(data)
+
+    data = {"name": "Bad\x1fname"}
+    assert encode_payload(ContentType.TiekeCompanyData, data, Encoding.compact) == json.dumps(data)
+
+
+def test_compact_preferences():
+    """Compact company preferences decode to the default address and per address flags, also without addresses."""
+
+    addresses = {
+        "OVT:1": {"permissionToSend": True, "sends": True, "receives": False, "receivePreferences": ["tax", "pdf"]},
+        "IBAN:FI1": {"permissionToSend": False, "sends": False, "receives": True},
+    }
+
+    payload = create_company_preferences("OVT:1", addresses, Encoding.compact)
+    assert decode_company_preferences(payload) == {"defaultAddress": "OVT:1", "invoiceAddresses": addresses}
+    assert decode_company_preferences(create_company_preferences("OVT:1", {})) == {"defaultAddress": "OVT:1", "invoiceAddresses": {}}
+
+
+def test_operator_reference():
+    """Address data without the operator name uses the newer schema and resolves through the operator record."""
+
+    data = {"operatorId": "3710948874", "permissionToSend": True, "sends": False, "receives": True}
+
+    payload = encode_payload(ContentType.TiekeAddressData, data, Encoding.compact)
+    assert payload.startswith("\x1e2\x1f")
+    assert decode_payload(ContentType.TiekeAddressData, payload) == data
+
+    operator = decode_payload(ContentType.OperatorPublicData, encode_payload(ContentType.OperatorPublicData, {"name": "OpusCapita Group Oy"}, Encoding.compact))
+    resolved = resolve_operator(data, operator)
+    assert resolved["operatorName"] == "OpusCapita Group Oy"
+    assert "operatorName" not in data
+    assert resolve_operator(data, None)["operatorName"] == ""
@@ -0,0 +1,63 @@
+from eireg.fingerprint import FingerprintIndex
+
+
+def make_row(vat_id, address, company_data="{}", address_data="{}"):
+    return {"vat_id": vat_id, "address": address, "company_data": company_data, "address_data": address_data}
+
+
+def test_compare(tmpdir):
+    """Only new and changed payloads are reported after saving and loading the index."""
+
+    path = str(tmpdir.join("tieke.index"))
+
+    index = FingerprintIndex()
+    index.add(make_row("0000000-1", "FI001", '{"name": "A"}', '{"operator": "X"}'))
+    index.add(make_row("0000000-1", "FI002", '{"name": "A"}', '{"operator": "Y"}'))
+    index.save(path)
+
+    index = FingerprintIndex.load(path)
+
+    assert index.compare(make_row("0000000-1", "FI001", '{"name": "A"}', '{"operator": "X"}')).is_unchanged()
+
+    change = index.compare(make_row("0000000-1", "FI002", '{"name": "B"}', '{"operator": "Y"}'))
+    assert change.company_changed and not change.address_changed and not change.new_company
+
+    change = index.compare(make_row("0000000-1", "FI002", '{"name": "A"}', '{"operator": "Z"}'))
+    assert change.address_changed and not change.company_changed
+
+    change = index.compare(make_row("0000000-2", "FI003"))
+    assert change.new_company and change.new_address
+
+    # Address moved to another company
+    change = index.compare(make_row("0000000-2", "FI001", "{}", '{"operator": "X"}'))
+    assert change.new_company and change.address_moved and not change.address_changed
+
+
+def test_keep():
+    """Records keep their previous hashes until their transactions have landed."""
+
+    previous = FingerprintIndex()
+    previous.add(make_row("0000000-1", "FI001"))
+
+    current = FingerprintIndex()
+    current.keep_company("0000000-1", previous)
+    current.keep_address("FI001", previous)
+    current.keep_address("FI002", previous)
+    assert current.companies == previous.companies
+    assert current.addresses == previous.addresses
+
+    # A landed update is not overwritten by a later row of the same company
+    current.set_company("0000000-1", '{"name": "A"}')
+    current.keep_company("0000000-1", previous)
+    assert current.compare(make_row("0000000-1", "FI001", '{"name": "A"}')).is_unchanged()
+
+    # Moved address keeps its data until new data lands
+    current.move_address("FI001", "0000000-2")
+    change = current.compare(make_row("0000000-2", "FI001"))
+    assert not change.address_changed and not change.address_moved
+    current.set_address_data("FI001", '{"operator": "X"}')
+    assert current.addresses["FI001"][0] == "0000000-2"
+
+    # Data of an address which was not created is not recorded
+    current.set_address_data("FI002", "{}")
+    assert "FI002" not in current.addresses
@@ -0,0 +1,297 @@
+import asyncio
+import http.server
+import json
+import socketserver
+import threading
+
+from ethereum import tester
+from web3.contract import Contract
+
+from eireg import importer
+from eireg.blockchain import check_succesful_tx
+from eireg.client import ProviderTransport
+from eireg.confirmer import Confirmation
+from eireg.data import ContentType
+from eireg.journal import ImportJournal
+from eireg.signer import LocalAccount
+from eireg.state import ImportState
+from eireg.utils import bytes32_to_string, string_to_bytes32
+
+
+def test_import_all_pipelined(registry_contract: Contract):
+    """Import the whole sample file without waiting receipts in between."""
+
+    failures = importer.import_all_pipelined(registry_contract, importer.SAMPLE_CSV, max_in_flight=8)
+    assert failures == []
+
+    # 360 Plus Oy has two rows in the sample
+    assert registry_contract.call().getInvoicingAddressCount(string_to_bytes32("FI26597538")) == 2
+    assert bytes32_to_string(registry_contract.call().getVatIdByAddress(string_to_bytes32("OVT:3724303727"))) == "FI24303727"
+
+
+def test_import_all_batched(registry_contract: Contract):
+    """Import the sample file with several rows per transaction."""
+
+    # Small batches so that the sample file spans many transactions
+    failures = importer.import_all_batched(registry_contract, importer.SAMPLE_CSV, gas_limit=2000000)
+    assert failures == []
+
+    assert registry_contract.call().getInvoicingAddressCount(string_to_bytes32("FI26597538")) == 2
+    assert bytes32_to_string(registry_contract.call().getInvoicingAddressByIndex(string_to_bytes32("FI26597538"), 0)) == "IBAN:FI6213763000140986"
+    assert bytes32_to_string(registry_contract.call().getVatIdByAddress(string_to_bytes32("OVT:3724303727"))) == "FI24303727"
+    assert registry_contract.call().getBusinessInformation(string_to_bytes32("FI24303727"), ContentType.TiekeCompanyData.value) == '{"name": "Adusso Oy"}'
+
+
+class ProviderBridgeHandler(http.server.BaseHTTPRequestHandler):
+    """Answer JSON-RPC over HTTP from the web3 provider of the tester chain."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+        with self.server.lock:
+            response = self.server.transport.request(request["method"], request["params"])
+        body = json.dumps(dict(response, jsonrpc="2.0", id=request["id"])).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ProviderBridge(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """Let the asyncio importer talk HTTP to the in-process tester chain."""
+
+    daemon_threads = True
+
+    def __init__(self, web3):
+        http.server.HTTPServer.__init__(self, ("localhost", 0), ProviderBridgeHandler)
+        self.transport = ProviderTransport(web3)
+        self.lock = threading.Lock()
+
+
+def test_import_all_asyncio(registry_contract: Contract):
+    """Import all entries on one event loop over JSON-RPC."""
+
+    bridge = ProviderBridge(registry_contract.web3)
+    threading.Thread(target=bridge.serve_forever, daemon=True).start()
+    try:
+        failures = importer.import_all_asyncio(registry_contract, importer.SAMPLE_CSV, port=bridge.server_address[1],
+                                               max_in_flight=8, timeout=30)
+    finally:
+        bridge.shutdown()
+        bridge.server_close()
+
+    assert failures == []
+    assert registry_contract.call().getInvoicingAddressCount(string_to_bytes32("FI26597538")) == 2
+    assert bytes32_to_string(registry_contract.call().getVatIdByAddress(string_to_bytes32("OVT:3724303727"))) == "FI24303727"
+
+
+#: Step gas of tests which do not send to a contract
+STEP_GAS = {step: 100000 for step in importer.IMPORT_STEPS}
+
+
+class RejectingClient:
+    """Node rejects the second transaction it is sent."""
+
+    def __init__(self):
+        self.nonce = 0
+        self.sent = []
+        self.filled = []
+
+    def reserve_nonce(self):
+        self.nonce += 1
+        return self.nonce
+
+    async def send_transaction(self, nonce, gas, function_name, *args):
+        if len(self.sent) == 1:
+            raise ValueError("Rejected")
+        self.sent.append(function_name)
+        return "0x{}".format(nonce)
+
+    async def fill_nonce(self, nonce):
+        self.filled.append(nonce)
+
+
+class InstantConfirmer:
+
+    def submit(self, txid, timeout=None):
+        future = asyncio.Future()
+        future.set_result(Confirmation(txid, True, 1, 21000, 0.0))
+        return future
+
+
+def test_async_row_rejected():
+    """After a rejected transaction the rest of the row is not sent and its nonces are filled."""
+
+    row = next(importer.read_csv(importer.SAMPLE_CSV, ["2430372-7"]))
+    client = RejectingClient()
+    state = ImportState()
+
+    loop = asyncio.new_event_loop()
+    try:
+        failures = loop.run_until_complete(importer.import_invoicing_address_async(client, InstantConfirmer(), 1, row, state, STEP_GAS))
+    finally:
+        loop.close()
+
+    assert client.sent == ["createCompany"]
+    assert client.filled == [2, 3, 4]
+    assert [failure.step for failure in failures] == ["setCompanyData", "createInvoicingAddress", "setInvoicingAddressData"]
+    assert state.has_company("FI24303727")
+    assert not state.has_address("OVT:3724303727")
+
+
+def test_step_gas_limits(registry_contract: Contract):
+    """Calibrated gas limits cover every step, also with long payloads and a second address of a company."""
+
+    web3 = registry_contract.web3
+    step_gas = importer.calibrate_step_gas(registry_contract)
+
+    row = next(importer.read_csv(importer.SAMPLE_CSV, ["2430372-7"]))
+    prepared = importer.prepare_invoicing_address(row)
+    prepared["company_data"] = '{"name": "' + "Adusso Oy " * 30 + '"}'
+    second = dict(prepared, address="OVT:372430372799", address_key=string_to_bytes32("OVT:372430372799"))
+
+    for prepared, steps in [(prepared, importer.IMPORT_STEPS), (second, ["createInvoicingAddress", "setInvoicingAddressData"])]:
+        for step in steps:
+            gas, args = importer.build_step(step, prepared, step_gas)
+            txid = getattr(registry_contract.transact({"gas": gas}), step)(*args)
+            assert check_succesful_tx(web3, txid), "{} ran out of its gas limit {}".format(step, gas)
+
+    assert registry_contract.call().getInvoicingAddressCount(string_to_bytes32("FI24303727")) == 2
+
+
+def test_unstorable_row(tmpdir):
+    """A row whose address does not fit in a registry key is reported, the other rows are prepared."""
+
+    with open(importer.SAMPLE_CSV, "rt", encoding="utf-8") as inp:
+        data = inp.read().replace("003724303727 OVT-tunnus", "003724303727{} OVT-tunnus".format("0" * 30))
+    fname = tmpdir.join("long.csv")
+    fname.write_text(data, encoding="utf-8")
+
+    failures = []
+    rows = list(importer.prepare_rows(str(fname), failures))
+
+    assert len(rows) == 25
+    assert [(failure.row_number, failure.step) for failure in failures] == [(18, "prepare")]
+    assert "longer than 32 bytes" in failures[0].reason
+
+
+def test_pack_rows():
+    """Field lengths are UTF-8 byte lengths."""
+    prepared = {"vat_key": string_to_bytes32("FI1"), "address_key": string_to_bytes32("OVT:1"), "company_data": "ä", "address_data": "{}"}
+    keys, packed, lengths = importer.pack_rows([prepared])
+    assert keys == [string_to_bytes32("FI1"), string_to_bytes32("OVT:1")]
+    assert packed == "ä{}"
+    assert lengths == [2, 2]
+
+
+def test_wait_for_claimed_company():
+    """A row whose company another worker is creating waits until that transaction has landed."""
+
+    state = ImportState()
+    assert state.claim_company("FI24303727")
+
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(state.claim_company_or_wait("FI24303727", 10)))
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive()
+
+    state.confirm_company("FI24303727")
+    waiter.join(10)
+    assert results == [False]
+
+    # A failed creation hands the company to the waiter
+    assert state.claim_company("FI26597538")
+    waiter = threading.Thread(target=lambda: results.append(state.claim_company_or_wait("FI26597538", 10)))
+    waiter.start()
+    state.release_company("FI26597538")
+    waiter.join(10)
+    assert results == [False, True]
+
+
+def test_rerun_sends_nothing(registry_contract: Contract):
+    """Re-running an import finds the existing records from events and sends no transactions."""
+
+    importer.import_all_pipelined(registry_contract, importer.SAMPLE_CSV)
+    block_number = registry_contract.web3.eth.blockNumber
+
+    state = ImportState.load(registry_contract)
+    assert state.has_company("FI26597538")
+    assert state.has_address("IBAN:FI6213763000140986")
+
+    failures = importer.import_all_pipelined(registry_contract, importer.SAMPLE_CSV, state=state)
+    assert failures == []
+    assert registry_contract.web3.eth.blockNumber == block_number
+
+
+def test_import_delta(registry_contract: Contract, tmpdir):
+    """First delta import compares the export with the chain, later ones with the index."""
+
+    importer.import_all_pipelined(registry_contract, importer.SAMPLE_CSV)
+    block_number = registry_contract.web3.eth.blockNumber
+
+    with open(importer.SAMPLE_CSV, "rt", encoding="utf-8") as inp:
+        changed = inp.read().replace("Adusso Oy,", "Adusso Oyj,")
+    changed_csv = tmpdir.join("changed.csv")
+    changed_csv.write_text(changed, encoding="utf-8")
+
+    # Changed since the full import, there is no index yet
+    index_path = str(tmpdir.join("import.index"))
+    assert importer.import_delta(registry_contract, str(changed_csv), index_path) == []
+    assert registry_contract.web3.eth.blockNumber == block_number + 1
+    assert registry_contract.call().getBusinessInformation(string_to_bytes32("FI24303727"), ContentType.TiekeCompanyData.value) == '{"name": "Adusso Oyj"}'
+
+    assert importer.import_delta(registry_contract, str(changed_csv), index_path) == []
+    assert registry_contract.web3.eth.blockNumber == block_number + 1
+
+    # The IBAN address of 360 Plus Oy moves to Adusso
+    moved_csv = tmpdir.join("moved.csv")
+    moved_csv.write_text(changed.replace("360 Plus Oy,2659753-8,Nordea", "Adusso Oyj,2430372-7,Nordea"), encoding="utf-8")
+
+    assert importer.import_delta(registry_contract, str(moved_csv), index_path) == []
+    assert registry_contract.web3.eth.blockNumber == block_number + 2
+    assert bytes32_to_string(registry_contract.call().getVatIdByAddress(string_to_bytes32("IBAN:FI6213763000140986"))) == "FI24303727"
+    assert registry_contract.call().getInvoicingAddressCount(string_to_bytes32("FI26597538")) == 1
+    assert registry_contract.call().getInvoicingAddressCount(string_to_bytes32("FI24303727")) == 2
+
+
+def test_resume_completed_import(registry_contract: Contract, tmpdir):
+    """Resuming from the journal of a completed import sends nothing and does not probe rows."""
+
+    path = str(tmpdir.join("import.journal"))
+
+    with ImportJournal(path, "pipelined", importer.SAMPLE_CSV) as journal:
+        importer.import_all_pipelined(registry_contract, importer.SAMPLE_CSV, journal=journal)
+
+    block_number = registry_contract.web3.eth.blockNumber
+
+    resume = ImportJournal.load(path)
+    assert resume.get_unconfirmed() == []
+
+    with ImportJournal(path, "pipelined", importer.SAMPLE_CSV) as journal:
+        failures = importer.import_all_pipelined(registry_contract, importer.SAMPLE_CSV, journal=journal, resume=resume)
+
+    assert failures == []
+    assert registry_contract.web3.eth.blockNumber == block_number
+
+
+def test_import_with_local_signers(registry_contract: Contract):
+    """Spread companies over several locally signing writer accounts."""
+
+    accounts = [LocalAccount(tester.keys[1]), LocalAccount(tester.keys[2])]
+
+    # Only the master can add writers
+    assert not registry_contract.call().canUpdateCompany(string_to_bytes32(""), accounts[0].address)
+    importer.authorize_writers(registry_contract, [account.address for account in accounts])
+    assert registry_contract.call().canUpdateCompany(string_to_bytes32(""), accounts[0].address)
+
+    failures = importer.import_all_pipelined(registry_contract, importer.SAMPLE_CSV, max_in_flight=8, accounts=accounts)
+    assert failures == []
+
+    assert registry_contract.call().getInvoicingAddressCount(string_to_bytes32("FI26597538")) == 2
+    assert bytes32_to_string(registry_contract.call().getVatIdByAddress(string_to_bytes32("OVT:3724303727"))) == "FI24303727"
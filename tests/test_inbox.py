@@ -0,0 +1,45 @@
+import pytest
+from web3.contract import Contract
+
+from eireg.inbox import InvoiceInbox, address_topic, send_invoices
+
+
+def test_inbox(registry_contract: Contract, tmpdir):
+    """Bulk sent invoices arrive in the inboxes of their receivers only."""
+
+    invoices = [
+        ("OVT:3724303727", "OVT:3723486648", "00001", "<xml>1</xml>"),
+        ("OVT:3723486648", "OVT:3724303727", "00002", "<xml>2</xml>"),
+        ("OVT:3726597538", "OVT:3724303727", "00003", "<xml>" + "x" * 500 + "</xml>"),
+        ("OVT:3724303727", "OVT:3726597538", "00004", "<xml>4</xml>"),
+    ]
+
+    assert not send_invoices(registry_contract, invoices, max_in_flight=2)
+
+    checkpoint = str(tmpdir.join("inbox.checkpoint"))
+    inbox = InvoiceInbox(registry_contract, ["OVT:3724303727", "OVT:3726597538"], checkpoint_path=checkpoint, chunk_size=2)
+    try:
+        received = list(inbox.iter_invoices())
+    finally:
+        inbox.close()
+
+    assert [invoice.invoice_id for invoice in received] == ["00001", "00003", "00004"]
+    assert received[0].to_address == "OVT:3724303727"
+    assert received[0].from_topic == address_topic("OVT:3723486648")
+    assert received[1].payload == invoices[2][3]
+
+    # Resuming from the checkpoint delivers only new invoices
+    send_invoices(registry_contract, [("OVT:3726597538", "OVT:3723486648", "00005", "<xml>5</xml>")])
+
+    inbox = InvoiceInbox(registry_contract, ["OVT:3724303727", "OVT:3726597538"], checkpoint_path=checkpoint)
+    try:
+        assert [invoice.invoice_id for invoice in inbox.iter_invoices()] == ["00005"]
+    finally:
+        inbox.close()
+
+
+def test_inbox_needs_addresses(registry_contract: Contract):
+    """An inbox without addresses would match the invoices of everybody."""
+
+    with pytest.raises(ValueError):
+        InvoiceInbox(registry_contract, [])
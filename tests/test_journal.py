@@ -0,0 +1,59 @@
+import pytest
+
+from eireg.journal import ImportJournal
+
+
+def test_remaining_steps(tmpdir):
+    """Only steps without a successful transaction remain after a restart."""
+
+    path = str(tmpdir.join("import.journal"))
+
+    with ImportJournal(path, "pipelined", "sample.csv") as journal:
+        journal.record_planned(1, ["createCompany", "setCompanyData", "createInvoicingAddress", "setInvoicingAddressData"])
+        journal.record_sent([1], "createCompany", "0x01", 0)
+        journal.record_sent([1], "setCompanyData", "0x02", 1)
+        journal.record_sent([1], "createInvoicingAddress", "0x03", 2)
+        journal.record_confirmed("0x01", True)
+        journal.record_confirmed("0x02", False)
+        journal.record_planned(2, [])
+
+    state = ImportJournal.load(path)
+    assert state.get_remaining_steps(1) == ["setCompanyData", "createInvoicingAddress", "setInvoicingAddressData"]
+    assert state.get_remaining_steps(2) == []
+    assert state.get_remaining_steps(3) is None
+    assert state.get_unconfirmed() == ["0x03"]
+
+
+def test_torn_write(tmpdir):
+    """A half written line from a crash does not hide records written after a restart."""
+
+    path = str(tmpdir.join("import.journal"))
+
+    with ImportJournal(path, "pipelined", "sample.csv") as journal:
+        journal.record_planned(1, ["createCompany"])
+
+    with open(path, "at") as out:
+        out.write('{"type": "sent", "ro')
+
+    with ImportJournal(path, "pipelined", "sample.csv") as journal:
+        journal.record_planned(2, ["createCompany"])
+
+    state = ImportJournal.load(path)
+    assert set(state.planned) == {1, 2}
+    assert state.sent == {}
+
+
+def test_resume_other_run(tmpdir):
+    """A journal only resumes the mode and file it was written for."""
+
+    path = str(tmpdir.join("import.journal"))
+
+    with ImportJournal(path, "pipelined", "sample.csv") as journal:
+        journal.record_planned(1, ["createCompany"])
+
+    state = ImportJournal.load(path)
+    state.check_run("pipelined", "sample.csv")
+    with pytest.raises(ValueError):
+        state.check_run("batched", "sample.csv")
+    with pytest.raises(ValueError):
+        state.check_run("pipelined", "other.csv")
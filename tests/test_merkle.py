@@ -0,0 +1,64 @@
+import pytest
+from web3.contract import Contract
+
+from eireg import importer
+from eireg.merkle import ContentStore, MerkleTree, MerkleVerifier, VerificationError, compute_root
+from eireg.utils import string_to_bytes32
+
+
+def test_proofs():
+    """Every record proves its root, also in trees with an odd number of leaves."""
+
+    for count in (1, 2, 5, 8):
+        records = [{"address": "OVT:{}".format(i)} for i in range(count)]
+        tree = MerkleTree(records)
+        for index, record in enumerate(records):
+            assert compute_root(record, tree.get_proof(index)) == tree.root
+
+    tree = MerkleTree([{"address": "OVT:1"}, {"address": "OVT:2"}])
+    assert compute_root({"address": "OVT:3"}, tree.get_proof(0)) != tree.root
+
+
+class SwappingStore:
+    """Content store answering every lookup with the record of one address."""
+
+    def __init__(self, store: ContentStore, address: str):
+        self.store = store
+        self.address = address
+
+    def get_record(self, address):
+        return self.store.get_record(self.address)
+
+
+def test_import_merkle(registry_contract: Contract):
+    """Rows are served from the store and checked against the committed roots."""
+
+    store = ContentStore()
+    failures = importer.import_all_merkle(registry_contract, importer.SAMPLE_CSV, store, batch_size=4)
+    assert not failures
+
+    stats = store.get_stats()
+    assert stats["batches"] == stats["committed"] > 1
+
+    # Nothing was written to the registry storage besides the roots
+    assert not registry_contract.call().hasCompany(string_to_bytes32("FI24303727"))
+
+    verifier = MerkleVerifier(registry_contract, store)
+    record = verifier.get_address_record("OVT:3724303727")
+    assert record["vat_id"] == "FI24303727"
+    assert verifier.get_address_record("OVT:1") is None
+    assert store.get_invoicing_addresses("FI26597538") == ["IBAN:FI6213763000140986", "OVT:3726597538"]
+
+    record, proof, root = store.get_record("OVT:3724303727")
+    record["address_data"] = "{}"
+    with pytest.raises(VerificationError):
+        verifier.verify(record, proof, root)
+
+    # A committed record of another address does not pass for the asked one
+    swapping = MerkleVerifier(registry_contract, SwappingStore(store, "OVT:3726597538"))
+    with pytest.raises(VerificationError):
+        swapping.get_address_record("OVT:3724303727")
+
+    # Re-running commits nothing new
+    importer.import_all_merkle(registry_contract, importer.SAMPLE_CSV, store, batch_size=4)
+    assert store.get_stats() == stats
@@ -0,0 +1,122 @@
+import concurrent.futures
+
+from eireg.confirmer import Confirmation
+from eireg.pipeline import ShardedPipeline, TransactionPipeline
+
+
+class FakePipeline:
+    """Window of transactions which confirm only when told."""
+
+    def __init__(self, max_in_flight):
+        self.max_in_flight = max_in_flight
+        self.in_flight = []
+        self.confirmed = []
+        self.blocked = 0
+
+    def has_room(self):
+        return len(self.in_flight) < self.max_in_flight
+
+    def send(self, context, gas, function_name, *args):
+        while not self.has_room():
+            self.blocked += 1
+            self.collect_oldest()
+        self.in_flight.append(context)
+
+    def collect_done(self):
+        pass
+
+    def collect_oldest(self):
+        self.confirmed.append(self.in_flight.pop(0))
+
+    def drain(self):
+        while self.in_flight:
+            self.collect_oldest()
+
+
+def test_full_shard_does_not_block_others():
+    """Transactions of a full account wait in its backlog while other accounts keep sending."""
+
+    slow, fast = FakePipeline(2), FakePipeline(2)
+    pipeline = ShardedPipeline([slow, fast], max_backlog=3)
+    keys = {pipeline.get_pipeline(key): key for key in ("FI{}".format(i) for i in range(20))}
+
+    for i in range(5):
+        pipeline.send(keys[slow], "slow {}".format(i), 100000, "createCompany")
+    pipeline.send(keys[fast], "fast 0", 100000, "createCompany")
+
+    assert slow.in_flight == ["slow 0", "slow 1"]
+    assert fast.in_flight == ["fast 0"]
+    assert pipeline.backlog_size == 3
+
+    # Past the backlog limit the producer waits for the busiest account
+    pipeline.send(keys[slow], "slow 5", 100000, "createCompany")
+    assert slow.confirmed == ["slow 0"]
+    assert pipeline.backlog_size == 3
+    assert slow.blocked == fast.blocked == 0
+
+    pipeline.drain()
+    assert slow.confirmed == ["slow {}".format(i) for i in range(6)]
+    assert fast.confirmed == ["fast 0"]
+    assert pipeline.backlog_size == 0
+
+
+class FakeEth:
+
+    defaultAccount = "0x01"
+
+    def __init__(self):
+        self.sent = []
+
+    def getTransactionCount(self, address, block_identifier):
+        return len(self.sent)
+
+
+class FakeContract:
+    """Node which rejects createCompany of VAT ID FI0."""
+
+    address = "0x02"
+
+    def __init__(self):
+        self.web3 = type("FakeWeb3", (), {})()
+        self.web3.eth = FakeEth()
+
+    def transact(self, transaction):
+        eth = self.web3.eth
+
+        class Functions:
+            def __getattr__(self, function_name):
+                def send(*args):
+                    if function_name == "createCompany" and args[0] == "FI0":
+                        raise ValueError("Underpriced")
+                    assert transaction["nonce"] == len(eth.sent)
+                    eth.sent.append(function_name)
+                    return "0x{}".format(len(eth.sent))
+                return send
+
+        return Functions()
+
+
+class InstantConfirmer:
+
+    def submit(self, txid):
+        future = concurrent.futures.Future()
+        future.set_result(Confirmation(txid, True, 1, 21000, 0.0))
+        return future
+
+
+def test_rejected_transaction():
+    """A rejected transaction fails its row, the rest of the import goes on."""
+
+    failures = []
+    contract = FakeContract()
+    pipeline = TransactionPipeline(contract, InstantConfirmer(), lambda *failure: failures.append(failure))
+
+    first, second = ["row 1"], ["row 2"]
+    assert pipeline.send(first, 100000, "createCompany", "FI0") is None
+    assert pipeline.send(first, 100000, "setCompanyData", "FI0") is None
+    assert pipeline.send(second, 100000, "createCompany", "FI1") == "0x1"
+    pipeline.drain()
+
+    assert [(context, step, txid) for context, step, txid, reason in failures] == [
+        (first, "createCompany", None), (first, "setCompanyData", None)]
+    assert contract.web3.eth.sent == ["createCompany"]
@@ -0,0 +1,33 @@
+from web3.contract import Contract
+
+from eireg import importer
+from eireg.profiler import IMPORT_STEPS, ImportProfile, profile_import
+
+
+def test_profile_import(registry_contract: Contract):
+    """Dry run measures every step and stays within the gas limits the importer would give."""
+
+    profile = profile_import(registry_contract, importer.SAMPLE_CSV, send=True)
+
+    assert profile.rows > 0
+    for step in IMPORT_STEPS:
+        assert profile.transactions[step] > 0
+        assert 0 < profile.gas[step] < profile.limits[step]
+
+    assert profile.rpc_calls["eth_sendTransaction"] == profile.get_total_transactions()
+    assert "Projected cost" in profile.format_report(4000000, gas_price=20 * 10 ** 9)
+
+    # Estimates write nothing, and the imported rows need no more transactions
+    estimated = profile_import(registry_contract, importer.SAMPLE_CSV)
+    assert estimated.skipped_rows == estimated.rows
+
+
+def test_projection():
+    profile = ImportProfile()
+    profile.record_step("createCompany", 100000, 120000)
+    profile.record_step("setCompanyData", 50000, 60000, '{"name": "Adusso Oy"}')
+
+    projection = profile.project(block_gas_limit=100000, block_time=10.0, gas_price=2)
+    assert projection["blocks"] == 2
+    assert projection["duration"] == 20.0
+    assert projection["cost_wei"] == 300000
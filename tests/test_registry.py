@@ -8,12 +8,7 @@ from web3 import Web3
 from eireg import importer
 from eireg.importer import import_invoicing_address
 from eireg.data import ContentType
-
-
-@pytest.fixture()
-def registry_contract(chain) -> Contract:
-    contract = chain.get_contract('EInvoicingRegistry')
-    return contract
+from eireg.utils import bytes32_to_string, string_to_bytes32
 
 
 @pytest.fixture()
@@ -56,15 +51,15 @@ def test_import_company_with_one_address(web3: Web3, registry_contract: Contract
 
     import_invoicing_address(registry_contract, sample_company)
 
-    assert registry_contract.call().hasCompany("FI24303727")
-    assert registry_contract.call().getVatIdByAddress("OVT:3724303727") == "FI24303727"
+    assert registry_contract.call().hasCompany(string_to_bytes32("FI24303727"))
+    assert bytes32_to_string(registry_contract.call().getVatIdByAddress(string_to_bytes32("OVT:3724303727"))) == "FI24303727"
 
     # Check business core data
     expected = {
         "name": "Adusso Oy"
     }
 
-    actual = registry_contract.call().getBusinessInformation("FI24303727", ContentType.TiekeCompanyData.value)
+    actual = registry_contract.call().getBusinessInformation(string_to_bytes32("FI24303727"), ContentType.TiekeCompanyData.value)
     assert json.loads(actual) == expected
 
     # Check address data
@@ -77,10 +72,10 @@ def test_import_company_with_one_address(web3: Web3, registry_contract: Contract
     }
 
     # See we have one address
-    assert registry_contract.call().getInvoicingAddressCount("FI24303727") == 1
-    assert registry_contract.call().getInvoicingAddressByIndex("FI24303727", 0) == "OVT:3724303727"
+    assert registry_contract.call().getInvoicingAddressCount(string_to_bytes32("FI24303727")) == 1
+    assert bytes32_to_string(registry_contract.call().getInvoicingAddressByIndex(string_to_bytes32("FI24303727"), 0)) == "OVT:3724303727"
 
-    actual = registry_contract.call().getAddressInformation("OVT:3724303727", ContentType.TiekeAddressData.value)
+    actual = registry_contract.call().getAddressInformation(string_to_bytes32("OVT:3724303727"), ContentType.TiekeAddressData.value)
     assert json.loads(actual) == expected
 
 
@@ -89,17 +84,17 @@ def test_import_company_with_multiple_addresses(web3: Web3, registry_contract: C
     for row in multiple_tieke_rows:
         import_invoicing_address(registry_contract, row)
 
-    assert registry_contract.call().getInvoicingAddressCount("FI26597538") == 2
-    assert registry_contract.call().getInvoicingAddressByIndex("FI26597538", 0) == "IBAN:FI6213763000140986"
-    assert registry_contract.call().getInvoicingAddressByIndex("FI26597538", 1) == "OVT:3726597538"
+    assert registry_contract.call().getInvoicingAddressCount(string_to_bytes32("FI26597538")) == 2
+    assert bytes32_to_string(registry_contract.call().getInvoicingAddressByIndex(string_to_bytes32("FI26597538"), 0)) == "IBAN:FI6213763000140986"
+    assert bytes32_to_string(registry_contract.call().getInvoicingAddressByIndex(string_to_bytes32("FI26597538"), 1)) == "OVT:3726597538"
 
 
 def test_missing_address_record(web3: Web3, registry_contract: Contract, broken_company: dict):
     """Some bad input data."""
     import_invoicing_address(registry_contract, broken_company)
 
-    assert registry_contract.call().getInvoicingAddressCount("FI23486648") == 1
-    assert registry_contract.call().getInvoicingAddressByIndex("FI23486648", 0) == "OVT:372348664835"
+    assert registry_contract.call().getInvoicingAddressCount(string_to_bytes32("FI23486648")) == 1
+    assert bytes32_to_string(registry_contract.call().getInvoicingAddressByIndex(string_to_bytes32("FI23486648"), 0)) == "OVT:372348664835"
 
 
 
@@ -108,15 +103,15 @@ def test_set_routing_information(web3: Web3, registry_contract: Contract, sample
 
     import_invoicing_address(registry_contract, sample_company)
 
-    assert registry_contract.call().hasCompany("FI24303727")
-    assert registry_contract.call().getVatIdByAddress("OVT:3724303727") == "FI24303727"
+    assert registry_contract.call().hasCompany(string_to_bytes32("FI24303727"))
+    assert bytes32_to_string(registry_contract.call().getVatIdByAddress(string_to_bytes32("OVT:3724303727"))) == "FI24303727"
 
     # Check business core data
     expected = {
         "name": "Adusso Oy"
     }
 
-    actual = registry_contract.call().getBusinessInformation("FI24303727", ContentType.TiekeCompanyData.value)
+    actual = registry_contract.call().getBusinessInformation(string_to_bytes32("FI24303727"), ContentType.TiekeCompanyData.value)
     assert json.loads(actual) == expected
 
     # Check address data
@@ -129,10 +124,10 @@ def test_set_routing_information(web3: Web3, registry_contract: Contract, sample
     }
 
     # See we have one address
-    assert registry_contract.call().getInvoicingAddressCount("FI24303727") == 1
-    assert registry_contract.call().getInvoicingAddressByIndex("FI24303727", 0) == "OVT:3724303727"
+    assert registry_contract.call().getInvoicingAddressCount(string_to_bytes32("FI24303727")) == 1
+    assert bytes32_to_string(registry_contract.call().getInvoicingAddressByIndex(string_to_bytes32("FI24303727"), 0)) == "OVT:3724303727"
 
-    actual = registry_contract.call().getAddressInformation("OVT:3724303727", ContentType.TiekeAddressData.value)
+    actual = registry_contract.call().getAddressInformation(string_to_bytes32("OVT:3724303727"), ContentType.TiekeAddressData.value)
     assert json.loads(actual) == expected
 
 
@@ -141,3 +136,11 @@ def test_send_invoice(web3: Web3, registry_contract: Contract, sample_company: d
     invoice_id = "00001"
     payload = "<xml></xml>"
     registry_contract.transact().sendInvoice("FI24303727", "FI23486648", invoice_id, payload)
+
+
+def test_keys_round_trip():
+    """Registry keys are zero padded ASCII."""
+    key = string_to_bytes32("OVT:3724303727")
+    assert len(key) == 32
+    assert bytes32_to_string(key) == "OVT:3724303727"
+    assert bytes32_to_string(b"\0" * 32) == ""
@@ -0,0 +1,92 @@
+import pytest
+from web3.contract import Contract
+
+from eireg import importer
+from eireg.data import ContentType, create_company_preferences
+from eireg.importer import import_invoicing_address
+from eireg.replica import RegistryReplica
+from eireg.utils import string_to_bytes32
+
+
+@pytest.fixture()
+def multiple_tieke_rows() -> list:
+    # 360 Plus Oy
+    return [data for data in importer.read_csv(importer.SAMPLE_CSV, ["2659753-8"])]
+
+
+def test_replica_sync(registry_contract: Contract, multiple_tieke_rows: list):
+    """Replica answers the same as the contract after syncing."""
+
+    for row in multiple_tieke_rows:
+        import_invoicing_address(registry_contract, row)
+
+    preferences = create_company_preferences("OVT:3726597538", {})
+    registry_contract.transact().updateRoutingPreference(string_to_bytes32("FI26597538"), preferences)
+
+    with RegistryReplica(registry_contract) as replica:
+        assert replica.sync() == registry_contract.web3.eth.blockNumber
+
+        assert replica.has_company("FI26597538")
+        assert not replica.has_company("FI24303727")
+        assert replica.get_vat_id_by_address("OVT:3726597538") == "FI26597538"
+        assert replica.get_vat_id_by_address("OVT:1") == ""
+        assert replica.get_invoicing_addresses("FI26597538") == ["IBAN:FI6213763000140986", "OVT:3726597538"]
+        assert replica.get_company_preferences("FI26597538") == preferences
+
+        expected = registry_contract.call().getAddressInformation(string_to_bytes32("OVT:3726597538"), ContentType.TiekeAddressData.value)
+        assert replica.get_address_information("OVT:3726597538", ContentType.TiekeAddressData.value) == expected
+
+        expected = registry_contract.call().getBusinessInformation(string_to_bytes32("FI26597538"), ContentType.TiekeCompanyData.value)
+        assert replica.get_business_information("FI26597538", ContentType.TiekeCompanyData.value) == expected
+
+
+def test_replica_resume(registry_contract: Contract, multiple_tieke_rows: list, tmpdir):
+    """Second sync only processes new blocks."""
+
+    path = str(tmpdir.join("replica.sqlite"))
+
+    import_invoicing_address(registry_contract, multiple_tieke_rows[0])
+    with RegistryReplica(registry_contract, path) as replica:
+        first = replica.sync()
+
+    import_invoicing_address(registry_contract, multiple_tieke_rows[1])
+
+    with RegistryReplica(registry_contract, path) as replica:
+        assert replica.get_last_block() == first
+        replica.sync()
+        assert len(replica.get_invoicing_addresses("FI26597538")) == 2
+
+
+def test_replica_cleared_data(registry_contract: Contract, multiple_tieke_rows: list):
+    """Data cleared on the chain is removed from the replica."""
+
+    import_invoicing_address(registry_contract, multiple_tieke_rows[0])
+
+    with RegistryReplica(registry_contract) as replica:
+        replica.sync()
+        address = replica.get_invoicing_addresses("FI26597538")[0]
+        assert replica.get_address_information(address, ContentType.TiekeAddressData.value)
+
+        registry_contract.transact().setInvoicingAddressData(string_to_bytes32("FI26597538"), string_to_bytes32(address),
+                                                             ContentType.TiekeAddressData.value, "")
+        replica.sync()
+        assert replica.get_address_information(address, ContentType.TiekeAddressData.value) == ""
+
+
+def test_replica_failed_consumer(registry_contract: Contract, multiple_tieke_rows: list):
+    """The sync marker does not move past changes the consumer failed to take."""
+
+    import_invoicing_address(registry_contract, multiple_tieke_rows[0])
+
+    def fail(changed):
+        raise RuntimeError("Consumer failed")
+
+    with RegistryReplica(registry_contract) as replica:
+        with pytest.raises(RuntimeError):
+            replica.sync(on_change=fail)
+        assert replica.get_last_block() is None
+
+        changes = []
+        replica.sync(on_change=changes.append)
+        assert changes == [{"FI26597538"}]
+        assert replica.get_last_block() == registry_contract.web3.eth.blockNumber
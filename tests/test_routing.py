@@ -0,0 +1,120 @@
+import json
+import threading
+import urllib.request
+
+from web3.contract import Contract
+
+from eireg import importer
+from eireg.data import COMPACT_MARKER, ENTRY_SEPARATOR, FIELD_SEPARATOR, ContentType, create_company_preferences, \
+    decode_company_preferences, encode_payload
+from eireg.importer import import_invoicing_address
+from eireg.replica import RegistryReplica
+from eireg.routing import RoutingServer, RoutingTable, compute_route, decode_stored
+from eireg.utils import string_to_bytes32
+
+
+def test_compute_route():
+    """Default address first, then addresses with permission to send, non-receiving ones dropped."""
+
+    addresses = ["OVT:1", "OVT:2", "OVT:3", "OVT:4"]
+    address_data = {
+        "OVT:1": {"receives": True, "permissionToSend": False},
+        "OVT:2": {"receives": True, "permissionToSend": True},
+        "OVT:3": {"receives": False, "permissionToSend": True},
+        "OVT:4": None,
+    }
+
+    route = compute_route("FI1", addresses, address_data, None)
+    assert [receiver.address for receiver in route.receivers] == ["OVT:2", "OVT:1"]
+
+    preferences = {
+        "defaultAddress": "OVT:4",
+        "invoiceAddresses": {
+            "OVT:1": {"receives": True, "permissionToSend": False, "sends": False, "receivePreferences": ["tax"]},
+            "OVT:4": {"receives": True, "permissionToSend": False, "sends": False},
+        },
+    }
+    route = compute_route("FI1", addresses, address_data, preferences)
+    assert route.resolve() == "OVT:4"
+    assert route.resolve("tax") == "OVT:1"
+    assert route.resolve("unknown") == "OVT:4"
+
+    assert compute_route("FI1", [], {}, None).resolve() is None
+
+    # Preferences of older clients list the addresses
+    preferences = {
+        "defaultAddress": "OVT:4",
+        "invoiceAddresses": [
+            {"address": "OVT:1", "receives": False},
+            {"address": "OVT:4", "receives": True},
+            "garbage",
+        ],
+    }
+    route = compute_route("FI1", addresses, address_data, preferences)
+    assert [receiver.address for receiver in route.receivers] == ["OVT:4", "OVT:2"]
+
+
+class FakeReplica:
+    """Replica of one company with a single invoicing address."""
+
+    def __init__(self, address_data: str, preferences: str):
+        self.address_data = address_data
+        self.preferences = preferences
+
+    def get_invoicing_addresses(self, vat_id):
+        return ["OVT:1"]
+
+    def get_address_information(self, address, content_type):
+        return self.address_data
+
+    def get_company_preferences(self, vat_id):
+        return self.preferences
+
+
+def test_malformed_records():
+    """Records no client could have written are ignored instead of failing the route."""
+
+    for payload in ["{", "42", "~1", "~9|OVT:2", "~1|OVT:2&OVT:1|x"]:
+        payload = payload.replace("~", COMPACT_MARKER).replace("|", FIELD_SEPARATOR).replace("&", ENTRY_SEPARATOR)
+        assert decode_stored(decode_company_preferences, payload) is None
+
+        table = RoutingTable(FakeReplica(encode_payload(ContentType.TiekeAddressData, {"receives": True}), payload))
+        assert table.load_route("FI1").resolve() == "OVT:1"
+
+    table = RoutingTable(FakeReplica(COMPACT_MARKER + "999", ""))
+    assert table.load_route("FI1").resolve() is None
+
+
+def test_routing_table(registry_contract: Contract):
+    """Routes follow preference updates and are served over HTTP."""
+
+    for row in importer.read_csv(importer.SAMPLE_CSV, ["2659753-8", "2430372-7"]):
+        import_invoicing_address(registry_contract, row)
+
+    with RegistryReplica(registry_contract) as replica:
+        table = RoutingTable(replica)
+        table.load()
+
+        assert table.resolve("FI24303727") == "OVT:3724303727"
+        assert table.resolve("FI26597538") == "IBAN:FI6213763000140986"
+        assert table.resolve("FI1") is None
+
+        preferences = create_company_preferences("OVT:3726597538", {})
+        registry_contract.transact().updateRoutingPreference(string_to_bytes32("FI26597538"), preferences)
+
+        recomputed = table.recomputed
+        table.sync()
+        assert table.recomputed == recomputed + 1
+        assert table.resolve("FI26597538") == "OVT:3726597538"
+
+        server = RoutingServer(table, port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = "http://localhost:{}/route/FI26597538".format(server.server_address[1])
+            data = json.loads(urllib.request.urlopen(url).read().decode("utf-8"))
+            assert data["address"] == "OVT:3726597538"
+            assert len(data["receivers"]) == 2
+        finally:
+            server.shutdown()
+            server.server_close()
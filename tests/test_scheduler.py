@@ -0,0 +1,98 @@
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from eireg.scheduler import CompanyScheduler
+
+
+def test_rows_of_company_run_in_order():
+    """Rows of one company never overlap and keep their order, companies run in parallel."""
+
+    lock = threading.Lock()
+    running = set()
+    overlaps = []
+    order = []
+
+    def job(row):
+        key = row["Y-tunnus"]
+        with lock:
+            if key in running:
+                overlaps.append(key)
+            running.add(key)
+        time.sleep(0.01)
+        with lock:
+            running.discard(key)
+            order.append((key, row["n"]))
+
+    rows = [{"Y-tunnus": "123456{}-{}".format(i % 3, i % 3), "n": i} for i in range(12)]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        scheduler = CompanyScheduler(executor, job)
+        for row in rows:
+            scheduler.submit(row)
+        scheduler.wait()
+
+    assert overlaps == []
+    for key in {row["Y-tunnus"] for row in rows}:
+        numbers = [n for k, n in order if k == key]
+        assert numbers == sorted(numbers)
+
+    progress = scheduler.get_progress()
+    assert progress["companies"] == {}
+    assert progress["completed_companies"] == 3
+    assert progress["completed_rows"] == 12
+
+
+def test_wait_raises_job_error():
+    """First job error is raised after all lanes have completed."""
+
+    def job(row):
+        if row["Y-tunnus"] == "bad":
+            raise ValueError("Bad row")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        scheduler = CompanyScheduler(executor, job)
+        scheduler.submit({"Y-tunnus": "bad"})
+        scheduler.submit({"Y-tunnus": "good"})
+        with pytest.raises(ValueError):
+            scheduler.wait()
+
+    assert scheduler.get_progress()["failed_rows"] == 1
+
+
+def test_submit_blocks_when_window_is_full():
+    """No more than max_pending rows are held by the scheduler at any time."""
+
+    lock = threading.Lock()
+    seen_pending = []
+
+    def job(row):
+        time.sleep(0.005)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        scheduler = CompanyScheduler(executor, job, max_pending=5)
+        for i in range(50):
+            scheduler.submit({"Y-tunnus": str(i % 7)})
+            with lock:
+                seen_pending.append(scheduler.get_progress()["pending_rows"])
+        scheduler.wait()
+
+    assert max(seen_pending) <= 5
+    assert scheduler.get_progress()["completed_rows"] == 50
+
+
+def test_failing_on_done_advances_lane():
+    """An error in the on_done callback does not stall the rest of the lane."""
+
+    def on_done(row, future):
+        raise RuntimeError("Callback failed")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        scheduler = CompanyScheduler(executor, lambda row: None, on_done=on_done)
+        for i in range(3):
+            scheduler.submit({"Y-tunnus": "same"})
+        scheduler.wait()
+
+    assert scheduler.get_progress()["completed_rows"] == 3
@@ -0,0 +1,64 @@
+import pytest
+from web3.contract import Contract
+
+from eireg import importer
+from eireg.data import ContentType, create_company_preferences
+from eireg.importer import import_invoicing_address
+from eireg.replica import RegistryReplica
+from eireg.snapshot import RegistrySnapshot, SnapshotError, export_snapshot, write_snapshot
+from eireg.utils import string_to_bytes32
+
+
+def test_snapshot_lookups(tmpdir):
+    """Every written key is found, missing keys are not."""
+
+    path = str(tmpdir.join("registry.snapshot"))
+    companies = [["FI{}".format(i), "", "", "", "Company {}".format(i), "", "", "OVT:{}".format(i)] for i in range(100)]
+    addresses = [["OVT:{}".format(i), "FI{}".format(i), "", "", "", "", "{}"] for i in range(100)]
+    write_snapshot(path, 42, companies, addresses, [["3710948874", "{\"name\": \"Äpä\"}"]])
+
+    with RegistrySnapshot(path) as snapshot:
+        assert snapshot.get_last_block() == 42
+        assert snapshot.get_count("addresses") == 100
+        for i in range(100):
+            assert snapshot.get_vat_id_by_address("OVT:{}".format(i)) == "FI{}".format(i)
+            assert snapshot.get_invoicing_addresses("FI{}".format(i)) == ["OVT:{}".format(i)]
+        assert snapshot.get_business_information("FI7", ContentType.TiekeCompanyData.value) == "Company 7"
+        assert snapshot.get_operator_data("3710948874") == "{\"name\": \"Äpä\"}"
+        assert not snapshot.has_company("FI100")
+        assert snapshot.get_vat_id_by_address("OVT:100") == ""
+        assert snapshot.get_invoicing_addresses("FI100") == []
+
+    empty = tmpdir.join("empty")
+    empty.write("")
+    with pytest.raises(SnapshotError):
+        RegistrySnapshot(str(empty))
+
+
+def test_export_snapshot(registry_contract: Contract, tmpdir):
+    """Snapshot answers the same as the replica it was exported from."""
+
+    for row in importer.read_csv(importer.SAMPLE_CSV, ["2659753-8", "2430372-7"]):
+        import_invoicing_address(registry_contract, row)
+
+    preferences = create_company_preferences("OVT:3726597538", {})
+    registry_contract.transact().updateRoutingPreference(string_to_bytes32("FI26597538"), preferences)
+
+    with RegistryReplica(registry_contract) as replica:
+        replica.sync()
+
+        path = str(tmpdir.join("registry.snapshot"))
+        assert export_snapshot(replica, path) == replica.get_last_block()
+
+        with RegistrySnapshot(path) as snapshot:
+            for vat_id in ("FI26597538", "FI24303727"):
+                assert snapshot.has_company(vat_id)
+                assert snapshot.get_invoicing_addresses(vat_id) == replica.get_invoicing_addresses(vat_id)
+                assert snapshot.get_company_preferences(vat_id) == replica.get_company_preferences(vat_id)
+                for content_type in ContentType:
+                    assert snapshot.get_business_information(vat_id, content_type.value) == replica.get_business_information(vat_id, content_type.value)
+
+            for address in replica.get_addresses():
+                assert snapshot.get_vat_id_by_address(address) == replica.get_vat_id_by_address(address)
+                for content_type in ContentType:
+                    assert snapshot.get_address_information(address, content_type.value) == replica.get_address_information(address, content_type.value)
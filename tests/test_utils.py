@@ -0,0 +1,19 @@
+import pytest
+
+from eireg.utils import bytes32_to_string, string_to_bytes32
+
+
+def test_bytes32_keys():
+    """Keys round trip through zero padded bytes32, keys which do not fit are rejected by name."""
+
+    assert string_to_bytes32("OVT:3724303727") == b"OVT:3724303727" + b"\0" * 18
+    assert bytes32_to_string(string_to_bytes32("OVT:3724303727")) == "OVT:3724303727"
+    assert bytes32_to_string(string_to_bytes32("X" * 32)) == "X" * 32
+
+    with pytest.raises(ValueError) as excinfo:
+        string_to_bytes32("IBAN:" + "1" * 28)
+    assert "IBAN:1111" in str(excinfo.value)
+
+    with pytest.raises(ValueError) as excinfo:
+        string_to_bytes32("OVT:Äpä")
+    assert "OVT:Äpä" in str(excinfo.value)
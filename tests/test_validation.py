@@ -0,0 +1,53 @@
+import csv
+
+import pytest
+
+from eireg import importer
+from eireg.validation import ValidationError, check_ovt, normalize_iban, normalize_ytunnus, validate_csv
+
+
+def test_checksums():
+    """Y-tunnus, OVT and IBAN check digits are verified."""
+
+    assert normalize_ytunnus(" 2659753-8") == "2659753-8"
+    assert normalize_ytunnus("737546-2") == "737546-2"
+    with pytest.raises(ValidationError):
+        normalize_ytunnus("2659753-7")
+    with pytest.raises(ValidationError):
+        normalize_ytunnus("2659753")
+
+    check_ovt("003726597538")
+    check_ovt("372348664835")
+    with pytest.raises(ValidationError):
+        check_ovt("003726597539")
+
+    assert normalize_iban("fi62 1376 3000 1409 86") == "FI6213763000140986"
+    with pytest.raises(ValidationError):
+        normalize_iban("FI6213763000140987")
+    with pytest.raises(ValidationError):
+        normalize_iban("FI621376300014098")
+
+
+def test_validate_csv(tmpdir):
+    """Valid rows import the same from the validated file, broken rows are rejected with a reason."""
+
+    output = str(tmpdir.join("sample.csv.validated"))
+    rejects = str(tmpdir.join("sample.csv.rejects.csv"))
+
+    stats = validate_csv(importer.SAMPLE_CSV, output, rejects, workers=2, chunk_size=5)
+    assert stats == {"rows": 26, "valid": 25, "rejected": 1}
+
+    with open(rejects) as inp:
+        rejected = list(csv.DictReader(inp))
+    assert rejected[0]["row"] == "15"
+    assert rejected[0]["Y-tunnus"] == "2404537-7"
+    assert "missing" in rejected[0]["reason"]
+
+    original = [row for row_number, row in enumerate(importer.read_csv(importer.SAMPLE_CSV), start=1) if row_number != 15]
+    validated = list(importer.read_csv(output))
+    assert [importer.prepare_invoicing_address(row) for row in validated] == [importer.prepare_invoicing_address(row) for row in original]
+
+    assert len(list(importer.read_csv(output, ["2659753-8"]))) == 2
+
+    # Rows keep their numbers in the original export
+    assert [row_number for row_number, row in importer.read_numbered_csv(output)] == [n for n in range(1, 27) if n != 15]